@@ -0,0 +1,62 @@
+"""Download archive lookups with a large archive, as used when re-syncing big channels.
+
+Run from the repository root:
+    python benchmarks/bench_archive.py [--entries 100000] [--playlist 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from downloader.archive import DownloadArchive  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--playlist", type=int, default=5000, help="entries per simulated playlist sync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        media = os.path.join(folder, "video.mp4")
+        with open(media, "wb") as f:
+            f.write(b"\0" * 1024)
+        archive = DownloadArchive(os.path.join(folder, "archive.sqlite3"))
+
+        started = time.perf_counter()
+        for index in range(args.entries):
+            archive.add(f"Youtube:{index:011d}", "best", False, False, [media])
+        elapsed = time.perf_counter() - started
+        print(f"add:          {args.entries} entries in {elapsed:.2f}s ({args.entries / elapsed:,.0f}/s)")
+
+        keys = [f"Youtube:{random.randrange(args.entries * 2):011d}" for _ in range(args.playlist)]
+        started = time.perf_counter()
+        found = archive.lookup_many(keys, "best", False, False)
+        elapsed = time.perf_counter() - started
+        print(f"lookup_many:  {len(keys)} keys, {len(found)} archived in {elapsed * 1000:.1f}ms")
+
+        started = time.perf_counter()
+        for key in keys:
+            archive.lookup(key, "best", False, False)
+        elapsed = time.perf_counter() - started
+        print(f"lookup:       {len(keys)} single lookups in {elapsed * 1000:.1f}ms "
+              f"({elapsed / len(keys) * 1e6:.0f}us each)")
+
+        # yt-dlp's own --download-archive is a text file read into memory on every start.
+        text_archive = os.path.join(folder, "archive.txt")
+        with open(text_archive, "w", encoding="utf-8") as f:
+            f.writelines(f"youtube {index:011d}\n" for index in range(args.entries))
+        started = time.perf_counter()
+        with open(text_archive, encoding="utf-8") as f:
+            loaded = {line.strip() for line in f}
+        elapsed = time.perf_counter() - started
+        print(f"text archive: loading {len(loaded)} lines takes {elapsed * 1000:.1f}ms per start")
+
+
+if __name__ == "__main__":
+    main()
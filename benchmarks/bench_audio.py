@@ -0,0 +1,80 @@
+"""Audio post-processing cost: MP3 transcoding vs. the native audio mode (stream copy).
+
+Generates an AAC (.m4a) and an Opus (.webm) test track with ffmpeg, like the audio
+streams YouTube serves, so ffmpeg and ffprobe (with libopus) have to be on PATH.
+Each format's postprocessors run on a fresh copy of each track; CPU time is that of
+the ffmpeg processes plus this process. Run from the repository root:
+    python benchmarks/bench_audio.py [--minutes 10]
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+SOURCES = {
+    'm4a': ['-c:a', 'aac', '-b:a', '128k', '-f', 'mp4'],
+    'webm': ['-c:a', 'libopus', '-b:a', '160k', '-f', 'webm'],
+}
+
+
+def make_audio(path, duration, codec_args):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi',
+                    '-i', f'sine=frequency=440:duration={duration},aeval=val(0)*0.5+random(0)*0.1',
+                    '-vn', *codec_args, path], check=True)
+
+
+def cpu_seconds():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    return children.ru_utime + children.ru_stime + own.ru_utime + own.ru_stime
+
+
+def run_postprocessors(path, duration, format_choice):
+    import yt_dlp
+    from downloader.downloader import add_postprocessors, postprocessor_options
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        add_postprocessors(ydl, postprocessor_options(format_choice, False, False))
+        info = {'id': 'bench', 'title': 'Bench track', 'uploader': 'bench', 'duration': duration,
+                'filepath': path, 'ext': os.path.splitext(path)[1][1:], '__real_download': True}
+        return ydl.post_process(path, info)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=10, help='length of the test tracks')
+    args = parser.parse_args()
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        sys.exit('ffmpeg and ffprobe must be on PATH')
+
+    duration = args.minutes * 60
+    with tempfile.TemporaryDirectory() as folder:
+        sources = {}
+        for ext, codec_args in SOURCES.items():
+            sources[ext] = os.path.join(folder, f'source.{ext}')
+            make_audio(sources[ext], duration, codec_args)
+        print(f"{args.minutes:g} minute tracks")
+        print(f"{'source':<7} {'format':<7} {'output':<7} {'wall':>8} {'CPU':>8} {'CPU s/hour':>11} {'size':>9}")
+        for ext, source in sources.items():
+            for format_choice in ('mp3', 'audio'):
+                work = os.path.join(folder, format_choice)
+                os.makedirs(work, exist_ok=True)
+                path = shutil.copy(source, os.path.join(work, f'track.{ext}'))
+                cpu, started = cpu_seconds(), time.perf_counter()
+                info = run_postprocessors(path, duration, format_choice)
+                wall, cpu = time.perf_counter() - started, cpu_seconds() - cpu
+                size = os.path.getsize(info['filepath'])
+                print(f"{ext:<7} {format_choice:<7} {info['ext']:<7} {wall:7.2f}s {cpu:7.2f}s "
+                      f"{cpu * 3600 / duration:10.1f}s {size / 1024 / 1024:7.1f}MiB", flush=True)
+                shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    main()
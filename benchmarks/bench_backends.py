@@ -0,0 +1,69 @@
+"""Thread vs. process execution backend for many concurrent, extraction-heavy jobs.
+
+Every video makes the coffeebench extractor run --rounds of CPU-bound Python (like
+yt-dlp deciphering a signature), then downloads a small file from the local bench
+server. While the queue runs, the main thread stands in for the GUI: it wakes up
+every 5 ms and records how late it got to run. Run from the repository root, on
+a machine with several cores to see the difference:
+    python benchmarks/bench_backends.py [--videos 32] [--workers 8] [--rounds 1500000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.backends import create_backend  # noqa: E402
+from downloader.download_queue import DownloadQueue  # noqa: E402
+
+TICK = 0.005
+
+
+def run_batch(server, queue, folder, prefix, videos):
+    jobs = [queue.add(server.watch_url(f"{prefix}{index}"), "best", "", folder, False, False)
+            for index in range(videos)]
+    lateness = []
+    started = time.perf_counter()
+    while any(job.is_active() for job in jobs):
+        before = time.perf_counter()
+        time.sleep(TICK)
+        lateness.append((time.perf_counter() - before - TICK) * 1000)
+    elapsed = time.perf_counter() - started
+    failed = [job for job in jobs if job.status != "finished"]
+    if failed:
+        raise Exception(f"{len(failed)} jobs failed: {failed[0].error}")
+    lateness.sort()
+    return elapsed, lateness[int(len(lateness) * 0.99)], lateness[-1], statistics.median(lateness)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=32, help="videos per batch")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1), help="concurrent jobs")
+    parser.add_argument("--rounds", type=int, default=1500000, help="extractor CPU work per video")
+    parser.add_argument("--size-kib", type=int, default=256, help="size of each video")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} workers, {args.videos} videos per batch, "
+          f"{args.rounds} decipher rounds per video")
+    print(f"{'backend':<8} {'batch':<6} {'total':>8} {'videos/s':>9} {'UI late p50':>12} {'p99':>8} {'max':>8}")
+    with BenchServer(media_size=args.size_kib * 1024, extract_delay=0.01, decipher_rounds=args.rounds) as server:
+        for name in ("thread", "process"):
+            with tempfile.TemporaryDirectory() as folder:
+                queue = DownloadQueue(max_workers=args.workers, backend=create_backend(name))
+                # The first batch includes starting the worker processes and loading yt-dlp in them.
+                for batch in ("cold", "warm"):
+                    prefix = f"{name}{batch}{time.time_ns()}-"
+                    elapsed, p99, worst, median = run_batch(server, queue, folder, prefix, args.videos)
+                    print(f"{name:<8} {batch:<6} {elapsed:7.2f}s {args.videos / elapsed:9.2f} "
+                          f"{median:10.1f}ms {p99:6.1f}ms {worst:6.1f}ms", flush=True)
+                queue.shutdown()
+
+
+if __name__ == "__main__":
+    main()
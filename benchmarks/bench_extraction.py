@@ -0,0 +1,60 @@
+"""Extraction count and time-to-first-byte: legacy two-pass flow vs download_video.
+
+Run from the repository root:
+    python benchmarks/bench_extraction.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+import yt_dlp  # noqa: E402
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.downloader import download_video  # noqa: E402
+
+
+def legacy_download(url, temp_folder):
+    ydl_opts = {
+        'format': 'best[ext=mp4]',
+        'outtmpl': os.path.join(temp_folder, '%(title)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        ydl.prepare_filename(info)
+        ydl.download([url])
+
+
+def current_download(url, temp_folder):
+    download_video(url, 'mp4', None, temp_folder, temp_folder, None, False, False, use_info_cache=False)
+
+
+def measure(server, name, func, url):
+    server.reset()
+    with tempfile.TemporaryDirectory() as temp_folder:
+        started = time.monotonic()
+        func(url, temp_folder)
+        total = time.monotonic() - started
+    extractions = server.stats.get("extract_count", 0) + server.stats.get("playlist_count", 0)
+    ttfb = server.first_byte_at - started if server.first_byte_at else float("nan")
+    print(f"{name:<28} extractions={extractions:<4} ttfb={ttfb * 1000:8.1f} ms  total={total * 1000:8.1f} ms")
+
+
+def main():
+    with BenchServer(media_size=1024 * 1024, extract_delay=0.25) as server:
+        video_url = server.watch_url("single")
+        playlist_url = server.playlist_url(5)
+        measure(server, "video / legacy", legacy_download, video_url)
+        measure(server, "video / download_video", current_download, video_url)
+        measure(server, "playlist(5) / legacy", legacy_download, playlist_url)
+        measure(server, "playlist(5) / download_video", current_download, playlist_url)
+
+
+if __name__ == "__main__":
+    main()
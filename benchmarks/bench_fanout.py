@@ -0,0 +1,93 @@
+"""Separate jobs per output format vs. one fan-out job ('mp4+mp3') for the same video.
+
+The local bench server serves real split streams like YouTube's (H.264 and VP9
+video-only, AAC and Opus audio-only), generated with ffmpeg, so ffmpeg (with
+libx264, libvpx-vp9 and libopus) has to be on PATH. Reports the media bytes and
+requests the server saw and the wall time until all outputs are in the download
+folder. Run from the repository root:
+    python benchmarks/bench_fanout.py [--seconds 120] [--rate-kib 4096] [--connections 4]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.download_queue import DownloadQueue  # noqa: E402
+
+VIDEO = ['-f', 'lavfi', '-i', 'testsrc2=size=854x480:rate=30']
+AUDIO = ['-f', 'lavfi', '-i', 'sine=frequency=440,aeval=val(0)*0.5+random(0)*0.1']
+# format_id: (ffmpeg input and codec arguments, ext, vcodec, acodec)
+STREAMS = {
+    'v-avc1': (VIDEO + ['-an', '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '1M', '-f', 'mp4'],
+               'mp4', 'avc1.64001f', 'none'),
+    'a-mp4a': (AUDIO + ['-vn', '-c:a', 'aac', '-b:a', '128k', '-f', 'mp4'], 'm4a', 'none', 'mp4a.40.2'),
+    'v-vp9': (VIDEO + ['-an', '-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8', '-b:v', '1M',
+                       '-f', 'webm'], 'webm', 'vp9', 'none'),
+    'a-opus': (AUDIO + ['-vn', '-c:a', 'libopus', '-b:a', '128k', '-f', 'webm'], 'webm', 'none', 'opus'),
+}
+CASES = (
+    ('mp4 + mp3', ['mp4', 'mp3']),
+    ('mp4 + webm + mp3', ['mp4', 'webm', 'mp3']),
+)
+
+
+def make_streams(server, folder, seconds):
+    for format_id, (args, ext, vcodec, acodec) in STREAMS.items():
+        path = os.path.join(folder, f'{format_id}.{ext}')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', *args[:4], '-t', str(seconds), *args[4:], path], check=True)
+        server.add_stream(format_id, path, ext, vcodec, acodec)
+
+
+def run(server, video_id, format_choices, connections, postprocess_workers):
+    server.reset()
+    with tempfile.TemporaryDirectory() as folder:
+        queue = DownloadQueue(max_workers=len(format_choices), download_connections=connections,
+                              postprocess_workers=postprocess_workers)
+        started = time.perf_counter()
+        jobs = [queue.add(server.watch_url(video_id), format_choice, "", folder, False, False)
+                for format_choice in format_choices]
+        while queue.active_jobs():
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        queue.shutdown()
+        failed = [job for job in jobs if job.status != "finished"]
+        if failed:
+            raise Exception(f"{failed[0].format_choice} job failed: {failed[0].error}")
+        outputs = sorted(os.path.splitext(path)[1] for job in jobs for path in job.final_filepaths)
+    return elapsed, dict(server.stats), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=int, default=120, help='length of the test video')
+    parser.add_argument('--rate-kib', type=int, default=4096, help='per-connection download rate (0: unlimited)')
+    parser.add_argument('--connections', type=int, default=4, help='connections per file (range requests)')
+    parser.add_argument('--postprocess-workers', type=int, help='post-processing pool size (default: CPU count)')
+    args = parser.parse_args()
+    if not shutil.which('ffmpeg'):
+        sys.exit('ffmpeg must be on PATH')
+
+    print(f"{os.cpu_count()} CPUs, {args.seconds}s video, {args.connections} connections per file, "
+          f"{f'{args.rate_kib} KiB/s per connection' if args.rate_kib else 'unthrottled'}")
+    print(f"{'outputs':<17} {'jobs':<9} {'media MiB':>10} {'requests':>9} {'extractions':>12} {'wall':>8}  files")
+    with BenchServer(extract_delay=0.05, rate=args.rate_kib * 1024 or None, duration=args.seconds) as server, \
+            tempfile.TemporaryDirectory() as streams:
+        make_streams(server, streams, args.seconds)
+        for name, formats in CASES:
+            for label, format_choices in (('separate', formats), ('fan-out', ['+'.join(formats)])):
+                video_id = f"fanout{time.time_ns()}"
+                elapsed, stats, outputs = run(server, video_id, format_choices, args.connections, args.postprocess_workers)
+                print(f"{name:<17} {label:<9} {stats.get('media_bytes', 0) / 1024 / 1024:10.1f} "
+                      f"{stats.get('media_requests', 0):9} {stats.get('extract_count', 0):12} {elapsed:7.2f}s  "
+                      f"{' '.join(outputs)}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Enumerating a large channel: the whole playlist at once vs. lazily, page by page.
+
+The local bench server serves a synthetic playlist of --entries videos in pages of
+--page-size, each page taking --page-delay-ms. "eager" is a processed flat
+extraction, yt-dlp's extract_info(url, download=False), which holds every entry
+before anything is downloaded; "lazy" is expand_playlist() handing entries on as the
+pages come in (and dropped, so its peak is the reader's own). Peak memory (tracemalloc,
+in a separate run from the timings) and the time to the first entry are measured for
+both. The queue then downloads the playlist for --seconds: the time to the first
+downloaded byte, how far it read and downloaded, and the peak memory of the whole
+queue run, which keeps the unstarted entries and makes a job for each started one.
+Run from the repository root:
+    python benchmarks/bench_large_playlist.py [--entries 10000] [--page-size 100] [--page-delay-ms 20] [--seconds 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.download_queue import DownloadQueue  # noqa: E402
+from downloader.playlist import SESSION_PROFILE, expand_playlist  # noqa: E402
+from downloader.sessions import open_session  # noqa: E402
+
+
+def enumerate_eager(url):
+    started = time.perf_counter()
+    with open_session(SESSION_PROFILE) as ydl:
+        info = ydl.extract_info(url, download=False)
+        count = len(info['entries'])
+    # Nothing can be queued before the whole info dict is there.
+    return count, time.perf_counter() - started, time.perf_counter() - started
+
+
+def enumerate_lazy(url):
+    started = time.perf_counter()
+    first = []
+    count = [0]
+
+    def entries_callback(title, batch):
+        if not first:
+            first.append(time.perf_counter() - started)
+        count[0] += len(batch)
+
+    expand_playlist(url, entries_callback=entries_callback)
+    return count[0], first[0], time.perf_counter() - started
+
+
+def traced_peak(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def first_download(server, url, workers, seconds):
+    # Time until the queue gets the first media byte; then, after seconds, the entries read
+    # so far, those downloaded and those waiting for a worker.
+    server.reset()
+    with tempfile.TemporaryDirectory() as folder:
+        queue = DownloadQueue(max_workers=workers)
+        started = time.monotonic()
+        job = queue.add(url, "best", "", folder, False, False)
+        while server.first_byte_at is None:
+            time.sleep(0.001)
+        first_byte = server.first_byte_at - started
+        time.sleep(max(0, started + seconds - time.monotonic()))
+        entries, waiting = job.entry_count, len(job.entries)
+        downloaded = sum(1 for child in list(job.children) if child.status == "finished")
+        queue.cancel_all()
+        while queue.active_jobs():
+            time.sleep(0.01)
+        queue.shutdown()
+    return first_byte, entries, waiting, downloaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10000, help="videos in the playlist")
+    parser.add_argument("--page-size", type=int, default=100, help="entries per playlist page")
+    parser.add_argument("--page-delay-ms", type=int, default=20, help="server time per page (and per video)")
+    parser.add_argument("--workers", type=int, default=3, help="concurrent downloads in the queue run")
+    parser.add_argument("--seconds", type=float, default=10, help="length of the queue run")
+    args = parser.parse_args()
+
+    print(f"{args.entries} entries, {args.page_size} per page, {args.page_delay_ms} ms per page")
+    print(f"{'mode':<6} {'entries':>8} {'first entry':>12} {'all entries':>12} {'peak memory':>12}")
+    with BenchServer(media_size=64 * 1024, extract_delay=args.page_delay_ms / 1000, page_size=args.page_size) as server:
+        for name, function in (("eager", enumerate_eager), ("lazy", enumerate_lazy)):
+            url = server.playlist_url(args.entries, f"{name}{time.time_ns()}-")
+            count, first, total = function(url)
+            peak = traced_peak(function, url)
+            print(f"{name:<6} {count:8} {first:11.2f}s {total:11.2f}s {peak / 1024 / 1024:10.1f}MiB", flush=True)
+
+        url = server.playlist_url(args.entries, f"queue{time.time_ns()}-")
+        first_byte, entries, waiting, downloaded = first_download(server, url, args.workers, args.seconds)
+        url = server.playlist_url(args.entries, f"traced{time.time_ns()}-")
+        peak = traced_peak(first_download, server, url, args.workers, args.seconds)
+        print(f"queue ({args.workers} workers): first byte after {first_byte:.2f}s; after {args.seconds:g}s "
+              f"{entries} entries read, {downloaded} downloaded, {waiting} waiting for a worker; "
+              f"peak memory {peak / 1024 / 1024:.1f}MiB", flush=True)
+
+
+if __name__ == "__main__":
+    main()
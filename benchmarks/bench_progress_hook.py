@@ -0,0 +1,63 @@
+"""Per-call cost of temp-file tracking and metrics in the progress hook vs. temp folder size.
+
+Run from the repository root:
+    python benchmarks/bench_progress_hook.py
+"""
+import glob
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from downloader.metrics import JobMetrics  # noqa: E402
+from downloader.temp_files import TempFileTracker  # noqa: E402
+
+FOLDER_SIZES = (0, 100, 1000, 5000)
+CALLS = 500
+
+
+def legacy_tracking(d, temp_files):
+    temp_file = d['filename']
+    temp_files.add(temp_file)
+    if not temp_file.endswith('.part'):
+        part_file = temp_file + '.part'
+        if os.path.exists(part_file):
+            temp_files.add(part_file)
+    base_name = os.path.splitext(temp_file)[0]
+    for related_file in glob.glob(f"{base_name}*"):
+        if os.path.exists(related_file):
+            temp_files.add(related_file)
+
+
+def time_calls(func, events):
+    started = time.perf_counter()
+    for d in events:
+        func(d)
+    return (time.perf_counter() - started) / len(events) * 1e6
+
+
+def main():
+    print(f"{'files in temp':>14} {'legacy us/call':>16} {'tracker us/call':>16} {'metrics us/call':>16}")
+    for size in FOLDER_SIZES:
+        with tempfile.TemporaryDirectory() as temp_folder:
+            for index in range(size):
+                open(os.path.join(temp_folder, f"other video {index}.mp4.part"), "wb").close()
+            filename = os.path.join(temp_folder, "current video.f137.mp4")
+            open(filename + ".part", "wb").close()
+            events = [{'status': 'downloading', 'filename': filename, 'tmpfilename': filename + '.part',
+                       'downloaded_bytes': index * 1024, 'fragment_index': index, 'speed': 1e6}
+                      for index in range(CALLS)]
+
+            legacy_files = set()
+            legacy = time_calls(lambda d: legacy_tracking(d, legacy_files), events)
+            tracker = TempFileTracker(temp_folder)
+            current = time_calls(tracker.on_progress, events)
+            metrics = time_calls(JobMetrics('1', 'bench').on_progress, events)
+            print(f"{size:>14} {legacy:>16.1f} {current:>16.2f} {metrics:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Throughput of segmented (multi-connection) downloads against a per-connection throttled server.
+
+Run from the repository root:
+    python benchmarks/bench_segmented.py [--size-mib 32] [--rate-mib 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.segmented import download_ranges, MIN_SEGMENT_SIZE  # noqa: E402
+
+CONNECTIONS = (1, 2, 4, 8)
+
+
+def run_ranges(url, size, connections, folder):
+    def open_range(start, end):
+        return urllib.request.urlopen(urllib.request.Request(url, headers={"Range": f"bytes={start}-{end}"}))
+
+    segment_size = max(MIN_SEGMENT_SIZE, size // (connections * 4))
+    download_ranges(open_range, size, os.path.join(folder, "media.part"), connections, segment_size)
+
+
+def run_download_video(url, size, connections, folder):
+    from downloader.downloader import download_video
+    download_video(url, "mp4", "media", folder, folder, None, False, False,
+                   use_info_cache=False, connections=connections)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mib", type=int, default=32)
+    parser.add_argument("--rate-mib", type=float, default=2, help="per-connection server throttle")
+    parser.add_argument("--end-to-end", action="store_true", help="go through download_video and yt-dlp")
+    args = parser.parse_args()
+
+    size = args.size_mib * 1024 * 1024
+    with BenchServer(media_size=size, extract_delay=0, rate=args.rate_mib * 1024 * 1024) as server:
+        url = server.watch_url("segmented") if args.end_to_end else f"{server.base_url}/coffee-bench/media/x.mp4"
+        run = run_download_video if args.end_to_end else run_ranges
+        baseline = None
+        print(f"{'connections':>11} {'seconds':>8} {'MiB/s':>8} {'speedup':>8}")
+        for connections in CONNECTIONS:
+            with tempfile.TemporaryDirectory() as folder:
+                started = time.perf_counter()
+                run(url, size, connections, folder)
+                elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(f"{connections:>11} {elapsed:>8.2f} {args.size_mib / elapsed:>8.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config.settings import CONFIG_DIR_ENV
+
+CHUNK_SIZE = 64 * 1024
+_config_dir = None
+
+
+def isolate_config_dir():
+    """Point the config folder at a temporary one for the rest of this process and the
+    worker processes it starts, so the metadata cache, download archive, SponsorBlock
+    cache and job journal of a benchmark run never mix with the user's. Returns it."""
+    global _config_dir
+    if _config_dir is None:
+        _config_dir = tempfile.mkdtemp(prefix="coffee-bench-")
+        atexit.register(shutil.rmtree, _config_dir, True)
+    os.environ[CONFIG_DIR_ENV] = _config_dir
+    return _config_dir
+
+
+class BenchRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only=False):
+        bench = self.server.bench
+        sponsor_match = re.match(r"/api/skipSegments/([0-9a-f]{4,64})", self.path)
+        if sponsor_match:
+            self._send_sponsor_segments(bench, sponsor_match.group(1))
+            return
+        fragment_match = re.match(r"/coffee-bench/frag/([\w-]+)/(\d+)", self.path)
+        if fragment_match:
+            index = int(fragment_match.group(2))
+            size = min(bench.fragment_size, bench.media_size - index * bench.fragment_size)
+            if size <= 0:
+                self.send_error(404)
+                return
+            self._send_media(bench, head_only, size)
+            return
+        stream_match = re.match(r"/coffee-bench/stream/[\w-]+/([\w-]+)", self.path)
+        if stream_match:
+            stream = bench.streams.get(stream_match.group(1))
+            if stream is None:
+                self.send_error(404)
+                return
+            self._send_media(bench, head_only, data=stream["data"])
+            return
+        match = re.match(r"/coffee-bench/(api|media|playlist)/([\w.-]+)", self.path)
+        if not match:
+            self.send_error(404)
+            return
+        kind, name = match.groups()
+
+        if kind == "api":
+            bench.record("extract_count")
+            time.sleep(bench.extract_delay)
+            self._send_json({"id": name, "title": f"Bench video {name}", "size": bench.media_size,
+                             "duration": bench.duration,
+                             "fragments": -(-bench.media_size // bench.fragment_size),
+                             "decipher_rounds": bench.decipher_rounds,
+                             "streams": [{key: value for key, value in stream.items() if key != "data"}
+                                         for stream in bench.streams.values()]})
+        elif kind == "playlist":
+            bench.record("playlist_count")
+            time.sleep(bench.extract_delay)
+            count, _, prefix = name.partition("-")
+            count = int(count)
+            # With page_size set, entries come in pages like a channel's continuation requests.
+            page = int(parse_qs(urlparse(self.path).query).get("page", ["0"])[0])
+            page_size = bench.page_size or count
+            first, last = page * page_size, min(count, (page + 1) * page_size)
+            self._send_json({"id": f"playlist-{name}", "title": f"Bench playlist {name}",
+                             "entries": [f"{prefix or 'v'}{index}" for index in range(first, last)],
+                             "next_page": page + 1 if last < count else None})
+        else:
+            self._send_media(bench, head_only)
+
+    def _send_sponsor_segments(self, bench, prefix):
+        # Same shape as the SponsorBlock API: every known video whose ID hash starts with the prefix.
+        bench.record("sponsorblock_requests")
+        time.sleep(bench.extract_delay)
+        query = parse_qs(urlparse(self.path).query)
+        categories = set(json.loads(query.get("categories", ["[]"])[0]) or [])
+        results = []
+        for video_id, segments in bench.sponsor_segments.items():
+            video_hash = hashlib.sha256(video_id.encode("ascii")).hexdigest()
+            matching = [s for s in segments if not categories or s["category"] in categories]
+            if video_hash.startswith(prefix) and matching:
+                results.append({"videoID": video_id, "hash": video_hash, "segments": matching})
+        if not results:
+            self.send_error(404)
+            return
+        self._send_json(results)
+
+    def _send_media(self, bench, head_only, size=None, data=None):
+        size = len(data) if data is not None else size or bench.media_size
+        start, end = 0, size - 1
+        range_match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            if range_match.group(2):
+                end = min(int(range_match.group(2)), size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if head_only:
+            return
+
+        bench.record("media_requests")
+        position = start
+        sent_at = time.monotonic()
+        while position <= end:
+            chunk = min(CHUNK_SIZE, end - position + 1)
+            try:
+                self.wfile.write(data[position:position + chunk] if data is not None else bench.payload[:chunk])
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            bench.record_first_byte()
+            bench.record("media_bytes", chunk)
+            position += chunk
+            if bench.rate:
+                # Per-connection throttling, like a CDN capping each stream.
+                sent_at += chunk / bench.rate
+                delay = sent_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+class BenchServer:
+    """Localhost HTTP server standing in for YouTube's page, API and media hosts."""
+
+    def __init__(self, media_size=4 * 1024 * 1024, extract_delay=0.2, rate=None, duration=60,
+                 fragment_size=512 * 1024, decipher_rounds=0, page_size=None):
+        self.media_size = media_size
+        self.page_size = page_size
+        self.fragment_size = fragment_size
+        self.extract_delay = extract_delay
+        # Pure-Python work the extractor does per video, like yt-dlp running a signature function.
+        self.decipher_rounds = decipher_rounds
+        self.rate = rate
+        self.duration = duration
+        self.payload = bytes(range(256)) * (CHUNK_SIZE // 256)
+        self.stats = {}
+        self.first_byte_at = None
+        self.sponsor_segments = {}
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def __enter__(self):
+        # Cached info dicts point at this server's port, which the next run will not have.
+        isolate_config_dir()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), BenchRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.bench = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def watch_url(self, video_id):
+        return f"{self.base_url}/coffee-bench/watch/{video_id}"
+
+    def dash_url(self, video_id):
+        """A video served as a DASH-style list of fragments instead of one file."""
+        return f"{self.base_url}/coffee-bench/dash/{video_id}"
+
+    def playlist_url(self, count, prefix=None):
+        """A playlist of count videos, with IDs prefix0, prefix1, ... ('v' by default)."""
+        return f"{self.base_url}/coffee-bench/playlist/{count}" + (f"-{prefix}" if prefix else "")
+
+    def add_sponsor_segments(self, video_id, segments=None):
+        """Give video_id SponsorBlock segments; by default one 10s sponsor segment."""
+        self.sponsor_segments[video_id] = segments or [{
+            "segment": [10.0, 20.0], "category": "sponsor", "actionType": "skip",
+            "UUID": hashlib.sha256(f"{video_id}-sponsor".encode()).hexdigest(),
+            "videoDuration": self.duration, "description": "",
+        }]
+
+    def add_stream(self, format_id, path, ext, vcodec, acodec):
+        """Serve the media file at path as a format of every video, instead of the one fake progressive file.
+
+        With streams added, videos have split video/audio formats like YouTube's.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        self.streams[format_id] = {"format_id": format_id, "ext": ext, "vcodec": vcodec, "acodec": acodec,
+                                   "size": len(data), "data": data}
+
+    @property
+    def sponsorblock_api(self):
+        return self.base_url
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.first_byte_at = None
+
+    def record(self, key, amount=1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def record_first_byte(self):
+        if self.first_byte_at is None:
+            with self._lock:
+                if self.first_byte_at is None:
+                    self.first_byte_at = time.monotonic()
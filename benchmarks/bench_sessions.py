@@ -0,0 +1,61 @@
+"""Per-video overhead for short clips, with and without reusing warm YoutubeDL sessions.
+
+Downloads many tiny videos from the local bench server, one at a time and as a
+playlist, so the time per video is mostly yt-dlp setup rather than transfer.
+Run from the repository root:
+    python benchmarks/bench_sessions.py [--videos 40] [--size-kib 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.download_queue import DownloadQueue  # noqa: E402
+from downloader.sessions import get_session_pool  # noqa: E402
+
+
+def run(server, urls, reuse_sessions, workers):
+    with tempfile.TemporaryDirectory() as folder:
+        queue = DownloadQueue(max_workers=workers, reuse_sessions=reuse_sessions)
+        started = time.perf_counter()
+        jobs = [queue.add(url, "best", "", folder, False, False) for url in urls]
+        while queue.active_jobs():
+            time.sleep(0.002)
+        elapsed = time.perf_counter() - started
+        queue.shutdown()
+    videos = [job for job in queue.jobs.values() if not job.children]
+    failed = [job for job in videos if job.status != "finished"]
+    if failed:
+        raise Exception(f"{len(failed)} jobs failed: {failed[0].error}")
+    return elapsed, len(videos)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=40, help="videos per case")
+    parser.add_argument("--size-kib", type=int, default=64, help="size of each video")
+    args = parser.parse_args()
+
+    cases = (
+        ("single videos", 1, lambda prefix: [server.watch_url(f"{prefix}{index}") for index in range(args.videos)]),
+        ("playlist", 2, lambda prefix: [server.playlist_url(args.videos, prefix)]),
+    )
+    print(f"{'case':<14} {'sessions':<9} {'total':>8} {'per video':>10}")
+    with BenchServer(media_size=args.size_kib * 1024, extract_delay=0) as server:
+        # Imports and plugin loading happen once per process; keep them out of the first case.
+        run(server, [server.watch_url(f"warmup{time.time_ns()}")], False, 1)
+        for name, workers, urls_for in cases:
+            for reuse_sessions in (False, True):
+                get_session_pool().clear()
+                elapsed, videos = run(server, urls_for(f"s{time.time_ns()}-"), reuse_sessions, workers)
+                print(f"{name:<14} {'reused' if reuse_sessions else 'new':<9} {elapsed:7.2f}s "
+                      f"{elapsed / videos * 1000:8.1f}ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
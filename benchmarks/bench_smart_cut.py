@@ -0,0 +1,107 @@
+"""SponsorBlock cutting: yt-dlp's ModifyChapters + FFmpegMetadata vs. the single-pass smart cut.
+
+Generates an H.264/AAC test video with ffmpeg, so ffmpeg and ffprobe (with libx264)
+have to be on PATH. Run from the repository root:
+    python benchmarks/bench_smart_cut.py [--duration 300] [--gop 5] [--size 1280x720]
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+CATEGORIES = ['sponsor', 'intro', 'outro', 'selfpromo', 'interaction']
+
+
+def make_media(path, duration, gop, size):
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(gop * 30), '-keyint_min', str(gop * 30),
+        '-sc_threshold', '0', '-c:a', 'aac', '-shortest', path], check=True)
+
+
+def probe_duration(path):
+    return float(subprocess.check_output(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                                          '-of', 'csv=p=0', path]))
+
+
+def sponsor_segments(duration):
+    # Segment borders never fall on the generated keyframes, like real submissions.
+    return [
+        {'segment': [0.0, 7.3], 'category': 'intro'},
+        {'segment': [duration * 0.3 + 1.1, duration * 0.3 + 38.7], 'category': 'sponsor'},
+        {'segment': [duration * 0.7 + 2.4, duration * 0.7 + 14.9], 'category': 'selfpromo'},
+    ]
+
+
+def run_postprocessors(path, duration, chapters, postprocessors):
+    import yt_dlp
+    from yt_dlp.postprocessor.sponsorblock import SponsorBlockPP
+    from downloader.downloader import add_postprocessors
+
+    segments = [dict(segment, actionType='skip', videoDuration=duration, UUID=str(index))
+                for index, segment in enumerate(sponsor_segments(duration))]
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        sponsorblock = SponsorBlockPP(ydl, categories=CATEGORIES)
+        sponsorblock._get_sponsor_segments = lambda video_id, service: segments
+        info = {'id': 'bench', 'title': 'bench', 'extractor_key': 'Youtube', 'duration': duration,
+                'filepath': path, 'ext': os.path.splitext(path)[1][1:], 'chapters': chapters,
+                '__real_download': True}
+        _, info = sponsorblock.run(info)
+        add_postprocessors(ydl, postprocessors)
+        info = ydl.post_process(path, info)
+    return info
+
+
+def measure(label, source, folder, postprocessors):
+    path = os.path.join(folder, f"{label.replace(' ', '_')}.mp4")
+    shutil.copy(source, path)
+    duration = probe_duration(source)
+    chapters = [{'start_time': 0, 'end_time': duration / 2, 'title': 'First half'},
+                {'start_time': duration / 2, 'end_time': duration, 'title': 'Second half'}]
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    info = run_postprocessors(path, duration, chapters, postprocessors)
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - children.ru_utime) + (after.ru_stime - children.ru_stime)
+
+    expected = info['chapters'][-1]['end_time']
+    error = probe_duration(path) - expected
+    print(f"{label:<24} {elapsed:6.2f}s wall {cpu:7.2f}s ffmpeg cpu  "
+          f"duration off by {error:+.2f}s  {os.path.getsize(path) / 1e6:6.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=int, default=300, help="test video length in seconds")
+    parser.add_argument("--gop", type=int, default=5, help="keyframe interval in seconds")
+    parser.add_argument("--size", default="1280x720")
+    args = parser.parse_args()
+
+    chapters_pp = {'key': 'ModifyChapters', 'remove_sponsor_segments': CATEGORIES,
+                   'sponsorblock_chapter_title': '[SponsorBlock]: %(category_names)s'}
+    metadata_pp = {'key': 'FFmpegMetadata', 'add_chapters': True, 'add_metadata': False}
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'source.mp4')
+        make_media(source, args.duration, args.gop, args.size)
+        print(f"{args.duration}s {args.size} H.264/AAC, keyframe every {args.gop}s, "
+              f"{os.path.getsize(source) / 1e6:.1f}MB")
+        measure("stock copy", source, folder, [chapters_pp, metadata_pp])
+        measure("stock force_keyframes", source, folder,
+                [dict(chapters_pp, force_keyframes=True), metadata_pp])
+        measure("smart cut", source, folder,
+                [{'key': 'SmartCut', 'remove_sponsor_segments': CATEGORIES,
+                  'sponsorblock_chapter_title': '[SponsorBlock]: %(category_names)s'}])
+
+
+if __name__ == "__main__":
+    main()
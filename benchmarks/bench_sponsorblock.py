@@ -0,0 +1,68 @@
+"""SponsorBlock lookups for a playlist: yt-dlp's per-video requests vs. batched prefetch vs. the local cache.
+
+Run from the repository root:
+    python benchmarks/bench_sponsorblock.py [--videos 200] [--latency-ms 80]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.sponsorblock import SegmentCache, prefetch_segments  # noqa: E402
+
+CATEGORIES = ['sponsor', 'intro', 'outro', 'selfpromo', 'interaction']
+
+
+def video_ids(count):
+    rng = random.Random(0)
+    alphabet = string.ascii_letters + string.digits + "-_"
+    return ["".join(rng.choice(alphabet) for _ in range(11)) for _ in range(count)]
+
+
+def per_video(server, ids):
+    import yt_dlp
+    from yt_dlp.postprocessor.sponsorblock import SponsorBlockPP
+
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        pp = SponsorBlockPP(ydl, categories=CATEGORIES, api=server.sponsorblock_api)
+        for video_id in ids:
+            pp._get_sponsor_segments(video_id, 'YouTube')
+
+
+def measure(server, label, func):
+    server.reset()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:>8.2f}s {server.stats.get('sponsorblock_requests', 0):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=80, help="simulated API round trip")
+    args = parser.parse_args()
+
+    ids = video_ids(args.videos)
+    with BenchServer(extract_delay=args.latency_ms / 1000) as server, tempfile.TemporaryDirectory() as folder:
+        for video_id in ids[::2]:
+            server.add_sponsor_segments(video_id)
+        cache = SegmentCache(os.path.join(folder, "sponsorblock.sqlite3"))
+        print(f"{'':<28} {'seconds':>9} {'requests':>9}")
+        measure(server, "yt-dlp, one per video", lambda: per_video(server, ids))
+        measure(server, "prefetch, cold cache", lambda: prefetch_segments(
+            ids, CATEGORIES, api=server.sponsorblock_api, cache=cache))
+        measure(server, "prefetch, warm cache", lambda: prefetch_segments(
+            ids, CATEGORIES, api=server.sponsorblock_api, cache=cache))
+        measure(server, "cache lookups", lambda: [cache.get(video_id, 'YouTube', CATEGORIES) for video_id in ids])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Time from process start to the main window being visible, plus an import-time report.
+
+Starts the GUI the way main.py does in a child process with ``-X importtime``, once
+with the current lazy imports and once with yt_dlp imported up front (the old
+behaviour), and reports the heaviest top-level imports seen before the window shows.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py [--runs 5] [--offscreen]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_DIR, BENCH_DIR]
+
+from bench_server import isolate_config_dir  # noqa: E402
+
+CHILD = r'''
+import sys
+if sys.argv[1] == "eager":
+    import yt_dlp
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+from gui.main_window import MainWindow
+from config.languages import get_text
+from gui.controller import Controller
+
+app = QApplication([])
+window = MainWindow(get_text)
+controller = Controller(window)
+window.show()
+
+def visible():
+    print("visible", flush=True)
+    sys.stderr.write("-- window visible --\n")
+    controller.warm_up_thread.join()
+    print("warm", flush=True)
+    app.quit()
+
+QTimer.singleShot(0, visible)
+app.exec()
+'''
+
+
+def run_once(mode, env):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-X", "importtime", "-c", CHILD, mode], cwd=REPO_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    marks = {}
+    for line in process.stdout:
+        marks[line.strip()] = time.perf_counter() - started
+    stderr = process.stderr.read()
+    process.wait()
+    if "visible" not in marks:
+        raise RuntimeError(f"GUI did not start:\n{stderr[-2000:]}")
+    return marks["visible"], marks.get("warm"), stderr.split("-- window visible --")[0]
+
+
+def top_level_imports(importtime_output, limit=8):
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):
+            continue
+        root = name.strip().split(".")[0]
+        totals[root] = totals.get(root, 0) + int(cumulative)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--offscreen", action="store_true", help="use the offscreen Qt platform (headless)")
+    args = parser.parse_args()
+
+    # The GUI opens the job journal and the archive, and offers to resume what it finds.
+    isolate_config_dir()
+    env = dict(os.environ)
+    if args.offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+
+    for mode in ("lazy", "eager"):
+        results = [run_once(mode, env) for _ in range(args.runs)]
+        visible = statistics.median(result[0] for result in results)
+        warm = statistics.median(result[1] for result in results)
+        print(f"{mode:>5}: window visible {visible * 1000:7.0f} ms, yt-dlp ready {warm * 1000:7.0f} ms "
+              f"(median of {args.runs})")
+        for name, micros in top_level_imports(results[-1][2]):
+            print(f"        {name:<28} {micros / 1000:8.1f} ms before window visible")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Benchmark suite for the download pipeline, with results saved for regression comparison.
+
+Every scenario runs through DownloadQueue against the local bench server and the
+coffeebench extractor plugin, so no network access is needed:
+
+  single_progressive   one progressive file over 1 and 4 connections
+  single_dash          one video as a list of DASH-style fragments
+  playlist             a playlist expanded and downloaded by 3 workers
+  concurrent           several single videos added at once
+  cancellation         time from cancel() until the job reports cancelled, while downloading,
+                       extracting and enumerating a playlist; no temp files may be left
+  hook_overhead        cost of the per-block progress bookkeeping
+
+Run from the repository root:
+    python benchmarks/run_suite.py [--quick] [--repeat 3] [--output FILE] [--compare BASELINE]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.download_queue import DownloadJob, DownloadQueue  # noqa: E402
+from downloader.metrics import JobMetrics, MetricsRegistry  # noqa: E402
+from downloader.temp_files import TempFileTracker  # noqa: E402
+
+MIB = 1024 * 1024
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# Metrics where a higher value is better; for all others lower is better.
+HIGHER_IS_BETTER = ("throughput_mib_s",)
+
+
+class Run:
+    """One queue against one server, with unique video IDs so no cache is ever hit."""
+
+    def __init__(self, server, folder, workers=3, connections=1):
+        self.server = server
+        self.folder = folder
+        self.metrics = MetricsRegistry()
+        self.queue = DownloadQueue(max_workers=workers, download_connections=connections, metrics=self.metrics)
+        self.prefix = f"b{time.time_ns()}"
+        server.reset()
+
+    def video_id(self, name):
+        return f"{self.prefix}{name}"
+
+    def add(self, url):
+        return self.queue.add(url, "best", "", self.folder, False, False)
+
+    def wait(self, timeout=600):
+        deadline = time.monotonic() + timeout
+        while self.queue.active_jobs():
+            if time.monotonic() > deadline:
+                raise Exception("benchmark scenario timed out")
+            time.sleep(0.005)
+        self.queue.shutdown()
+
+    def finished(self):
+        return [job for job in self.queue.jobs.values() if not job.children]
+
+    def phase(self, name):
+        return sum(record["phases"].get(name, 0.0) for record in self.metrics.recent)
+
+
+def check(jobs):
+    failed = [job for job in jobs if job.status != "finished"]
+    if failed:
+        raise Exception(f"{len(failed)} benchmark jobs failed: {failed[0].error}")
+
+
+def download(server, folder, urls_for, workers=3, connections=1):
+    run = Run(server, folder, workers, connections)
+    started = time.monotonic()
+    for url in urls_for(run):
+        run.add(url)
+    run.wait()
+    total = time.monotonic() - started
+    jobs = run.finished()
+    check(jobs)
+    size = sum(os.path.getsize(path) for job in jobs for path in job.final_filepaths)
+    return {
+        "total_s": total,
+        "throughput_mib_s": size / MIB / total,
+        "ttfb_ms": (server.first_byte_at - started) * 1000,
+        "extraction_s": run.phase("extraction"),
+        "finalize_ms": run.phase("move") * 1000 / len(jobs),
+        "media_requests": server.stats.get("media_requests", 0),
+    }
+
+
+def scenario_single_progressive(server, folder, args):
+    results = {}
+    for connections in (1, 4):
+        result = download(server, folder, lambda run: [server.watch_url(run.video_id("p"))],
+                          connections=connections)
+        results.update({f"{key}@{connections}conn": value for key, value in result.items()})
+    return results
+
+
+def scenario_single_dash(server, folder, args):
+    return download(server, folder, lambda run: [server.dash_url(run.video_id("d"))], connections=4)
+
+
+def scenario_playlist(server, folder, args):
+    return download(server, folder, lambda run: [server.playlist_url(args.playlist, run.video_id("l"))])
+
+
+def scenario_concurrent(server, folder, args):
+    return download(server, folder, lambda run: [server.watch_url(run.video_id(f"c{index}"))
+                                                 for index in range(args.concurrent)],
+                    workers=args.concurrent)
+
+
+def cancel_and_wait(run, job, started):
+    """Wait until started(job), cancel it and return the milliseconds until the job stopped."""
+    while not started(job):
+        if not job.is_active():
+            raise Exception(f"job ended before it could be cancelled: {job.error}")
+        time.sleep(0.01)
+    cancelled_at = time.monotonic()
+    run.queue.cancel(job.job_id)
+    while job.is_active():
+        time.sleep(0.001)
+    latency = (time.monotonic() - cancelled_at) * 1000
+    run.wait()
+    leftovers = [path for path in job.temp_files.files if os.path.exists(path)]
+    if leftovers:
+        raise Exception(f"cancelled job left {len(leftovers)} temp files behind: {leftovers[0]}")
+    return latency
+
+
+def scenario_cancellation(server, folder, args):
+    results = {}
+    saved = server.media_size, server.rate, server.extract_delay
+    # A slow, large download that is certainly still running when it is cancelled.
+    server.media_size, server.rate = 256 * MIB, 2 * MIB
+    try:
+        for label, connections, url_for in (("progressive", 1, server.watch_url),
+                                            ("segmented", 4, server.watch_url),
+                                            ("dash", 4, server.dash_url)):
+            run = Run(server, folder, workers=1, connections=connections)
+            job = run.add(url_for(run.video_id(label)))
+            results[f"latency_ms@{label}"] = cancel_and_wait(run, job, lambda job: job.downloaded_bytes >= MIB)
+        # Extraction and playlist enumeration stuck waiting for a response that takes 10s.
+        server.extract_delay = 10
+
+        def extracting(job):
+            return server.stats.get("extract_count", 0) + server.stats.get("playlist_count", 0) > 0
+
+        for label, url_for in (("extraction", server.watch_url),
+                               ("playlist", lambda video_id: server.playlist_url(10, video_id))):
+            run = Run(server, folder, workers=1)
+            job = run.add(url_for(run.video_id(label)))
+            results[f"latency_ms@{label}"] = cancel_and_wait(run, job, extracting)
+    finally:
+        server.media_size, server.rate, server.extract_delay = saved
+    return results
+
+
+def scenario_hook_overhead(server, folder, args):
+    # What the queue does for every downloaded block, minus yt-dlp itself.
+    calls = 20000
+    job = DownloadJob("1", "bench", "best", "", folder, False, False)
+    tracker = TempFileTracker(folder)
+    metrics = JobMetrics("1", "bench")
+    filename = os.path.join(folder, "video.mp4")
+    events = [{"status": "downloading", "filename": filename, "tmpfilename": filename + ".part",
+               "downloaded_bytes": index * 65536, "total_bytes": calls * 65536, "speed": 1e7}
+              for index in range(calls)]
+    started = time.perf_counter()
+    for d in events:
+        tracker.on_progress(d)
+        metrics.on_progress(d)
+        job.update_bytes(d["filename"], d["downloaded_bytes"])
+        job.update_progress(int(d["downloaded_bytes"] * 100 / d["total_bytes"]))
+    return {"per_call_us": (time.perf_counter() - started) / calls * 1e6}
+
+
+SCENARIOS = {
+    "single_progressive": scenario_single_progressive,
+    "single_dash": scenario_single_dash,
+    "playlist": scenario_playlist,
+    "concurrent": scenario_concurrent,
+    "cancellation": scenario_cancellation,
+    "hook_overhead": scenario_hook_overhead,
+}
+
+
+def environment():
+    try:
+        import yt_dlp.version
+        yt_dlp_version = yt_dlp.version.__version__
+    except ImportError:
+        yt_dlp_version = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "yt_dlp": yt_dlp_version,
+        "commit": commit,
+    }
+
+
+def run_suite(args):
+    results = {}
+    with BenchServer(media_size=args.size_mib * MIB, extract_delay=args.extract_delay_ms / 1000) as server:
+        # Imports, extractor and plugin loading happen once per process; keep them out of the first scenario.
+        with tempfile.TemporaryDirectory() as folder:
+            download(server, folder, lambda run: [server.watch_url(run.video_id("warmup"))])
+        for name in args.scenarios:
+            samples = []
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as folder:
+                    samples.append(SCENARIOS[name](server, folder, args))
+            results[name] = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+            print(f"{name}: " + ", ".join(f"{key}={value:.2f}" for key, value in results[name].items()),
+                  flush=True)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Print current vs. baseline results and return the metrics that got worse than threshold percent."""
+    regressions = []
+    print(f"\n{'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario, metrics in current["results"].items():
+        for key, value in metrics.items():
+            old = baseline.get("results", {}).get(scenario, {}).get(key)
+            if old is None:
+                continue
+            change = (value - old) / old * 100 if old else 0.0
+            worse = -change if key.startswith(HIGHER_IS_BETTER) else change
+            flag = ""
+            if worse > threshold and key != "media_requests":
+                flag = "  REGRESSION"
+                regressions.append(f"{scenario}.{key}")
+            print(f"{scenario + '.' + key:<44} {old:>10.2f} {value:>10.2f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=tuple(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the median is reported")
+    parser.add_argument("--size-mib", type=int, default=64, help="size of each synthetic video")
+    parser.add_argument("--playlist", type=int, default=10, help="entries in the playlist scenario")
+    parser.add_argument("--concurrent", type=int, default=6, help="videos in the concurrent scenario")
+    parser.add_argument("--extract-delay-ms", type=int, default=50, help="simulated extraction latency")
+    parser.add_argument("--quick", action="store_true", help="small sizes and one run, for a smoke test")
+    parser.add_argument("--output", help="where to save the results (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="percent change reported as a regression")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.size_mib, args.playlist, args.concurrent = 1, 8, 4, 3
+
+    current = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "settings": {key: getattr(args, key) for key in ("repeat", "size_mib", "playlist", "concurrent",
+                                                         "extract_delay_ms")},
+        "results": run_suite(args),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        settings = {key: value for key, value in current["settings"].items() if key != "repeat"}
+        if {key: value for key, value in baseline.get("settings", {}).items() if key != "repeat"} != settings:
+            print("Warning: the baseline was run with different settings")
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
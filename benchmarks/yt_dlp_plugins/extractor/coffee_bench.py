@@ -0,0 +1,82 @@
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class CoffeeBenchIE(InfoExtractor):
+    IE_NAME = 'coffeebench'
+    _VALID_URL = r'(?P<base>https?://127\.0\.0\.1:\d+)/coffee-bench/(?P<kind>watch|dash)/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        base, kind, video_id = self._match_valid_url(url).group('base', 'kind', 'id')
+        data = self._download_json(f'{base}/coffee-bench/api/{video_id}', video_id)
+        if data.get('decipher_rounds'):
+            self._decipher(video_id, data['decipher_rounds'])
+        if data.get('streams'):
+            formats = [{
+                'format_id': stream['format_id'],
+                'url': f'{base}/coffee-bench/stream/{video_id}/{stream["format_id"]}',
+                'ext': stream['ext'],
+                'vcodec': stream['vcodec'],
+                'acodec': stream['acodec'],
+                'filesize': stream['size'],
+            } for stream in data['streams']]
+            return {'id': video_id, 'title': data['title'], 'duration': data.get('duration'), 'formats': formats}
+        if kind == 'dash':
+            duration = data.get('duration') or 0
+            fmt = {
+                'format_id': 'dash',
+                'url': url,
+                'protocol': 'http_dash_segments',
+                'fragment_base_url': f'{base}/coffee-bench/frag/{video_id}/',
+                'fragments': [{'path': str(index), 'duration': duration / data['fragments']}
+                              for index in range(data['fragments'])],
+            }
+        else:
+            fmt = {
+                'format_id': 'progressive',
+                'url': f'{base}/coffee-bench/media/{video_id}.mp4',
+                'filesize': data['size'],
+            }
+        return {
+            'id': video_id,
+            'title': data['title'],
+            'duration': data.get('duration'),
+            'formats': [{**fmt, 'ext': 'mp4', 'vcodec': 'avc1.4d401f', 'acodec': 'mp4a.40.2'}],
+        }
+
+
+    @staticmethod
+    def _decipher(signature, rounds):
+        # Stands in for yt-dlp's JS interpreter: CPU-bound Python that holds the GIL.
+        value = list(signature * 4)
+        for index in range(rounds):
+            position = index % len(value)
+            value[0], value[position] = value[position], value[0]
+            if index % 7 == 0:
+                value.reverse()
+        return ''.join(value)
+
+
+class CoffeeBenchPlaylistIE(InfoExtractor):
+    IE_NAME = 'coffeebench:playlist'
+    _VALID_URL = r'(?P<base>https?://127\.0\.0\.1:\d+)/coffee-bench/playlist/(?P<id>\d+(?:-\w+)?)'
+
+    def _real_extract(self, url):
+        base, playlist_id = self._match_valid_url(url).group('base', 'id')
+        data = self._download_json(f'{base}/coffee-bench/playlist/{playlist_id}', playlist_id)
+        return self.playlist_result(self._entries(base, playlist_id, data), data['id'], data['title'])
+
+    def _entries(self, base, playlist_id, data):
+        # Fetches the next page only once the previous one is consumed, like a channel's tab.
+        while True:
+            for video_id in data['entries']:
+                # Flat entries carry about as much metadata as YouTube's.
+                yield self.url_result(
+                    f'{base}/coffee-bench/watch/{video_id}', CoffeeBenchIE, video_id, f'Bench video {video_id}',
+                    description=f'Description of bench video {video_id}. ' * 8, duration=60, view_count=1000,
+                    thumbnails=[{'url': f'{base}/coffee-bench/thumb/{video_id}/{size}.jpg', 'width': size,
+                                 'height': size * 9 // 16} for size in (168, 196, 246, 336)])
+            if data.get('next_page') is None:
+                return
+            data = self._download_json(f'{base}/coffee-bench/playlist/{playlist_id}', playlist_id,
+                                       note=f'Downloading page {data["next_page"] + 1}',
+                                       query={'page': data['next_page']})
@@ -2,7 +2,7 @@ LANGUAGES = {
     "en": {
         "app_title": "Coffee YT Downloader",
         "url_group": "Video URL",
-        "url_placeholder": "Enter YouTube URL...",
+        "url_placeholder": "Enter YouTube URL(s), one per line...",
         "options_group": "Options",
         "format_label": "Format:",
         "filename_label": "File name:",
@@ -33,11 +33,29 @@ LANGUAGES = {
         "cancelled_message": "Download has been cancelled.",
         "temp_files_remain_message": "Temporary files remain in the folder:",
         "resuming_download": "Resuming download...",
+        "max_workers_label": "Concurrent downloads:",
+        "job_url_column": "URL",
+        "job_status_column": "Status",
+        "job_progress_column": "Progress",
+        "job_queued": "Queued",
+        "job_downloading": "Downloading",
+        "job_finished": "Done",
+        "job_error": "Error",
+        "job_cancelled": "Cancelled",
+        "batch_errors_message": "Some downloads failed:",
+        "connections_label": "Connections per download:",
+        "job_finalizing": "Moving files",
+        "resume_title": "Resume downloads",
+        "resume_question": "{count} unfinished download(s) from the last session were found. Resume them now?",
+        "sync_label": "Only new videos (sync playlists/channels)",
+        "job_processing": "Processing",
+        "job_retrying": "Retrying",
+        "resume_owned_elsewhere": "{count} download(s) are still running in another window or process",
     },
     "vi": {
         "app_title": "Coffee YT Downloader",
         "url_group": "URL Video",
-        "url_placeholder": "Nhập URL YouTube...",
+        "url_placeholder": "Nhập URL YouTube (mỗi dòng một URL)...",
         "options_group": "Tùy chọn",
         "format_label": "Định dạng:",
         "filename_label": "Tên file:",
@@ -68,13 +86,31 @@ LANGUAGES = {
         "cancelled_message": "Quá trình tải xuống đã bị hủy.",
         "temp_files_remain_message": "Các file tạm vẫn còn trong thư mục:",
         "resuming_download": "Đang tiếp tục tải xuống...",
+        "max_workers_label": "Số lượt tải đồng thời:",
+        "job_url_column": "URL",
+        "job_status_column": "Trạng thái",
+        "job_progress_column": "Tiến trình",
+        "job_queued": "Đang chờ",
+        "job_downloading": "Đang tải",
+        "job_finished": "Hoàn tất",
+        "job_error": "Lỗi",
+        "job_cancelled": "Đã hủy",
+        "batch_errors_message": "Một số lượt tải thất bại:",
+        "connections_label": "Số kết nối mỗi lượt tải:",
+        "job_finalizing": "Đang di chuyển file",
+        "resume_title": "Tiếp tục tải xuống",
+        "resume_question": "Tìm thấy {count} lượt tải chưa hoàn tất từ phiên trước. Tiếp tục tải ngay?",
+        "sync_label": "Chỉ tải video mới (đồng bộ playlist/kênh)",
+        "job_processing": "Đang xử lý",
+        "job_retrying": "Đang thử lại",
+        "resume_owned_elsewhere": "{count} lượt tải vẫn đang chạy trong một cửa sổ hoặc tiến trình khác",
 
 
     },
     "jp": {
         "app_title": "Coffee YT ダウンローダー",
         "url_group": "ビデオのURL",
-        "url_placeholder": "YouTubeのURLを入力してください...",
+        "url_placeholder": "YouTubeのURLを入力してください（1行に1つ）...",
         "options_group": "オプション",
         "format_label": "フォーマット:",
         "filename_label": "ファイル名:",
@@ -105,6 +141,24 @@ LANGUAGES = {
         "cancelled_message": "ダウンロードがキャンセルされました。",
         "temp_files_remain_message": "一時ファイルがフォルダに残っています：",
         "resuming_download": "ダウンロードを再開しています...",
+        "max_workers_label": "同時ダウンロード数:",
+        "job_url_column": "URL",
+        "job_status_column": "ステータス",
+        "job_progress_column": "進行状況",
+        "job_queued": "待機中",
+        "job_downloading": "ダウンロード中",
+        "job_finished": "完了",
+        "job_error": "エラー",
+        "job_cancelled": "キャンセル済み",
+        "batch_errors_message": "一部のダウンロードが失敗しました:",
+        "connections_label": "ダウンロードごとの接続数:",
+        "job_finalizing": "ファイル移動中",
+        "resume_title": "ダウンロードの再開",
+        "resume_question": "前回のセッションで未完了のダウンロードが {count} 件見つかりました。今すぐ再開しますか？",
+        "sync_label": "新しい動画のみ（プレイリスト/チャンネルを同期）",
+        "job_processing": "処理中",
+        "job_retrying": "再試行待ち",
+        "resume_owned_elsewhere": "{count} 件のダウンロードが別のウィンドウまたはプロセスで実行中です",
     }
 }
 
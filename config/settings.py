@@ -2,27 +2,49 @@ import os
 import json
 import sys
 
-def get_config_path():
-    if getattr(sys, 'frozen', False):
+# Another folder for config.json, the caches, the download archive and the job journal;
+# the benchmarks point it at a temporary one.
+CONFIG_DIR_ENV = "COFFEE_YTDL_CONFIG_DIR"
+
+def get_config_dir():
+    if os.getenv(CONFIG_DIR_ENV):
+        base_path = os.getenv(CONFIG_DIR_ENV)
+    elif getattr(sys, 'frozen', False):
         base_path = os.path.join(os.getenv("APPDATA"), "CoffeeYTDownloader")
     else:
         base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
     if not os.path.exists(base_path):
         os.makedirs(base_path)
-    return os.path.join(base_path, "config.json")
+    return base_path
+
+def get_config_path():
+    return os.path.join(get_config_dir(), "config.json")
 
 def load_config():
     config_path = get_config_path()
     default_config = {
         "download_folder": os.path.expanduser("~/Downloads"),
         "format_choice": "Best",
-        "language": "English"
+        "language": "English",
+        "max_concurrent_downloads": 3,
+        "download_connections": 4,
+        "use_download_archive": True,
+        "sponsorblock_api": "https://sponsor.ajay.app",
+        "bandwidth_limit_day": 0,
+        "bandwidth_limit_night": 0,
+        "bandwidth_day_starts": "08:00",
+        "bandwidth_night_starts": "22:00",
+        "metrics_file": "",
+        "metrics_port": 0,
+        "retry_budget": 5,
+        "execution_backend": "thread",
+        "reuse_sessions": True
     }
     if os.path.exists(config_path):
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                return {**default_config, **json.load(f)}
         except json.JSONDecodeError as e:
             print(f"Error decoding config.json: {e}. Using default config.")
             return default_config
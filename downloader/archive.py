@@ -0,0 +1,84 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import get_config_dir
+from downloader.sql_batches import in_batches
+
+_shared_archive = None
+_shared_archive_lock = threading.Lock()
+
+
+def entry_archive_key(entry):
+    """Archive key of a flat playlist entry, matching info_cache_key() of its URL when possible."""
+    if entry.get('ie_key') and entry.get('id'):
+        return f"{entry['ie_key']}:{entry['id']}"
+    return None
+
+
+class DownloadArchive:
+    """Index of finished downloads, so the same video is not fetched twice.
+
+    Entries are keyed by extractor:video_id plus everything that changes the output
+    (format and SponsorBlock options) and point at the final files. An entry whose
+    files were deleted or moved away no longer counts as downloaded.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_config_dir(), "archive.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            "video_key TEXT NOT NULL, format_choice TEXT NOT NULL, options TEXT NOT NULL, "
+            "filepaths TEXT NOT NULL, size INTEGER NOT NULL, downloaded REAL NOT NULL, "
+            "PRIMARY KEY (video_key, format_choice, options)) WITHOUT ROWID")
+
+    @staticmethod
+    def _options(use_sponsorblock, skip_no_music):
+        return f"sponsorblock={int(bool(use_sponsorblock))},skip_no_music={int(bool(skip_no_music))}"
+
+    def add(self, video_key, format_choice, use_sponsorblock, skip_no_music, filepaths):
+        size = sum(os.path.getsize(path) for path in filepaths if os.path.isfile(path))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO archive (video_key, format_choice, options, filepaths, size, downloaded) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_key, format_choice, self._options(use_sponsorblock, skip_no_music),
+                 json.dumps(filepaths), size, time.time()))
+
+    def lookup(self, video_key, format_choice, use_sponsorblock, skip_no_music):
+        """Return the archived files of a video, or None if it has to be downloaded."""
+        return self.lookup_many([video_key], format_choice, use_sponsorblock, skip_no_music).get(video_key)
+
+    def lookup_many(self, video_keys, format_choice, use_sponsorblock, skip_no_music):
+        """Return {video_key: filepaths} for the keys whose files are all still on disk."""
+        options = self._options(use_sponsorblock, skip_no_music)
+        keys = [key for key in dict.fromkeys(video_keys) if key]
+        found = {}
+        for placeholders, batch in in_batches(keys):
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT video_key, filepaths FROM archive WHERE format_choice = ? AND options = ? "
+                    f"AND video_key IN ({placeholders})", [format_choice, options] + batch).fetchall()
+            for video_key, filepaths in rows:
+                filepaths = json.loads(filepaths)
+                if filepaths and all(os.path.isfile(path) for path in filepaths):
+                    found[video_key] = filepaths
+        return found
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+
+
+def get_archive():
+    global _shared_archive
+    with _shared_archive_lock:
+        if _shared_archive is None:
+            _shared_archive = DownloadArchive()
+        return _shared_archive
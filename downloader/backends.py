@@ -0,0 +1,254 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+
+from downloader.cancel import CancelToken
+from downloader.downloader import download_video, postprocess_video
+from downloader.metrics import JobMetrics
+from downloader.playlist import expand_playlist
+from downloader.sessions import get_session_pool
+from downloader.temp_files import TempFileTracker
+
+FUNCTIONS = {
+    'download_video': download_video,
+    'postprocess_video': postprocess_video,
+    'expand_playlist': expand_playlist,
+}
+# Callbacks a job function may get, and whether the worker waits for the return value:
+# bytes_callback blocks for bandwidth limiting, stop_check answers from the archive and
+# entries_callback holds playlist reading back while enough entries wait for the queue.
+CALLBACKS = {'progress_callback': False, 'log_callback': False, 'bytes_callback': True, 'stop_check': True,
+             'entries_callback': True}
+WORKER_EXITED_MESSAGE = "Worker process exited unexpectedly"
+
+
+class ThreadBackend:
+    """Runs job functions in the calling queue thread."""
+
+    name = "thread"
+
+    def run(self, function, **kwargs):
+        return FUNCTIONS[function](**kwargs)
+
+    def close(self):
+        get_session_pool().clear()
+
+
+class ProcessBackend:
+    """Runs job functions in worker processes, so the extraction work of concurrent
+    jobs (JSON parsing, signature deciphering, playlist pages) does not contend for
+    one GIL with each other and the GUI.
+
+    A worker process runs one call at a time and is reused afterwards; there is at
+    most one per queue thread. Callbacks and cancellation are relayed over the
+    worker's pipe, the temp files and metrics of the call are merged into the
+    tracker and metrics passed in, and errors come back as Exception(message).
+    """
+
+    name = "process"
+
+    def __init__(self):
+        # Workers are started fresh rather than forked from a process with running threads.
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def run(self, function, **kwargs):
+        cancel_check = kwargs.pop('cancel_check', None)
+        metrics = kwargs.pop('metrics', None)
+        tracker = kwargs.pop('tracker', None)
+        callbacks = {name: kwargs.pop(name) for name in CALLBACKS if kwargs.get(name) is not None}
+        options = {
+            'callbacks': list(callbacks),
+            'metrics': metrics is not None,
+            'temp_folder': tracker.temp_folder if tracker is not None else None,
+        }
+        worker = self._acquire()
+        try:
+            outcome, value, extras = worker.call(function, kwargs, options, callbacks, cancel_check)
+        except BaseException:
+            worker.stop()
+            raise
+        self._release(worker)
+        if tracker is not None:
+            tracker.files.update(extras['temp_files'])
+        if metrics is not None and extras['metrics']:
+            metrics.merge(extras['metrics'])
+        if outcome == 'error':
+            raise Exception(value)
+        return value
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise Exception("Execution backend is closed")
+            if self._idle:
+                return self._idle.pop()
+        return _Worker(self._context)
+
+    def _release(self, worker):
+        with self._lock:
+            if not self._closed and worker.process.is_alive():
+                self._idle.append(worker)
+                return
+        worker.stop()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+class _Call:
+    # Registered with the job's cancel token for one call only; the worker outlives it.
+    def __init__(self, worker, call_id):
+        self.worker = worker
+        self.call_id = call_id
+
+    def cancel(self):
+        self.worker.send('cancel', self.call_id)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def call(self, function, kwargs, options, callbacks, cancel_check):
+        call = _Call(self, next(self._ids))
+        self.send('call', call.call_id, function, kwargs, options)
+        if isinstance(cancel_check, CancelToken):
+            cancel_check.register(call, _Call.cancel)
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError) as e:
+                raise Exception(WORKER_EXITED_MESSAGE) from e
+            if message[0] == 'result':
+                return message[1:]
+            _, name, args, request_id = message
+            result = callbacks[name](*args)
+            if request_id is not None:
+                self.send('reply', request_id, result)
+
+    def stop(self):
+        try:
+            self.send('exit')
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+def _portable(result):
+    # Info dicts can hold objects that do not pickle; yt-dlp reduces them to JSON types.
+    from yt_dlp import YoutubeDL
+
+    if isinstance(result, list):
+        return [YoutubeDL.sanitize_info(item) if isinstance(item, dict) else item for item in result]
+    return result
+
+
+def _worker_main(conn):
+    calls = queue.Queue()
+    tokens = {}
+    replies = {}
+    request_ids = itertools.count(1)
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            conn.send(message)
+
+    def listen():
+        # Reads the pipe on its own thread, so a cancel or a reply arrives while the call runs.
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = ('exit',)
+            if message[0] == 'call':
+                tokens[message[1]] = CancelToken()
+                calls.put(message)
+            elif message[0] == 'cancel':
+                token = tokens.get(message[1])
+                if token is not None:
+                    token.cancel()
+            elif message[0] == 'reply':
+                event, slot = replies[message[1]]
+                slot.append(message[2])
+                event.set()
+            else:
+                for token in list(tokens.values()):
+                    token.cancel()
+                calls.put(None)
+                return
+
+    def proxy(name, wait):
+        def callback(*args):
+            if not wait:
+                send('callback', name, args, None)
+                return None
+            request_id = next(request_ids)
+            event, slot = replies[request_id] = (threading.Event(), [])
+            send('callback', name, args, request_id)
+            event.wait()
+            del replies[request_id]
+            return slot[0]
+        return callback
+
+    threading.Thread(target=listen, daemon=True).start()
+    while True:
+        message = calls.get()
+        if message is None:
+            get_session_pool().clear()
+            return
+        _, call_id, function, kwargs, options = message
+        kwargs['cancel_check'] = tokens[call_id]
+        kwargs.update((name, proxy(name, CALLBACKS[name])) for name in options['callbacks'])
+        metrics = JobMetrics(None, None) if options['metrics'] else None
+        tracker = TempFileTracker(options['temp_folder']) if options['temp_folder'] else None
+        if metrics is not None:
+            kwargs['metrics'] = metrics
+        if tracker is not None:
+            kwargs['tracker'] = tracker
+        try:
+            outcome, value = 'done', _portable(FUNCTIONS[function](**kwargs))
+        except Exception as e:
+            outcome, value = 'error', str(e)
+        tokens.pop(call_id, None)
+        extras = {
+            'temp_files': sorted(tracker.files) if tracker is not None else [],
+            'metrics': metrics.to_dict() if metrics is not None else None,
+        }
+        try:
+            send('result', outcome, value, extras)
+        except Exception as e:
+            send('result', 'error', f"Could not return the result to the queue: {str(e)}", extras)
+
+
+BACKENDS = {
+    ThreadBackend.name: ThreadBackend,
+    ProcessBackend.name: ProcessBackend,
+}
+
+
+def create_backend(name):
+    """Execution backend by name ('thread' or 'process'), as set in config.json."""
+    if name not in BACKENDS:
+        raise Exception(f"Unknown execution backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+PRIORITIES = {"low": PRIORITY_LOW, "normal": PRIORITY_NORMAL, "high": PRIORITY_HIGH}
+
+# The bucket holds at most this many seconds worth of bytes, so an idle period
+# does not turn into a long burst above the limit.
+BURST_SECONDS = 1.0
+# A job counts as active for this long after its last read; while a higher-priority
+# job is active, lower ones only get the bandwidth it leaves unused.
+ACTIVE_WINDOW = 2.0
+MAX_WAIT = 0.25
+
+
+def parse_clock(value):
+    """Minutes after midnight of an 'HH:MM' string."""
+    hours, _, minutes = str(value).partition(":")
+    return (int(hours) * 60 + int(minutes or 0)) % (24 * 60)
+
+
+def default_priority(playlist, sync):
+    # A single video was most likely just pasted by someone waiting for it, a
+    # channel sync is background mirroring.
+    if sync:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL if playlist else PRIORITY_HIGH
+
+
+class BandwidthScheduler:
+    """Token bucket shared by all downloads of a queue.
+
+    Limits are in bytes per second, 0 meaning unlimited, with separate limits for
+    the day and the night. Downloads report what they read through consume(), which
+    blocks until the bucket allows it; the reading thread stalls and TCP slows the
+    sender down.
+    """
+
+    def __init__(self, day_limit=0, night_limit=0, day_starts="08:00", night_starts="22:00"):
+        self.day_limit = max(0, int(day_limit or 0))
+        self.night_limit = max(0, int(night_limit or 0))
+        self.day_starts = parse_clock(day_starts)
+        self.night_starts = parse_clock(night_starts)
+        self._cond = threading.Condition()
+        self._tokens = None
+        self._updated = time.monotonic()
+        self._active = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the scheduler from config.json, where limits are in KiB/s."""
+        return cls(int(config.get("bandwidth_limit_day") or 0) * 1024,
+                   int(config.get("bandwidth_limit_night") or 0) * 1024,
+                   config.get("bandwidth_day_starts") or "08:00",
+                   config.get("bandwidth_night_starts") or "22:00")
+
+    def is_daytime(self, now=None):
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        if self.day_starts <= self.night_starts:
+            return self.day_starts <= minute < self.night_starts
+        return minute >= self.day_starts or minute < self.night_starts
+
+    def rate(self, now=None):
+        return self.day_limit if self.is_daytime(now) else self.night_limit
+
+    def _refill(self, rate):
+        now = time.monotonic()
+        capacity = rate * BURST_SECONDS
+        if self._tokens is None:
+            self._tokens = capacity
+        else:
+            self._tokens = min(capacity, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+        return capacity
+
+    def consume(self, nbytes, priority=PRIORITY_NORMAL, cancel_check=None):
+        """Take nbytes from the bucket, waiting as long as the limit requires.
+
+        A large read may leave the bucket in debt, which later reads wait off.
+        Returns early once cancel_check() is true.
+        """
+        with self._cond:
+            while True:
+                rate = self.rate()
+                now = time.monotonic()
+                self._active[priority] = now
+                if not rate:
+                    self._tokens = None
+                    return
+                capacity = self._refill(rate)
+                higher_active = any(other > priority and now - seen < ACTIVE_WINDOW
+                                    for other, seen in self._active.items())
+                threshold = capacity / 2 if higher_active else 0
+                if self._tokens > threshold:
+                    self._tokens -= nbytes
+                    return
+                if cancel_check and cancel_check():
+                    return
+                self._cond.wait(min(MAX_WAIT, (threshold - self._tokens) / rate + 0.001))
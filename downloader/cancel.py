@@ -0,0 +1,176 @@
+import socket
+import threading
+import weakref
+from contextlib import contextmanager
+
+CANCELLED_MESSAGE = "Download cancelled by user"
+
+_local = threading.local()
+
+
+def _abort(resource, abort):
+    try:
+        abort(resource)
+    except (OSError, ValueError):
+        pass
+
+
+class CancelToken:
+    """Cancellation flag of one job that also aborts whatever the job is blocked on.
+
+    Open responses, pending requests and subprocesses are registered together with
+    an abort function; cancel() calls them, so a socket read, a stalled connect or a
+    running ffmpeg ends right away instead of at the next progress hook. Calling the
+    token returns whether it is cancelled, so it works as a cancel_check. A child
+    token (a playlist entry) is cancelled with its parent.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # Held weakly: a finished response or process drops out by itself.
+        self._resources = weakref.WeakKeyDictionary()
+        self._children = weakref.WeakSet()
+        if parent is not None:
+            with parent._lock:
+                parent._children.add(self)
+
+    def __call__(self):
+        return self.is_cancelled()
+
+    def is_cancelled(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.is_cancelled())
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds, less if the token gets cancelled; returns whether it is."""
+        if self.is_cancelled():
+            return True
+        return self._event.wait(timeout) or self.is_cancelled()
+
+    def register(self, resource, abort):
+        """Call abort(resource) on cancel, or right away if the token already is cancelled."""
+        with self._lock:
+            if not self.is_cancelled():
+                self._resources[resource] = abort
+                return
+        _abort(resource, abort)
+
+    def cancel(self):
+        with self._lock:
+            self._event.set()
+            resources = list(self._resources.items())
+            self._resources.clear()
+            children = list(self._children)
+        for resource, abort in resources:
+            _abort(resource, abort)
+        for child in children:
+            child.cancel()
+
+
+def current_token():
+    return getattr(_local, 'token', None)
+
+
+@contextmanager
+def activate(cancel_check):
+    """Make cancel_check, if it is a CancelToken, the token subprocesses started by this thread belong to."""
+    previous = current_token()
+    _local.token = cancel_check if isinstance(cancel_check, CancelToken) else previous
+    try:
+        yield
+    finally:
+        _local.token = previous
+
+
+def track_process(process):
+    """Kill process when the current token of this thread is cancelled."""
+    token = current_token()
+    if token is not None:
+        token.register(process, lambda process: process.kill())
+
+
+def _find_socket(obj, depth=0):
+    # yt-dlp Response -> urllib3/http.client response -> buffered reader -> socket
+    if isinstance(obj, socket.socket):
+        return obj
+    if obj is None or depth > 5:
+        return None
+    for name in ('fp', '_fp', 'raw', '_sock'):
+        sock = _find_socket(getattr(obj, name, None), depth + 1)
+        if sock is not None:
+            return sock
+    return None
+
+
+def _shutdown_response(response):
+    # Shutting the socket down wakes up a read blocked in another thread; close() does not.
+    sock = _find_socket(response)
+    if sock is not None:
+        sock.shutdown(socket.SHUT_RDWR)
+    else:
+        response.close()
+
+
+class _PendingOpen:
+    """A request opened on a helper thread, so cancelling does not wait for connect or response headers."""
+
+    def __init__(self, urlopen, request):
+        self.response = None
+        self.error = None
+        self.abandoned = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._open, args=(urlopen, request), daemon=True).start()
+
+    def _open(self, urlopen, request):
+        response = error = None
+        try:
+            response = urlopen(request)
+        except BaseException as e:
+            error = e
+        with self._lock:
+            self.response, self.error = response, error
+            abandoned = self.abandoned
+        if abandoned and response is not None:
+            response.close()
+        self._done.set()
+
+    def abandon(self):
+        with self._lock:
+            self.abandoned = True
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        with self._lock:
+            if self.abandoned:
+                if self.response is not None:
+                    self.response.close()
+                raise Exception(CANCELLED_MESSAGE)
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+def guard_urlopen(ydl, cancel_check):
+    """Route all requests of ydl, its extractors and downloaders through the token cancel_check.
+
+    New requests fail once it is cancelled; cancelling abandons the ones still
+    waiting for a response and shuts down the sockets of open responses.
+    """
+    if not isinstance(cancel_check, CancelToken):
+        return
+    token = cancel_check
+    urlopen = ydl.urlopen
+
+    def guarded_urlopen(req):
+        if token.is_cancelled():
+            raise Exception(CANCELLED_MESSAGE)
+        pending = _PendingOpen(urlopen, req)
+        token.register(pending, _PendingOpen.abandon)
+        response = pending.wait()
+        token.register(response, _shutdown_response)
+        return response
+
+    ydl.urlopen = guarded_urlopen
@@ -0,0 +1,198 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+from config.settings import load_config
+from downloader.archive import get_archive
+from downloader.backends import create_backend, BACKENDS
+from downloader.bandwidth import BandwidthScheduler, PRIORITIES
+from downloader.download_queue import DownloadQueue
+from downloader.fanout import output_formats, SEPARATOR
+from downloader.journal import get_journal
+from downloader.metrics import MetricsRegistry
+from downloader.retry import RetryPolicy
+
+FORMAT_CHOICES = ('best', 'mp4', 'mp3', 'audio', 'webm')
+
+
+def format_choice(value):
+    """argparse type for -f: one of FORMAT_CHOICES, or several joined with '+' (e.g. mp4+mp3)."""
+    value = value.lower()
+    unknown = [output for output in value.split(SEPARATOR) if output not in FORMAT_CHOICES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"invalid format {unknown[0]!r} (choose from {', '.join(FORMAT_CHOICES)})")
+    try:
+        output_formats(value)
+    except Exception as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def read_urls(args):
+    urls = list(args.urls)
+    sources = []
+    if args.batch_file == '-' or (not urls and not args.batch_file and not sys.stdin.isatty()):
+        sources.append(sys.stdin)
+    elif args.batch_file:
+        sources.append(open(args.batch_file, 'r', encoding='utf-8'))
+    for source in sources:
+        with source:
+            for line in source:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    urls.append(line)
+    return list(dict.fromkeys(urls))
+
+
+def build_parser(config):
+    parser = argparse.ArgumentParser(
+        prog='python -m downloader',
+        description='Download YouTube videos, playlists and channels without the GUI.')
+    parser.add_argument('urls', nargs='*', help='video, playlist or channel URLs')
+    parser.add_argument('-a', '--batch-file', metavar='FILE',
+                        help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument('-f', '--format', type=format_choice, default=config.get('format_choice', 'best').lower(),
+                        help=f"output format: {', '.join(FORMAT_CHOICES)}, or several from one download, e.g. mp4+mp3")
+    parser.add_argument('-o', '--output', default=config.get('download_folder'), help='download folder')
+    parser.add_argument('-n', '--name', default='', help='custom file name')
+    parser.add_argument('--sponsorblock', action='store_true', help='remove sponsor segments (SponsorBlock)')
+    parser.add_argument('--skip-no-music', action='store_true', help='remove segments without music')
+    parser.add_argument('--sponsorblock-api', metavar='URL', default=config.get('sponsorblock_api'),
+                        help='SponsorBlock API server')
+    parser.add_argument('-j', '--jobs', type=int, default=config.get('max_concurrent_downloads', 3),
+                        help='number of concurrent downloads')
+    parser.add_argument('-N', '--connections', type=int, default=config.get('download_connections', 4),
+                        help='parallel connections per file (range requests / concurrent fragments)')
+    parser.add_argument('--backend', choices=tuple(BACKENDS), default=config.get('execution_backend') or 'thread',
+                        help='run jobs in threads of this process or in worker processes')
+    parser.add_argument('--no-session-reuse', action='store_true',
+                        help='build a new yt-dlp instance for every job instead of reusing warm ones')
+    parser.add_argument('-r', '--limit-rate', type=int, metavar='KIB',
+                        help='bandwidth limit for all downloads in KiB/s, instead of the day/night limits in config.json')
+    parser.add_argument('--priority', choices=tuple(PRIORITIES),
+                        help='bandwidth priority (default: high for videos, normal for playlists, low with --sync)')
+    parser.add_argument('--retries', type=int, metavar='N', default=config.get('retry_budget'),
+                        help='retries per job after a throttled, expired or dropped download (default: %(default)s)')
+    parser.add_argument('--sync', action='store_true',
+                        help='only fetch new playlist/channel entries, stop at the already downloaded ones')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='download again even if the video is in the download archive')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume unfinished jobs from previous runs (GUI or CLI)')
+    parser.add_argument('--metrics-file', metavar='FILE', default=config.get('metrics_file'),
+                        help='append per-job metrics (phase timings, bytes/s, retries) to FILE as JSON lines')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', default=config.get('metrics_port') or 0,
+                        help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print yt-dlp log messages')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+    return parser
+
+
+class ConsoleReporter:
+    def __init__(self, verbose, quiet):
+        self.verbose = verbose
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._reported = {}
+
+    def _print(self, message, error=False):
+        with self._lock:
+            print(message, file=sys.stderr if error else sys.stdout, flush=True)
+
+    def progress(self, job, percent):
+        step = percent // 10 * 10
+        if self.quiet or job.children or step <= self._reported.get(job.job_id, -1):
+            return
+        self._reported[job.job_id] = step
+        self._print(f"[{job.job_id}] {step}% {job.title or job.url}")
+
+    def log(self, job, message):
+        if self.verbose:
+            self._print(f"[{job.job_id}] {message}")
+
+    def finished(self, job):
+        if not self.quiet:
+            for path in ([] if job.children else job.final_filepaths):
+                self._print(f"[{job.job_id}] Saved: {path}")
+            if job.children:
+                self._print(f"[{job.job_id}] Playlist done: {job.items_done - job.items_failed}/"
+                            f"{len(job.children)} entries, {job.items_failed} failed")
+
+    def error(self, job, message):
+        self._print(f"[{job.job_id}] Error: {job.url}: {message}", error=True)
+
+    def retrying(self, job, message, delay):
+        if not self.quiet:
+            self._print(f"[{job.job_id}] Retrying in {delay:.0f}s: {message}")
+
+    def cancelled(self, job, temp_files):
+        if not self.quiet:
+            self._print(f"[{job.job_id}] Cancelled: {job.url}")
+
+
+def main(argv=None):
+    config = load_config()
+    parser = build_parser(config)
+    args = parser.parse_args(argv)
+    urls = read_urls(args) if args.urls or args.batch_file or not args.resume else []
+    if not urls and not args.resume:
+        parser.error('no URLs given')
+    if not args.output:
+        parser.error('no download folder given')
+
+    reporter = ConsoleReporter(args.verbose, args.quiet)
+    if args.metrics_file == config.get('metrics_file'):
+        metrics = MetricsRegistry.from_config(config)
+    else:
+        metrics = MetricsRegistry(os.path.abspath(args.metrics_file) if args.metrics_file else None)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.limit_rate is not None:
+        bandwidth = BandwidthScheduler(args.limit_rate * 1024, args.limit_rate * 1024)
+    else:
+        bandwidth = BandwidthScheduler.from_config(config)
+    queue = DownloadQueue(
+        max_workers=args.jobs,
+        progress_callback=reporter.progress,
+        log_callback=reporter.log,
+        finished_callback=reporter.finished,
+        error_callback=reporter.error,
+        cancelled_callback=reporter.cancelled,
+        retrying_callback=reporter.retrying,
+        download_connections=args.connections,
+        journal=get_journal(),
+        archive=None if args.no_archive or not config.get('use_download_archive', True) else get_archive(),
+        sponsorblock_api=args.sponsorblock_api,
+        bandwidth=bandwidth,
+        metrics=metrics,
+        retry_policy=RetryPolicy(args.retries) if args.retries is not None else RetryPolicy.from_config(config),
+        backend=create_backend(args.backend),
+        reuse_sessions=not args.no_session_reuse and config.get('reuse_sessions', True)
+    )
+
+    jobs = []
+    if args.resume:
+        jobs.extend(queue.restore(queue.journal.unfinished()))
+        busy = queue.journal.owned_elsewhere()
+        if not args.quiet:
+            print(f"Resuming {len(jobs)} unfinished job(s)", flush=True)
+            if busy:
+                print(f"Skipping {busy} unfinished job(s) that another running process is downloading", flush=True)
+    for index, url in enumerate(urls, start=1):
+        name = f"{args.name} ({index})" if args.name and len(urls) > 1 else args.name
+        jobs.append(queue.add(url, args.format, name, args.output, args.sponsorblock, args.skip_no_music,
+                             sync=args.sync, priority=PRIORITIES.get(args.priority)))
+
+    try:
+        while queue.active_jobs():
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        queue.cancel_all()
+        while queue.active_jobs():
+            time.sleep(0.2)
+        return 130
+
+    failed = [job for top in jobs for job in [top] + top.children if job.status == 'error']
+    return 1 if failed else 0
@@ -0,0 +1,825 @@
+import collections
+import contextlib
+import hashlib
+import itertools
+import os
+import queue
+import threading
+import time
+
+from downloader.archive import entry_archive_key
+from downloader.backends import ThreadBackend
+from downloader.bandwidth import default_priority
+from downloader.cancel import CancelToken
+from downloader.downloader import needs_postprocessing, sponsorblock_categories, CANCELLED_MESSAGE
+from downloader.fanout import group_outputs
+from downloader.finalize import cleanup_temp_folder, finalize_files, remove_temp_files
+from downloader.info_cache import get_info_cache, info_cache_key
+from downloader.playlist import is_newest_first_url, is_playlist_url
+from downloader.retry import classify_error, RetryPolicy, EXPIRED
+from downloader.sponsorblock import (
+    prefetch_segments, DEFAULT_API as DEFAULT_SPONSORBLOCK_API, SERVICES as SPONSORBLOCK_SERVICES
+)
+from downloader.temp_files import TempFileTracker
+
+
+def job_temp_name(url, format_choice, custom_name):
+    key = f"{url}\n{format_choice}\n{custom_name or ''}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# In sync mode a channel's uploads, newest first, stop being enumerated after this many consecutive
+# entries that are already in the download archive.
+SYNC_STOP_AFTER = 5
+# Reading a playlist pauses while this many of its entries wait for a worker, so a channel
+# with thousands of videos is read about as fast as it is downloaded.
+PENDING_ENTRIES_LIMIT = 200
+
+
+class DownloadJob:
+    def __init__(self, job_id, url, format_choice, custom_name, download_folder, use_sponsorblock, skip_no_music,
+                 parent=None, playlist=False, sync=False, priority=None):
+        self.job_id = job_id
+        self.url = url
+        self.format_choice = format_choice
+        self.custom_name = custom_name
+        self.download_folder = download_folder
+        self.temp_folder = os.path.join(download_folder, "temp", job_temp_name(url, format_choice, custom_name))
+        # The same video in two playlists shares a temp folder, so a job only ever deletes what it wrote.
+        self.temp_files = TempFileTracker(self.temp_folder)
+        self.use_sponsorblock = use_sponsorblock
+        self.skip_no_music = skip_no_music
+        self.status = "queued"
+        self.percent = 0
+        self.max_percent = 0
+        self.final_filepaths = []
+        self.error = None
+        self.parent = parent
+        self.playlist = playlist
+        self.sync = sync
+        self.priority = default_priority(playlist, sync) if priority is None else priority
+        self.retries = 0
+        self.archive_key = None
+        self.metrics = None
+        self.title = None
+        self.children = []
+        # Entries of a playlist that are read but not started yet, as (url, title, archive key);
+        # the child job for one is only made when a worker takes it.
+        self.entries = collections.deque()
+        # Running totals over the children, kept up to date by count_child().
+        self.items_done = 0
+        self.items_failed = 0
+        self._children_fraction = 0.0
+        self._children_lock = threading.Lock()
+        # This job's share in its parent's totals.
+        self._counted_fraction = 0.0
+        self._counted = False
+        self.completed = False
+        # A playlist whose entries are still being read; it cannot finish before that.
+        self.enumerating = False
+        # Files of each output of a fan-out job ('mp4+mp3'), as the post-processing pool makes them.
+        self.outputs = {}
+        self.outputs_pending = 0
+        self.output_error = None
+        self.started_at = None
+        self._stream_bytes = {}
+        self._bytes_lock = threading.Lock()
+        # Partial files in the temp folder when the download started, left by an earlier session.
+        self.resumed_files = set()
+        self.cancel_token = CancelToken(parent.cancel_token if parent is not None else None)
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def is_cancelled(self):
+        return self.cancel_token.is_cancelled()
+
+    def update_bytes(self, filename, downloaded):
+        """Record the progress of one stream; returns the bytes read since the last report.
+
+        Segmented and fragmented downloads report the stream's running total from several
+        threads, so reports can arrive out of order: only what goes past the highest total
+        reported so far is new.
+        """
+        with self._bytes_lock:
+            previous = self._stream_bytes.get(filename)
+            if previous is None:
+                # The first report of a resumed stream includes what earlier sessions downloaded.
+                name = os.path.basename(filename or "")
+                resumed = name and any(partial.startswith(name) for partial in self.resumed_files)
+                previous = downloaded if resumed else 0
+            self._stream_bytes[filename] = max(previous, downloaded)
+            return max(0, downloaded - previous)
+
+    @property
+    def downloaded_bytes(self):
+        if self.children:
+            return sum(child.downloaded_bytes for child in self.children)
+        return sum(self._stream_bytes.values())
+
+    @property
+    def entry_count(self):
+        return len(self.children) + len(self.entries)
+
+    def count_child(self, child, fraction, done=False):
+        """Move child's share of the playlist progress to fraction (0 to 1), and count it
+        as done once it has finished, failed or been cancelled; a done child stays counted."""
+        with self._children_lock:
+            if child._counted:
+                return
+            self._children_fraction += fraction - child._counted_fraction
+            child._counted_fraction = fraction
+            if done:
+                child._counted = True
+                self.items_done += 1
+                if child.status == "error":
+                    self.items_failed += 1
+
+    def playlist_fraction(self):
+        if not self.children:
+            return 0.0
+        return self._children_fraction / self.entry_count
+
+    def eta(self):
+        fraction = self.playlist_fraction()
+        if not self.started_at or fraction <= 0:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed * (1 - fraction) / fraction
+
+    def is_active(self):
+        return self.status in ("queued", "downloading", "retrying", "processing", "finalizing")
+
+    def update_progress(self, percent):
+        # yt-dlp restarts at 0% for every stream (video, audio, playlist entry), so only
+        # report monotonic progress unless the value clearly dropped to a new stream.
+        if 0 <= percent < self.max_percent - 50:
+            self.max_percent = percent
+        if 0 <= percent <= 100 and percent > self.max_percent:
+            self.max_percent = percent
+            self.percent = percent
+            return True
+        return False
+
+
+class _NextEntry:
+    """Stands in the pending queue for the next unstarted entry of a playlist."""
+
+    def __init__(self, playlist):
+        self.playlist = playlist
+
+
+def _wake(condition):
+    with condition:
+        condition.notify_all()
+
+
+class DownloadQueue:
+    def __init__(self, max_workers=3, progress_callback=None, log_callback=None,
+                 finished_callback=None, error_callback=None, cancelled_callback=None, download_connections=1,
+                 journal=None, archive=None, postprocess_workers=None, sponsorblock_api=None, bandwidth=None,
+                 metrics=None, retry_policy=None, retrying_callback=None, backend=None, reuse_sessions=True):
+        self.max_workers = max(1, int(max_workers))
+        # ffmpeg post-processing is CPU-bound, so it gets its own pool sized to the machine
+        # and downloads continue while earlier files are transcoded or cut.
+        self.postprocess_workers = max(1, int(postprocess_workers or os.cpu_count() or 1))
+        self.download_connections = max(1, int(download_connections))
+        self.progress_callback = progress_callback
+        self.log_callback = log_callback
+        self.finished_callback = finished_callback
+        self.error_callback = error_callback
+        self.cancelled_callback = cancelled_callback
+        self.retrying_callback = retrying_callback
+        self.journal = journal
+        self.sponsorblock_api = sponsorblock_api
+        self.archive = archive
+        self.bandwidth = bandwidth
+        self.metrics = metrics
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # Where download, post-processing and playlist expansion run; see backends.py.
+        self.backend = backend if backend is not None else ThreadBackend()
+        # Whether jobs reuse warm YoutubeDL instances; see sessions.py.
+        self.reuse_sessions = reuse_sessions
+        self.jobs = {}
+        self._pending = queue.Queue()
+        self._workers = []
+        self._postprocess_pending = queue.Queue()
+        self._postprocess_threads = []
+        self._lock = threading.Lock()
+        # Notified whenever a worker takes a playlist entry; see _wait_for_entries().
+        self._entries_taken = threading.Condition(self._lock)
+        self._paused_readers = 0
+        self._ids = itertools.count(1)
+        self._shutdown = False
+
+    def add(self, url, format_choice, custom_name, download_folder, use_sponsorblock, skip_no_music, sync=False,
+            priority=None):
+        with self._lock:
+            temp_name = job_temp_name(url, format_choice, custom_name)
+            for job in self.jobs.values():
+                if job.is_active() and os.path.basename(job.temp_folder) == temp_name \
+                        and job.download_folder == download_folder:
+                    return job
+            job = DownloadJob(str(next(self._ids)), url, format_choice, custom_name,
+                              download_folder, use_sponsorblock, skip_no_music,
+                              playlist=is_playlist_url(url), sync=sync, priority=priority)
+            self.jobs[job.job_id] = job
+        self._record(job)
+        self._pending.put(job)
+        self._ensure_workers()
+        return job
+
+    def restore(self, records):
+        """Queue the unfinished jobs of a previous session, as read from the journal.
+
+        Playlist entries are restored under their playlist without expanding it again,
+        unless it was still being read; their temp folders still hold the partial data,
+        so yt-dlp resumes them.
+        """
+        parents = {}
+        restored = []
+        for record in records:
+            parent = parents.get(record["parent_key"])
+            job = DownloadJob(str(next(self._ids)), record["url"], record["format_choice"], record["custom_name"],
+                              record["download_folder"], record["use_sponsorblock"], record["skip_no_music"],
+                              parent=parent, playlist=record.get("playlist", False), sync=record.get("sync", False),
+                              priority=record.get("priority"))
+            job.title = record.get("title")
+            job.enumerating = record.get("enumerating", False)
+            # What the earlier session left is this job's, to delete if it gets cancelled.
+            for folder, _, names in os.walk(job.temp_folder):
+                job.temp_files.files.update(os.path.join(folder, name) for name in names)
+            if parent is not None:
+                job.job_id = f"{parent.job_id}.{len(parent.children) + 1}"
+                parent.children.append(job)
+            elif job.playlist:
+                parents[job.temp_folder] = job
+                self._set_status(job, "downloading")
+                job.started_at = time.monotonic()
+            elif record["parent_key"]:
+                continue
+            with self._lock:
+                self.jobs[job.job_id] = job
+            restored.append(job)
+
+        for job in restored:
+            if job.playlist and (job.enumerating or not job.children):
+                # The playlist was still being expanded when the previous session stopped;
+                # it is read again, skipping the entries restored above.
+                self._set_status(job, "queued")
+                self._pending.put(job)
+            elif not job.playlist:
+                self._pending.put(job)
+        self._ensure_workers()
+        return [job for job in restored if job.parent is None]
+
+    def _set_status(self, job, status):
+        job.status = status
+        self._record(job)
+        if job.metrics is not None and not job.is_active():
+            metrics, job.metrics = job.metrics, None
+            try:
+                self.metrics.finish_job(metrics, status)
+            except Exception as e:
+                self._log(job, f"Warning: could not write metrics: {str(e)}")
+
+    def _start_metrics(self, job):
+        if self.metrics is not None and job.metrics is None:
+            job.metrics = self.metrics.start_job(job)
+
+    def _phase(self, job, name):
+        return job.metrics.phase(name) if job.metrics is not None else contextlib.nullcontext()
+
+    def _record(self, job):
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(job)
+        except Exception as e:
+            self._log(job, f"Warning: could not update job journal: {str(e)}")
+
+    def _take_entry(self, parent):
+        """Make the child job for the next unstarted entry of parent; None if it has none left."""
+        with self._entries_taken:
+            if parent.is_cancelled():
+                parent.entries.clear()
+            if not parent.entries:
+                return None
+            url, title, archive_key = parent.entries.popleft()
+            index = len(parent.children) + 1
+            custom_name = f"{parent.custom_name} ({index})" if parent.custom_name else None
+            child = DownloadJob(f"{parent.job_id}.{index}", url, parent.format_choice, custom_name,
+                                parent.download_folder, parent.use_sponsorblock, parent.skip_no_music,
+                                parent=parent, priority=parent.priority)
+            child.title = title
+            child.archive_key = archive_key
+            self.jobs[child.job_id] = child
+            # Taken and added under one lock, so the playlist cannot look finished in between.
+            parent.children.append(child)
+            self._entries_taken.notify_all()
+        self._record(child)
+        if not parent.entries and not parent.enumerating:
+            self._record(parent)
+        if self.progress_callback:
+            self.progress_callback(parent, parent.percent)
+        return child
+
+    def _wait_for_entries(self, job):
+        """Pause reading job's playlist while enough of its entries wait for a worker.
+
+        Meanwhile the reader's worker slot is lent to another worker, so a queue with a
+        single worker does not wait on itself.
+        """
+        with self._lock:
+            if len(job.entries) < PENDING_ENTRIES_LIMIT:
+                return
+            self._paused_readers += 1
+        job.cancel_token.register(self._entries_taken, _wake)
+        self._ensure_workers()
+        try:
+            with self._entries_taken:
+                while len(job.entries) >= PENDING_ENTRIES_LIMIT and not job.is_cancelled():
+                    self._entries_taken.wait()
+        finally:
+            with self._lock:
+                self._paused_readers -= 1
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job and job.is_active():
+            job.cancel()
+
+    def cancel_all(self):
+        for job in list(self.jobs.values()):
+            if job.is_active():
+                job.cancel()
+
+    def active_jobs(self):
+        return [job for job in list(self.jobs.values()) if job.is_active()]
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            old_count = self.max_workers
+            self.max_workers = max(1, int(max_workers))
+        for _ in range(old_count - self.max_workers):
+            self._pending.put(None)
+        self._ensure_workers()
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown = True
+            workers = list(self._workers)
+            postprocess_threads = list(self._postprocess_threads)
+        self.cancel_all()
+        for _ in workers:
+            self._pending.put(None)
+        for _ in postprocess_threads:
+            self._postprocess_pending.put(None)
+        self.backend.close()
+
+    def _ensure_workers(self):
+        with self._lock:
+            while not self._shutdown and len(self._workers) < self.max_workers + self._paused_readers:
+                worker = threading.Thread(target=self._worker_loop, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+
+    def _ensure_postprocessors(self):
+        with self._lock:
+            while not self._shutdown and len(self._postprocess_threads) < self.postprocess_workers:
+                thread = threading.Thread(target=self._postprocess_loop, daemon=True)
+                self._postprocess_threads.append(thread)
+                thread.start()
+
+    def _worker_loop(self):
+        current = threading.current_thread()
+        while True:
+            with self._lock:
+                if self._shutdown or len(self._workers) > self.max_workers + self._paused_readers:
+                    self._workers.remove(current)
+                    return
+            job = self._pending.get()
+            if job is None:
+                continue
+            if isinstance(job, _NextEntry):
+                parent = job.playlist
+                job = self._take_entry(parent)
+                if job is None:
+                    # The playlist was cancelled; it finishes once its last entry is dropped.
+                    self._on_child_done(parent)
+                    continue
+            if job.is_cancelled():
+                self._on_cancelled(job)
+            elif job.playlist:
+                self._run_playlist(job)
+            elif self._run_job(job):
+                # Handed over to the post-processing pool, which reports to the parent.
+                continue
+            if job.parent is not None:
+                self._on_child_done(job.parent, job)
+
+    def _log(self, job, message):
+        if self.log_callback:
+            self.log_callback(job, message)
+
+    def _on_progress(self, job, percent):
+        if job.update_progress(percent) and self.progress_callback:
+            self.progress_callback(job, job.percent)
+            if job.parent is not None:
+                job.parent.count_child(job, job.percent / 100)
+                self._on_parent_progress(job.parent)
+
+    def _on_bytes(self, job, filename, downloaded):
+        received = job.update_bytes(filename, downloaded)
+        if self.bandwidth is not None and received:
+            self.bandwidth.consume(received, job.priority, job.is_cancelled)
+
+    def _on_finalize_progress(self, job, copied, total):
+        percent = int(copied * 100 / total) if total else 100
+        if percent != job.percent and self.progress_callback:
+            job.percent = percent
+            self.progress_callback(job, percent)
+
+    def _on_parent_progress(self, parent):
+        parent.percent = int(parent.playlist_fraction() * 100)
+        if self.progress_callback:
+            self.progress_callback(parent, parent.percent)
+
+    def _on_cancelled(self, job):
+        # Files go first, so a job that reports cancelled has nothing left behind.
+        temp_files = remove_temp_files(job.temp_files.collect(), lambda message: self._log(job, message))
+        cleanup_temp_folder(job.temp_folder, lambda message: self._log(job, message))
+        self._set_status(job, "cancelled")
+        self._log(job, CANCELLED_MESSAGE)
+        if self.cancelled_callback:
+            self.cancelled_callback(job, temp_files)
+
+    def _run_playlist(self, job):
+        self._start_metrics(job)
+        # Entries are queued and downloaded while later pages are still being read.
+        job.enumerating = True
+        self._set_status(job, "downloading")
+        job.started_at = job.started_at or time.monotonic()
+        self._log(job, f"Fetching playlist entries for URL: {job.url}")
+        # Restored entries of an interrupted enumeration, and those of earlier attempts.
+        seen = {child.url for child in job.children}
+        seen.update(url for url, _, _ in job.entries)
+        counts = {"entries": 0, "archived": 0}
+        next_entry = _NextEntry(job)
+        sponsor_batches = self._start_sponsor_prefetch(job)
+
+        def add_entries(title, entries):
+            job.title = title
+            entries = [entry for entry in entries if entry['url'] not in seen]
+            seen.update(entry['url'] for entry in entries)
+            counts["entries"] += len(entries)
+            archived = self._archived_entries(job, entries)
+            if archived:
+                entries = [entry for entry in entries if entry_archive_key(entry) not in archived]
+                counts["archived"] += len(archived)
+            if not entries:
+                return
+            if sponsor_batches is not None:
+                sponsor_batches.put(entries)
+            # Only what a child job needs is kept until a worker takes the entry.
+            with self._lock:
+                job.entries.extend((entry['url'], entry.get('title'), entry_archive_key(entry)) for entry in entries)
+            for _ in entries:
+                self._pending.put(next_entry)
+            self._wait_for_entries(job)
+
+        try:
+            with self._phase(job, "extraction"):
+                result = self._with_retries(job, lambda: self.backend.run(
+                    "expand_playlist", url=job.url, cancel_check=job.cancel_token,
+                    log_callback=lambda message: self._log(job, message), stop_check=self._sync_stop_check(job),
+                    reuse_session=self.reuse_sessions, entries_callback=add_entries))
+        except Exception as e:
+            cancelled = str(e) == CANCELLED_MESSAGE or isinstance(e, InterruptedError)
+            if not job.children and not job.entries:
+                job.enumerating = False
+                if cancelled:
+                    self._on_cancelled(job)
+                else:
+                    self._on_error(job, e)
+                return
+            # The entries found so far are already downloading; the playlist ends with them.
+            if not cancelled:
+                self._log(job, f"Warning: stopped reading the playlist after {counts['entries']} entries: {str(e)}")
+            result = (job.title, [])
+        finally:
+            if sponsor_batches is not None:
+                sponsor_batches.put(None)
+
+        job.enumerating = False
+        if result is None:
+            job.playlist = False
+            self._run_job(job)
+            return
+        self._record(job)
+        if counts["archived"]:
+            self._log(job, f"Skipping {counts['archived']} entries that are already downloaded")
+        if not job.children and not job.entries:
+            if not counts["entries"] and not job.sync:
+                self._on_error(job, Exception("Playlist has no entries"))
+                return
+            self._log(job, f"Playlist '{job.title}': nothing new to download")
+            job.percent = 100
+            self._set_status(job, "finished")
+            if self.finished_callback:
+                self.finished_callback(job)
+            return
+
+        self._log(job, f"Playlist '{job.title}': {job.entry_count} entries queued")
+        self._on_child_done(job)
+
+    def _start_sponsor_prefetch(self, job):
+        """Start fetching SponsorBlock segments ahead for the entries of a playlist.
+
+        Returns a queue for batches of entries, fetched one after the other by a single
+        thread for the whole playlist, which ends on None; or None if the job does not
+        use SponsorBlock.
+        """
+        categories = sponsorblock_categories(job.use_sponsorblock, job.skip_no_music)
+        if not categories:
+            return None
+        batches = queue.Queue()
+
+        def prefetch():
+            # Runs next to the downloads; an entry that gets there first asks the API itself.
+            while True:
+                entries = batches.get()
+                if entries is None:
+                    return
+                if job.is_cancelled():
+                    continue
+                by_service = {}
+                for entry in entries:
+                    service = SPONSORBLOCK_SERVICES.get(entry.get('ie_key'))
+                    if service and entry.get('id'):
+                        by_service.setdefault(service, []).append(entry['id'])
+                for service, video_ids in by_service.items():
+                    requests = prefetch_segments(video_ids, categories, service,
+                                                 api=self.sponsorblock_api or DEFAULT_SPONSORBLOCK_API,
+                                                 log_callback=lambda message: self._log(job, message))
+                    self._log(job, f"SponsorBlock segments for {len(video_ids)} entries: {requests} API requests")
+
+        threading.Thread(target=prefetch, daemon=True).start()
+        return batches
+
+    def _sync_stop_check(self, job):
+        # A playlist grows at its end, so it is read in full and its archived entries skipped.
+        if not job.sync or self.archive is None or not is_newest_first_url(job.url):
+            return None
+        seen = {"archived": 0}
+
+        def stop_check(entry):
+            key = entry_archive_key(entry)
+            if key and self.archive.lookup(key, job.format_choice, job.use_sponsorblock, job.skip_no_music):
+                seen["archived"] += 1
+            else:
+                seen["archived"] = 0
+            if seen["archived"] >= SYNC_STOP_AFTER:
+                self._log(job, f"Reached {SYNC_STOP_AFTER} already downloaded entries, stopping playlist sync")
+                return True
+            return False
+
+        return stop_check
+
+    def _archived_entries(self, job, entries):
+        if self.archive is None:
+            return {}
+        try:
+            return self.archive.lookup_many([entry_archive_key(entry) for entry in entries],
+                                            job.format_choice, job.use_sponsorblock, job.skip_no_music)
+        except Exception as e:
+            self._log(job, f"Warning: could not read download archive: {str(e)}")
+            return {}
+
+    def _archived_files(self, job):
+        if self.archive is None:
+            return None
+        try:
+            job.archive_key = job.archive_key or info_cache_key(job.url)
+            if not job.archive_key:
+                return None
+            return self.archive.lookup(job.archive_key, job.format_choice, job.use_sponsorblock, job.skip_no_music)
+        except Exception as e:
+            self._log(job, f"Warning: could not read download archive: {str(e)}")
+            return None
+
+    def _archive_job(self, job):
+        if self.archive is None or not job.archive_key:
+            return
+        try:
+            self.archive.add(job.archive_key, job.format_choice, job.use_sponsorblock, job.skip_no_music,
+                             job.final_filepaths)
+        except Exception as e:
+            self._log(job, f"Warning: could not update download archive: {str(e)}")
+
+    def _on_child_done(self, parent, child=None):
+        if child is not None:
+            parent.count_child(child, 1.0, done=True)
+        self._on_parent_progress(parent)
+        with self._lock:
+            if parent.completed or parent.enumerating or parent.entries or parent.items_done < len(parent.children):
+                return
+            parent.completed = True
+        parent.final_filepaths = [path for child in parent.children for path in child.final_filepaths]
+        failed = parent.items_failed
+        self._log(parent, f"Playlist finished: {parent.items_done - failed}/{len(parent.children)} "
+                          f"entries downloaded, {failed} failed")
+        if parent.is_cancelled():
+            self._on_cancelled(parent)
+        elif failed == len(parent.children):
+            self._on_error(parent, Exception("All playlist entries failed"))
+        else:
+            parent.percent = 100
+            self._set_status(parent, "finished")
+            if self.finished_callback:
+                self.finished_callback(parent)
+
+    def _with_retries(self, job, attempt):
+        """Run attempt() until it succeeds, fails for good or the job's retry budget is spent.
+
+        Between attempts the job is 'retrying'; the wait ends early on cancel. Expired
+        stream URLs are extracted again instead of being taken from the info cache.
+        """
+        while True:
+            try:
+                return attempt()
+            except Exception as e:
+                if str(e) == CANCELLED_MESSAGE or isinstance(e, InterruptedError) or job.is_cancelled():
+                    raise
+                kind = classify_error(e)
+                delay = self.retry_policy.delay(kind, job.retries, e)
+                if delay is None:
+                    raise
+                job.retries += 1
+                job.error = " ".join(str(e).split())
+                if job.metrics is not None:
+                    job.metrics.add_retry()
+                if kind == EXPIRED:
+                    self._forget_info(job)
+                self._set_status(job, "retrying")
+                self._log(job, f"Retrying in {delay:.0f}s ({job.retries}/{self.retry_policy.budget}, "
+                               f"{kind.replace('_', ' ')}): {job.error}")
+                if self.retrying_callback:
+                    self.retrying_callback(job, job.error, delay)
+                if job.cancel_token.wait(delay):
+                    raise Exception(CANCELLED_MESSAGE)
+                job.error = None
+                self._set_status(job, "downloading")
+
+    def _forget_info(self, job):
+        cache_key = info_cache_key(job.url)
+        if not cache_key:
+            return
+        try:
+            get_info_cache().invalidate(cache_key)
+        except Exception as e:
+            self._log(job, f"Warning: could not update metadata cache: {str(e)}")
+
+    def _on_error(self, job, error):
+        job.error = str(error)
+        self._set_status(job, "error")
+        self._log(job, f"Error: {str(error)}")
+        if self.error_callback:
+            self.error_callback(job, str(error))
+
+    def _run_job(self, job):
+        """Download a single video; returns True if the job went on to the post-processing pool."""
+        self._start_metrics(job)
+        self._set_status(job, "downloading")
+        job.started_at = time.monotonic()
+        try:
+            archived_files = self._archived_files(job)
+            if archived_files:
+                self._log(job, f"Already downloaded, skipping: {', '.join(archived_files)}")
+                job.final_filepaths = archived_files
+                job.percent = 100
+                self._set_status(job, "finished")
+                if self.finished_callback:
+                    self.finished_callback(job)
+                return False
+
+            partial = os.listdir(job.temp_folder) if os.path.exists(job.temp_folder) else []
+            job.resumed_files = {f for f in partial if f.endswith((".part", ".ytdl")) or ".part-Frag" in f}
+            os.makedirs(job.temp_folder, exist_ok=True)
+            if job.resumed_files:
+                self._log(job, f"Resuming download for URL: {job.url}")
+            else:
+                self._log(job, f"Starting download for URL: {job.url}")
+
+            defer_postprocessing = needs_postprocessing(job.format_choice, job.use_sponsorblock, job.skip_no_music)
+            result = self._with_retries(job, lambda: self.backend.run(
+                "download_video",
+                url=job.url,
+                format_choice=job.format_choice,
+                custom_name=job.custom_name,
+                download_folder=job.download_folder,
+                temp_folder=job.temp_folder,
+                progress_callback=lambda percent: self._on_progress(job, percent),
+                use_sponsorblock=job.use_sponsorblock,
+                skip_no_music=job.skip_no_music,
+                cancel_check=job.cancel_token,
+                log_callback=lambda message: self._log(job, message),
+                noplaylist=job.parent is not None,
+                bytes_callback=lambda filename, downloaded: self._on_bytes(job, filename, downloaded),
+                connections=self.download_connections,
+                defer_postprocessing=defer_postprocessing,
+                sponsorblock_api=self.sponsorblock_api,
+                metrics=job.metrics,
+                tracker=job.temp_files,
+                retry_policy=self.retry_policy,
+                reuse_session=self.reuse_sessions
+            ))
+
+            if not result:
+                raise Exception("yt-dlp did not report any finished files")
+
+            if defer_postprocessing:
+                self._set_status(job, "processing")
+                # The outputs of a fan-out job are made in parallel from the same downloaded streams.
+                groups = group_outputs(result, job.format_choice)
+                job.outputs = {output: None for output, _ in groups}
+                job.outputs_pending = len(groups)
+                for output, infos in groups:
+                    self._postprocess_pending.put((job, output, infos))
+                self._ensure_postprocessors()
+                return True
+            self._finish_job(job, result)
+
+        except Exception as e:
+            if str(e) == CANCELLED_MESSAGE or isinstance(e, InterruptedError):
+                self._on_cancelled(job)
+            else:
+                self._on_error(job, e)
+        return False
+
+    def _postprocess_loop(self):
+        while True:
+            item = self._postprocess_pending.get()
+            if item is None:
+                return
+            job, output, infos = item
+            filepaths, error = None, None
+            try:
+                if job.is_cancelled():
+                    raise Exception(CANCELLED_MESSAGE)
+                self._log(job, "Post-processing downloaded files" if len(job.outputs) == 1
+                          else f"Making the {output} output")
+                filepaths = self.backend.run(
+                    "postprocess_video",
+                    infos=infos,
+                    format_choice=output,
+                    use_sponsorblock=job.use_sponsorblock,
+                    skip_no_music=job.skip_no_music,
+                    cancel_check=job.cancel_token,
+                    log_callback=lambda message: self._log(job, message),
+                    metrics=job.metrics,
+                    tracker=job.temp_files,
+                    reuse_session=self.reuse_sessions
+                )
+                if not filepaths:
+                    raise Exception("yt-dlp did not report any post-processed files")
+            except Exception as e:
+                error = e
+            if not self._collect_output(job, output, filepaths, error):
+                continue
+            try:
+                if job.output_error is not None:
+                    raise job.output_error
+                self._finish_job(job, [path for paths in job.outputs.values() for path in paths])
+            except Exception as e:
+                if str(e) == CANCELLED_MESSAGE or isinstance(e, InterruptedError):
+                    self._on_cancelled(job)
+                else:
+                    self._on_error(job, e)
+            if job.parent is not None:
+                self._on_child_done(job.parent, job)
+
+    def _collect_output(self, job, output, filepaths, error):
+        """Record one post-processed output of job; returns True once all of its outputs are done."""
+        with self._lock:
+            job.outputs[output] = filepaths or []
+            if error is not None and job.output_error is None:
+                job.output_error = error
+            job.outputs_pending -= 1
+            return job.outputs_pending == 0
+
+    def _finish_job(self, job, filepaths):
+        self._set_status(job, "finalizing")
+        with self._phase(job, "move"):
+            job.final_filepaths = finalize_files(
+                filepaths, job.download_folder,
+                log_callback=lambda message: self._log(job, message),
+                progress_callback=lambda filepath, copied, total: self._on_finalize_progress(job, copied, total),
+                cancel_check=job.is_cancelled
+            )
+        cleanup_temp_folder(job.temp_folder, lambda message: self._log(job, message))
+        self._archive_job(job)
+        job.percent = 100
+        self._set_status(job, "finished")
+        if self.finished_callback:
+            self.finished_callback(job)
@@ -1,70 +1,76 @@
-import yt_dlp
-import glob
+import contextlib
 import os
 
+from downloader import cancel
+from downloader.cancel import CANCELLED_MESSAGE
+from downloader.fanout import derive_outputs, group_outputs, is_fanout, output_formats, stream_specs, StreamSelector
+from downloader.info_cache import get_info_cache, info_cache_key
+from downloader.sessions import open_session
+from downloader.sponsorblock import DEFAULT_API as DEFAULT_SPONSORBLOCK_API
+from downloader.temp_files import TempFileTracker
 
-def download_video(url, format_choice, custom_name, download_folder, temp_folder, progress_callback, use_sponsorblock, skip_no_music, cancel_check=None, log_callback=None):
-    initial_files = set(os.listdir(temp_folder)) if os.path.exists(temp_folder) else set()
-    temp_files = set()
 
-    def progress_hook(d):
-        if cancel_check and cancel_check():
-            raise Exception("Download cancelled by user")
+def warm_up():
+    # yt_dlp and its extractor registry take a large share of startup time; import
+    # them off the GUI thread once the window is visible instead of at module import.
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes
+    gen_extractor_classes()
+    return yt_dlp
 
-        if d['status'] == 'downloading':
-            if 'filename' in d:
-                temp_file = d['filename']
-                if temp_file:
-                    temp_files.add(temp_file)
-                    if not temp_file.endswith('.part'):
-                        part_file = temp_file + '.part'
-                        if os.path.exists(part_file):
-                            temp_files.add(part_file)
-                    base_name = os.path.splitext(temp_file)[0]
-                    related_files = glob.glob(f"{base_name}*")
-                    for related_file in related_files:
-                        if os.path.exists(related_file):
-                            temp_files.add(related_file)
 
-            try:
-                downloaded = float(d.get('downloaded_bytes', 0))
-                total = float(d.get('total_bytes') or d.get('total_bytes_estimate', 1) or 1)
-                percent = min(int((downloaded / total) * 100), 100)
-                if progress_callback:
-                    progress_callback(percent)
-            except Exception as e:
-                if log_callback:
-                    log_callback(f"Error calculating progress: {str(e)}")
+# Options shared by every job, so jobs can reuse each other's YoutubeDL sessions (see sessions.py).
+SESSION_PROFILE = {
+    'verbose': False,
+    'continuedl': True,
+    'quiet': True,
+    'no_warnings': True,
+}
 
-    format_map = {
-        'mp4': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]',
-        'mp3': 'bestaudio/best',
-        'webm': 'bestvideo[ext=webm]+bestaudio[ext=webm]/best[ext=webm]',
-        'best': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
-    }
 
-    ydl_opts = {
-        'format': format_map.get(format_choice),
-        'outtmpl': os.path.join(temp_folder, f"{custom_name or '%(title)s'}.%(ext)s"),
-        'noplaylist': False,
-        'progress_hooks': [progress_hook],
-        'postprocessors': [],
-        'verbose': False,
-        'continuedl': True,
-        'quiet': True,
-        'no_warnings': True,
-    }
+class CustomLogger:
+    def __init__(self, log_callback, metrics=None):
+        self.log_callback = log_callback
+        self.metrics = metrics
 
-    if format_choice == 'webm':
-        ydl_opts['merge_output_format'] = 'webm'
-    elif format_choice in ['mp4', 'best']:
-        ydl_opts['merge_output_format'] = 'mp4'
+    def debug(self, msg):
+        if self.metrics is not None:
+            self.metrics.on_log(msg)
+        if "[download]" not in msg and self.log_callback:
+            self.log_callback(msg)
+
+    def warning(self, msg):
+        if self.metrics is not None:
+            self.metrics.on_log(msg)
+        if self.log_callback:
+            self.log_callback(f"Warning: {msg}")
+
+    def error(self, msg):
+        if self.log_callback:
+            self.log_callback(f"Error: {msg}")
 
+
+def postprocessor_options(format_choice, use_sponsorblock, skip_no_music, sponsorblock_api=None):
+    """yt-dlp postprocessors for a job.
+
+    The ones that run 'post_process' are the CPU-bound ffmpeg steps (transcoding,
+    cutting); everything else runs as part of the download.
+    """
+    postprocessors = []
     if format_choice == 'mp3':
-        ydl_opts['postprocessors'].append({
+        postprocessors.append({
             'key': 'FFmpegExtractAudio',
             'preferredcodec': 'mp3',
             'preferredquality': '192',
+            'when': 'post_process'
+        })
+    elif format_choice == 'audio':
+        # The downloaded opus/aac stream is kept as it is or copied into an audio
+        # container; ffmpeg only transcodes a codec it cannot copy.
+        postprocessors.append({
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'best',
+            'when': 'post_process'
         })
 
     if use_sponsorblock or skip_no_music:
@@ -74,79 +80,259 @@ def download_video(url, format_choice, custom_name, download_folder, temp_folder
         if skip_no_music:
             sponsor_categories.append('filler')
 
-        ydl_opts['postprocessors'].append({
+        postprocessors.append({
             'key': 'SponsorBlock',
             'categories': sponsor_categories,
+            'api': sponsorblock_api or DEFAULT_SPONSORBLOCK_API,
             'when': 'after_filter'
         })
 
-        ydl_opts['postprocessors'].append({
-            'key': 'ModifyChapters',
+        postprocessors.append({
+            'key': 'SmartCut',
             'remove_sponsor_segments': sponsor_categories,
-            'force_keyframes': False,
             'sponsorblock_chapter_title': '[SponsorBlock]: %(category_names)s',
             'when': 'post_process'
         })
 
-        ydl_opts['postprocessors'].append({
-            'key': 'FFmpegMetadata',
-            'add_chapters': True,
-            'add_metadata': False,
-            'when': 'post_process'
-        })
+    if format_choice == 'audio':
+        postprocessors.append({'key': 'FFmpegMetadata', 'add_metadata': True, 'when': 'post_process'})
+        postprocessors.append({'key': 'EmbedThumbnail', 'already_have_thumbnail': False, 'when': 'post_process'})
+    return postprocessors
 
-    class CustomLogger:
-        def __init__(self, log_callback):
-            self.log_callback = log_callback
 
-        def debug(self, msg):
-            if "[download]" not in msg and self.log_callback:
-                self.log_callback(msg)
+def add_postprocessors(ydl, postprocessors):
+    """Add postprocessor option dicts to ydl in order, preferring this package's own postprocessors."""
+    from yt_dlp.postprocessor import get_postprocessor
+    from downloader import extensions
 
-        def warning(self, msg):
-            if self.log_callback:
-                self.log_callback(f"Warning: {msg}")
+    for options in postprocessors:
+        options = dict(options)
+        key = options.pop('key')
+        when = options.pop('when', 'post_process')
+        pp_class = extensions.POSTPROCESSORS.get(key) or get_postprocessor(key)
+        ydl.add_post_processor(pp_class(ydl, **options), when=when)
 
-        def error(self, msg):
-            if self.log_callback:
-                self.log_callback(f"Error: {msg}")
 
-    ydl_opts['logger'] = CustomLogger(log_callback)
+def sponsorblock_categories(use_sponsorblock, skip_no_music):
+    for pp in postprocessor_options(None, use_sponsorblock, skip_no_music):
+        if pp['key'] == 'SponsorBlock':
+            return pp['categories']
+    return []
 
-    try:
+
+def needs_postprocessing(format_choice, use_sponsorblock, skip_no_music):
+    if is_fanout(format_choice):
+        # The outputs of a fan-out job are made from the downloaded streams afterwards.
+        return True
+    return any(pp['when'] == 'post_process'
+               for pp in postprocessor_options(format_choice, use_sponsorblock, skip_no_music))
+
+
+def download_video(url, format_choice, custom_name, download_folder, temp_folder, progress_callback, use_sponsorblock, skip_no_music, cancel_check=None, log_callback=None, noplaylist=False, bytes_callback=None, use_info_cache=True, connections=1, defer_postprocessing=False, sponsorblock_api=None, metrics=None, tracker=None, retry_policy=None, reuse_session=True):
+    """Download url into temp_folder and return the paths of the finished files.
+
+    With defer_postprocessing the ffmpeg post-processing steps are skipped and the
+    info dicts of the downloaded files are returned instead, for postprocess_video().
+    metrics is an optional metrics.JobMetrics that gets the timings and counters,
+    tracker an optional TempFileTracker that records the files the job writes, and
+    retry_policy an optional retry.RetryPolicy for yt-dlp's own retries and their backoff.
+    With reuse_session a warm YoutubeDL from the shared session pool is used.
+    A cancel.CancelToken as cancel_check also aborts blocked reads and ffmpeg runs.
+    A format_choice like 'mp4+mp3' downloads the streams its outputs need once and
+    makes each output from them (see fanout.py); deferred, the info dicts are those
+    of the outputs, each with its format as '__output_format'.
+    """
+    import yt_dlp
+    from downloader import extensions
+
+    extensions.install()
+    if tracker is None:
+        tracker = TempFileTracker(temp_folder)
+    collector = extensions.FinalFileCollector()
+
+    def phase(name):
+        return metrics.phase(name) if metrics is not None else contextlib.nullcontext()
+
+    def progress_hook(d):
         if cancel_check and cancel_check():
-            raise Exception("Download cancelled by user")
+            raise Exception(CANCELLED_MESSAGE)
+
+        if metrics is not None:
+            metrics.on_progress(d)
+
+        if bytes_callback and d['status'] in ('downloading', 'finished'):
+            bytes_callback(d.get('filename'), d.get('downloaded_bytes') or d.get('total_bytes') or 0)
+
+        if d['status'] == 'downloading':
+            tracker.on_progress(d)
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            temp_filename = ydl.prepare_filename(info)
-            temp_files.add(temp_filename)
+            try:
+                downloaded = float(d.get('downloaded_bytes', 0))
+                total = float(d.get('total_bytes') or d.get('total_bytes_estimate', 1) or 1)
+                percent = min(int((downloaded / total) * 100), 100)
+                if progress_callback:
+                    progress_callback(percent)
+            except Exception as e:
+                if log_callback:
+                    log_callback(f"Error calculating progress: {str(e)}")
 
-            if custom_name:
-                custom_base_name = os.path.join(temp_folder, custom_name)
-                related_files = glob.glob(f"{custom_base_name}*")
-                for related_file in related_files:
-                    if os.path.exists(related_file):
-                        temp_files.add(related_file)
+    format_map = {
+        'mp4': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]',
+        'mp3': 'bestaudio/best',
+        'audio': 'bestaudio[acodec^=opus]/bestaudio[acodec^=mp4a]/bestaudio/best',
+        'webm': 'bestvideo[ext=webm]+bestaudio[ext=webm]/best[ext=webm]',
+        'best': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
+    }
+
+    formats = output_formats(format_choice)
+    fanout = len(formats) > 1
+    postprocessors = postprocessor_options(format_choice, use_sponsorblock, skip_no_music, sponsorblock_api)
+    if defer_postprocessing or fanout:
+        postprocessors = [pp for pp in postprocessors if pp['when'] != 'post_process']
+    # Outputs whose post-processing embeds the thumbnail, so it has to be downloaded.
+    thumbnail_outputs = [output for output in formats
+                         if any(pp['key'] == 'EmbedThumbnail' for pp in postprocessor_options(output, False, False))]
+    name = custom_name or '%(title)s'
+
+    ydl_opts = {
+        'format': format_map.get(format_choice),
+        'outtmpl': os.path.join(temp_folder, f"{name}.%(ext)s"),
+        'noplaylist': noplaylist,
+        'progress_hooks': [progress_hook],
+        'postprocessor_hooks': [tracker.on_postprocess] + ([metrics.on_postprocess] if metrics is not None else []),
+        'concurrent_fragment_downloads': max(1, connections),
+        'download_connections': max(1, connections),
+        'writethumbnail': bool(thumbnail_outputs),
+    }
+    if fanout:
+        # Every stream is kept as a file of its own; they share one thumbnail.
+        ydl_opts['outtmpl'] = {
+            'default': os.path.join(temp_folder, f"{name}.f%(format_id)s.%(ext)s"),
+            'thumbnail': os.path.join(temp_folder, f"{name}.%(ext)s"),
+        }
 
-            ydl.download([url])
+    if retry_policy is not None:
+        ydl_opts.update(retry_policy.ydl_options(cancel_check))
+
+    if format_choice == 'webm':
+        ydl_opts['merge_output_format'] = 'webm'
+    elif format_choice in ['mp4', 'best']:
+        ydl_opts['merge_output_format'] = 'mp4'
+
+    ydl_opts['logger'] = CustomLogger(log_callback, metrics)
+
+    try:
+        if cancel_check and cancel_check():
+            raise Exception(CANCELLED_MESSAGE)
+
+        with cancel.activate(cancel_check), open_session(SESSION_PROFILE, ydl_opts, reuse_session) as ydl:
+            cancel.guard_urlopen(ydl, cancel_check)
+            if fanout:
+                selector = StreamSelector(ydl, stream_specs(formats))
+                ydl.params['format'] = ydl.format_selector = selector
+            add_postprocessors(ydl, postprocessors)
+            ydl.add_post_processor(collector, when='after_move')
+            info_cache = get_info_cache() if use_info_cache else None
+            cache_key = info_cache_key(url) if info_cache else None
+            info = info_cache.get(cache_key) if cache_key else None
+            from_cache = info is not None
+            if from_cache:
+                if log_callback:
+                    log_callback(f"Using cached metadata for {cache_key}")
+            else:
+                # Extract once without processing, then hand the raw result to the same
+                # processing/download step that ydl.download() would run after extracting again.
+                with phase('extraction'):
+                    info = ydl.extract_info(url, download=False, process=False)
+                if cache_key and info and info.get('_type', 'video') == 'video':
+                    info_cache.put(cache_key, ydl.sanitize_info(info, remove_private_keys=True))
+
+            if cancel_check and cancel_check():
+                raise Exception(CANCELLED_MESSAGE)
+            try:
+                with phase('download'):
+                    ydl.process_ie_result(info, download=True)
+            except yt_dlp.utils.DownloadError:
+                if not from_cache:
+                    raise
+                # Cached stream URLs can be revoked before their expiry; retry with fresh metadata.
+                info_cache.invalidate(cache_key)
+                if log_callback:
+                    log_callback(f"Cached metadata for {cache_key} is stale, extracting again")
+                with phase('extraction'):
+                    info = ydl.extract_info(url, download=False, process=False)
+                info_cache.put(cache_key, ydl.sanitize_info(info, remove_private_keys=True))
+                with phase('download'):
+                    ydl.process_ie_result(info, download=True)
 
     except Exception as e:
-        if str(e) == "Download cancelled by user":
-            current_files = set(os.listdir(temp_folder)) if os.path.exists(temp_folder) else set()
-            new_files = current_files - initial_files
-            for new_file in new_files:
-                full_path = os.path.join(temp_folder, new_file)
-                temp_files.add(full_path)
-            temp_files.update(glob.glob(os.path.join(temp_folder, "*.part")))
-            temp_files.update(glob.glob(os.path.join(temp_folder, "*.part-Frag*")))
-            temp_files.update(glob.glob(os.path.join(temp_folder, "*.ytdl")))
+        # An aborted read or a killed ffmpeg surfaces as whatever error yt-dlp makes of it.
+        if str(e) == CANCELLED_MESSAGE or (cancel_check and cancel_check()):
+            temp_files = tracker.collect()
             if log_callback:
                 log_callback(f"Cancellation temporary files: {temp_files}")
-            raise Exception("Download cancelled by user") from e
+            raise Exception(CANCELLED_MESSAGE) from e
         else:
             if log_callback:
                 log_callback(f"Error downloading video: {str(e)}")
             raise
 
-    return []
\ No newline at end of file
+    if not fanout:
+        return collector.infos if defer_postprocessing else collector.filepaths
+    infos = derive_outputs(formats, collector.infos, selector.chosen, temp_folder, tracker, thumbnail_outputs)
+    if defer_postprocessing:
+        return infos
+    filepaths = []
+    for output, output_infos in group_outputs(infos, format_choice):
+        filepaths.extend(postprocess_video(output_infos, output, use_sponsorblock, skip_no_music, cancel_check,
+                                           log_callback, metrics, tracker, reuse_session))
+    return filepaths
+
+
+def postprocess_video(infos, format_choice, use_sponsorblock, skip_no_music, cancel_check=None, log_callback=None,
+                      metrics=None, tracker=None, reuse_session=True):
+    """Run the deferred post-processing steps on files from download_video(defer_postprocessing=True).
+
+    For a fan-out job this runs once per output, with that output's format as format_choice.
+    """
+    from yt_dlp.postprocessor import FFmpegMergerPP
+    from downloader import extensions
+
+    extensions.install()
+    collector = extensions.FinalFileCollector()
+
+    def postprocessor_hook(d):
+        if cancel_check and cancel_check():
+            raise Exception(CANCELLED_MESSAGE)
+
+    postprocessor_hooks = [postprocessor_hook]
+    if tracker is not None:
+        postprocessor_hooks.append(tracker.on_postprocess)
+    if metrics is not None:
+        postprocessor_hooks.append(metrics.on_postprocess)
+
+    ydl_opts = {
+        'postprocessor_hooks': postprocessor_hooks,
+        'logger': CustomLogger(log_callback, metrics),
+    }
+
+    try:
+        with cancel.activate(cancel_check), open_session(SESSION_PROFILE, ydl_opts, reuse_session) as ydl:
+            cancel.guard_urlopen(ydl, cancel_check)
+            add_postprocessors(ydl, [pp for pp in postprocessor_options(format_choice, use_sponsorblock, skip_no_music)
+                                     if pp['when'] == 'post_process'])
+            ydl.add_post_processor(collector, when='after_move')
+            for info in infos:
+                if cancel_check and cancel_check():
+                    raise Exception(CANCELLED_MESSAGE)
+                if info.get('__files_to_merge'):
+                    info = ydl.run_pp(FFmpegMergerPP(ydl), info)
+                ydl.post_process(info['filepath'], info)
+    except Exception as e:
+        if str(e) == CANCELLED_MESSAGE or (cancel_check and cancel_check()):
+            raise Exception(CANCELLED_MESSAGE) from e
+        if log_callback:
+            log_callback(f"Error post-processing video: {str(e)}")
+        raise
+
+    return collector.filepaths
@@ -0,0 +1,259 @@
+import copy
+import math
+import os
+import re
+import time
+
+import yt_dlp.downloader
+import yt_dlp.utils
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.postprocessor.embedthumbnail import EmbedThumbnailPP, EmbedThumbnailPPError
+from yt_dlp.postprocessor.ffmpeg import FFmpegMetadataPP
+from yt_dlp.postprocessor.modify_chapters import ModifyChaptersPP
+from yt_dlp.postprocessor.sponsorblock import SponsorBlockPP
+from yt_dlp.utils import PostProcessingError, prepend_extension, replace_extension
+from yt_dlp.utils.networking import HTTPHeaderDict
+
+from downloader.cancel import track_process
+from downloader.segmented import (
+    download_ranges, read_segment_state, segment_state_path, MIN_SEGMENT_SIZE, SEGMENT_SIZE
+)
+from downloader.smart_cut import smart_cut
+from downloader.sponsorblock import get_segment_cache
+
+_installed = False
+
+
+class SegmentedHttpFD(HttpFD):
+    """HttpFD that fetches progressive files over several range requests in parallel.
+
+    Enabled by the custom 'download_connections' param; anything it cannot split
+    (unknown size, servers without range support, plain .part resumes) goes through
+    the stock single-connection downloader.
+    """
+
+    def real_download(self, filename, info_dict):
+        connections = self.params.get('download_connections') or 1
+        tmpfilename = self.temp_name(filename)
+        state_path = segment_state_path(filename)
+        headers = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+        continuedl = self.params.get('continuedl', True)
+        resuming_segmented = continuedl and os.path.isfile(tmpfilename) and os.path.isfile(state_path)
+        resuming_single = continuedl and os.path.isfile(tmpfilename) and not resuming_segmented
+        if ((connections <= 1 and not resuming_segmented) or self.params.get('test')
+                or info_dict.get('request_data') or 'Range' in headers or resuming_single or tmpfilename == '-'):
+            return super().real_download(filename, info_dict)
+
+        url = info_dict['url']
+        total_size = self._probe_size(url, headers)
+        if not total_size or total_size < 2 * MIN_SEGMENT_SIZE:
+            # A preallocated segmented .part file cannot be resumed by the single-connection path.
+            for path in (tmpfilename, state_path):
+                if os.path.isfile(path):
+                    os.remove(path)
+            return super().real_download(filename, info_dict)
+
+        chunk_size = info_dict.get('downloader_options', {}).get('http_chunk_size') or SEGMENT_SIZE
+        segment_size = max(MIN_SEGMENT_SIZE, min(chunk_size, math.ceil(total_size / (connections * 4))))
+        if resuming_segmented:
+            segment_size = read_segment_state(state_path).get('segment_size') or segment_size
+        self.report_destination(filename)
+        self.to_screen(f'[download] Using {connections} connections for {total_size} bytes')
+        start_time = time.time()
+
+        def open_range(start, end):
+            response = self.ydl.urlopen(Request(url, headers={**headers, 'Range': f'bytes={start}-{end}'}))
+            if response.status != 206:
+                response.close()
+                raise IOError(f'Server ignored the byte range request (HTTP {response.status})')
+            return response
+
+        def report_progress(downloaded):
+            elapsed = time.time() - start_time
+            speed = downloaded / elapsed if elapsed > 0 else None
+            self._hook_progress({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': total_size,
+                'filename': filename,
+                'tmpfilename': tmpfilename,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (total_size - downloaded) / speed if speed else None,
+            }, info_dict)
+
+        download_ranges(open_range, total_size, tmpfilename, connections, segment_size,
+                        report_progress, state_path)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': total_size,
+            'total_bytes': total_size,
+            'filename': filename,
+            'elapsed': time.time() - start_time,
+        }, info_dict)
+        return True
+
+    def _probe_size(self, url, headers):
+        try:
+            response = self.ydl.urlopen(Request(url, headers={**headers, 'Range': 'bytes=0-0'}))
+        except Exception:
+            return None
+        try:
+            match = re.match(r'bytes 0-0/(\d+)', response.headers.get('Content-Range') or '')
+            return int(match.group(1)) if response.status == 206 and match else None
+        finally:
+            response.close()
+
+
+class FinalFileCollector(PostProcessor):
+    """Records the path and info dict of every file yt-dlp finished, after merging and postprocessing."""
+
+    def __init__(self, downloader=None):
+        super().__init__(downloader)
+        self.filepaths = []
+        self.infos = []
+
+    @classmethod
+    def pp_key(cls):
+        return 'FinalFileCollector'
+
+    def run(self, info):
+        if info.get('filepath'):
+            self.filepaths.append(info['filepath'])
+            self.infos.append(info)
+        return [], info
+
+
+class CachedSponsorBlockPP(SponsorBlockPP):
+    """SponsorBlockPP that reads segments from the local segment cache before asking the API."""
+
+    @classmethod
+    def pp_key(cls):
+        return 'SponsorBlock'
+
+    def _get_sponsor_segments(self, video_id, service):
+        cache = get_segment_cache()
+        segments = cache.get(video_id, service, self._categories)
+        if segments is None:
+            segments = super()._get_sponsor_segments(video_id, service)
+            cache.put(video_id, service, self._categories, segments)
+        else:
+            self.write_debug(f'Using cached SponsorBlock segments for {video_id}')
+        return segments
+
+
+class SmartCutPP(ModifyChaptersPP):
+    """Removes SponsorBlock segments and embeds the chapters in a single ffmpeg pass.
+
+    Replaces ModifyChapters followed by FFmpegMetadata: cut points are resolved the
+    same way, but the file is only rewritten once and cuts between keyframes are
+    exact (see smart_cut). Without ffprobe it falls back to those two stock steps.
+    """
+
+    @classmethod
+    def pp_key(cls):
+        return 'SmartCut'
+
+    @PostProcessor._restrict_to(images=False)
+    def run(self, info):
+        if not self.probe_available:
+            files_to_remove, info = super().run(info)
+            more_files, info = FFmpegMetadataPP(self._downloader, add_metadata=False).run(info)
+            return files_to_remove + more_files, info
+
+        self._fixup_chapters(info)
+        chapters, sponsor_chapters = self._mark_chapters_to_remove(
+            copy.deepcopy(info.get('chapters')) or [],
+            copy.deepcopy(info.get('sponsorblock_chapters')) or [])
+        cuts = []
+        real_duration = None
+        if chapters or sponsor_chapters:
+            real_duration = self._get_real_video_duration(info['filepath'])
+            if not chapters:
+                chapters = [{'start_time': 0, 'end_time': info.get('duration') or real_duration,
+                             'title': info['title']}]
+            new_chapters, cuts = self._remove_marked_arrange_sponsors(chapters + sponsor_chapters)
+            if cuts and not new_chapters:
+                self.report_warning('You have requested to remove the entire video, which is not possible')
+                cuts = []
+            else:
+                info['chapters'] = new_chapters
+        if cuts:
+            original_duration, info['duration'] = info.get('duration'), info['chapters'][-1]['end_time']
+            if self._duration_mismatch(real_duration, original_duration, 1):
+                if not self._duration_mismatch(real_duration, info['duration']):
+                    self.to_screen('Skipping cuts since the video appears to be already cut')
+                    cuts = []
+                elif not info.get('__real_download'):
+                    raise PostProcessingError('Cannot cut video since the real and expected durations mismatch. '
+                                              'Different chapters may have already been removed')
+                else:
+                    self.write_debug('Expected and actual durations mismatch')
+        if not cuts and not info.get('chapters'):
+            return [], info
+
+        path = info['filepath']
+        temp_path = prepend_extension(path, 'temp')
+        mtime = os.stat(path).st_mtime
+        try:
+            smart_cut(self.executable, self.probe_executable, path, temp_path,
+                      [(cut['start_time'], cut['end_time']) for cut in cuts], real_duration,
+                      info.get('chapters'), self.to_screen)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise PostProcessingError(str(e))
+        os.replace(temp_path, path)
+        self.try_utime(path, mtime, mtime)
+        return [], info
+
+
+class OptionalEmbedThumbnailPP(EmbedThumbnailPP):
+    """EmbedThumbnailPP that keeps the file without cover art when it cannot embed one,
+    e.g. into .opus files without mutagen installed, instead of failing the job."""
+
+    @classmethod
+    def pp_key(cls):
+        return 'EmbedThumbnail'
+
+    def run(self, info):
+        try:
+            return super().run(info)
+        except EmbedThumbnailPPError as e:
+            self.report_warning(f'Not embedding the thumbnail: {e}')
+        thumbnails = [thumbnail['filepath'] for thumbnail in info.get('thumbnails') or [] if thumbnail.get('filepath')]
+        leftovers = thumbnails + [replace_extension(path, 'png') for path in thumbnails]
+        leftovers.append(prepend_extension(info['filepath'], 'temp'))
+        return [path for path in dict.fromkeys(leftovers) if os.path.exists(path)], info
+
+
+# Postprocessors of this package, used in place of yt-dlp's ones with the same key.
+POSTPROCESSORS = {
+    'SponsorBlock': CachedSponsorBlockPP,
+    'SmartCut': SmartCutPP,
+    'EmbedThumbnail': OptionalEmbedThumbnailPP,
+}
+
+
+def _watch_processes(popen_class):
+    # Every ffmpeg/ffprobe yt-dlp starts goes through its Popen; registering them with the
+    # job's cancel token lets a cancel kill a merge or transcode that is running.
+    original_init = popen_class.__init__
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        track_process(self)
+
+    popen_class.__init__ = __init__
+
+
+def install():
+    global _installed
+    if not _installed:
+        yt_dlp.downloader.PROTOCOL_MAP['http'] = SegmentedHttpFD
+        yt_dlp.downloader.PROTOCOL_MAP['https'] = SegmentedHttpFD
+        _watch_processes(yt_dlp.utils.Popen)
+        _installed = True
@@ -0,0 +1,171 @@
+import os
+import shutil
+
+SEPARATOR = '+'
+# Outputs made from a video stream: video selector, audio selector, container. The
+# video selector falls back to a file that already has audio in it.
+VIDEO_OUTPUTS = {
+    'mp4': ('bestvideo[ext=mp4]/best[ext=mp4]', 'bestaudio[ext=m4a]', 'mp4'),
+    'webm': ('bestvideo[ext=webm]/best[ext=webm]', 'bestaudio[ext=webm]', 'webm'),
+    'best': ('bestvideo[ext=mp4]/bestvideo/best', 'bestaudio[ext=m4a]/bestaudio', 'mp4'),
+}
+# Outputs made from an audio stream; with a video output in the job they use its audio.
+AUDIO_OUTPUTS = {
+    'mp3': 'bestaudio/best',
+    'audio': 'bestaudio[acodec^=opus]/bestaudio[acodec^=mp4a]/bestaudio/best',
+}
+
+
+def output_formats(format_choice):
+    """The formats a format choice like 'mp4+mp3' stands for, in order."""
+    formats = list(dict.fromkeys(format_choice.split(SEPARATOR)))
+    containers = [VIDEO_OUTPUTS[output][2] for output in formats if output in VIDEO_OUTPUTS]
+    if len(set(containers)) != len(containers):
+        raise Exception(f"The outputs of {format_choice} would overwrite each other")
+    return formats
+
+
+def is_fanout(format_choice):
+    return len(output_formats(format_choice)) > 1
+
+
+def stream_specs(formats):
+    """Format selectors for the streams all outputs are made from, each once."""
+    specs = [spec for output in formats if output in VIDEO_OUTPUTS for spec in VIDEO_OUTPUTS[output][:2]]
+    if not specs:
+        specs = [AUDIO_OUTPUTS['audio' if 'audio' in formats else formats[0]]]
+    return list(dict.fromkeys(specs))
+
+
+class StreamSelector:
+    """yt-dlp 'format' function that downloads the streams of several outputs once.
+
+    Every selector is resolved on its own, and a stream picked by more than one of
+    them is only downloaded the first time; chosen maps each selector to the
+    format_id it picked.
+    """
+
+    def __init__(self, ydl, specs):
+        self.selectors = [(spec, ydl.build_format_selector(spec)) for spec in specs]
+        self.chosen = {}
+
+    def __call__(self, ctx):
+        selected = set()
+        for spec, selector in self.selectors:
+            fmt = next(iter(selector(ctx)), None)
+            if fmt is None:
+                continue
+            self.chosen[spec] = fmt['format_id']
+            if fmt['format_id'] not in selected:
+                selected.add(fmt['format_id'])
+                yield fmt
+
+
+def _link(source, path):
+    # Every output gets its own names for the streams, since merging and converting
+    # delete their input; hard links cost nothing where the file system has them.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+    return path
+
+
+def _has_audio(stream):
+    return stream is not None and stream.get('acodec') != 'none'
+
+
+def _base_name(stream):
+    # download_video() names every stream <name>.f<format_id>.<ext>.
+    root = os.path.splitext(os.path.basename(stream['filepath']))[0]
+    suffix = f".f{stream['format_id']}"
+    return root[:-len(suffix)] if root.endswith(suffix) else root
+
+
+def _thumbnails(stream, folder, linked):
+    # Only outputs that embed the thumbnail get a copy of it; the others must not point at it.
+    thumbnails = []
+    for thumbnail in stream.get('thumbnails') or []:
+        thumbnail = dict(thumbnail)
+        filepath = thumbnail.pop('filepath', None)
+        if linked and filepath and os.path.exists(filepath):
+            thumbnail['filepath'] = _link(filepath, os.path.join(folder, os.path.basename(filepath)))
+        thumbnails.append(thumbnail)
+    return thumbnails
+
+
+def derive_outputs(formats, streams, chosen, temp_folder, tracker=None, thumbnail_outputs=()):
+    """Info dicts to post-process for each output, from the streams download_video() fetched.
+
+    Each output is prepared in a subfolder of temp_folder, so outputs can be made in
+    parallel; its info dicts carry the output format as '__output_format', and
+    '__files_to_merge' when a video and an audio stream still have to be merged.
+    The outputs in thumbnail_outputs get their own copy of the written thumbnail.
+    """
+    by_id = {stream['format_id']: stream for stream in streams}
+
+    def pick(spec):
+        return by_id.get(chosen.get(spec))
+
+    outputs = []
+    audio_source = None
+    for output in formats:
+        if output not in VIDEO_OUTPUTS:
+            continue
+        video_spec, audio_spec, container = VIDEO_OUTPUTS[output]
+        video, audio = pick(video_spec), pick(audio_spec)
+        if video is None or (audio is None and not _has_audio(video)):
+            raise Exception(f"Requested format is not available for the {output} output")
+        if _has_audio(video):
+            audio = None
+        audio_source = audio_source or audio or video
+        outputs.append((output, video, audio, container))
+    if audio_source is None:
+        audio_source = pick(stream_specs(formats)[0])
+    for output in formats:
+        if output in AUDIO_OUTPUTS:
+            if audio_source is None:
+                raise Exception(f"Requested format is not available for the {output} output")
+            outputs.append((output, audio_source, None, None))
+
+    infos = []
+    for output, stream, audio, container in outputs:
+        folder = os.path.join(temp_folder, output)
+        name = _base_name(stream)
+        thumbnails = _thumbnails(stream, folder, output in thumbnail_outputs)
+        if audio is None:
+            path = _link(stream['filepath'], os.path.join(folder, f"{name}.{stream['ext']}"))
+            info = dict(stream, filepath=path)
+            links = [path]
+        else:
+            requested = [dict(part, filepath=_link(part['filepath'], os.path.join(folder, os.path.basename(part['filepath']))))
+                         for part in (stream, audio)]
+            links = [part['filepath'] for part in requested]
+            info = dict(stream, filepath=os.path.join(folder, f"{name}.{container}"), ext=container,
+                        format_id='+'.join(part['format_id'] for part in requested),
+                        requested_formats=requested, __files_to_merge=links)
+        info.update(thumbnails=thumbnails, __files_to_move={}, __output_format=output)
+        # yt-dlp would move the finished output out of its folder.
+        info.pop('__finaldir', None)
+        if tracker is not None:
+            # Also registers what converting the output may leave behind.
+            tracker.on_postprocess({'info_dict': info})
+            tracker.files.update(links)
+        infos.append(info)
+
+    written = {thumbnail.get('filepath') for stream in streams for thumbnail in stream.get('thumbnails') or []}
+    for path in {stream['filepath'] for stream in streams} | (written - {None}):
+        if os.path.exists(path):
+            os.remove(path)
+    return infos
+
+
+def group_outputs(infos, format_choice):
+    """[(format, infos)] with the info dicts of each output of a job, in order."""
+    groups = {}
+    for info in infos:
+        groups.setdefault(info.get('__output_format', format_choice), []).append(info)
+    return list(groups.items())
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import shutil
+
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _same_device(path, folder):
+    try:
+        return os.stat(path).st_dev == os.stat(folder).st_dev
+    except OSError:
+        return False
+
+
+def _hash_file(path, cancel_check=None):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            if cancel_check and cancel_check():
+                raise InterruptedError("Copy cancelled")
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_verified(source, destination, progress_callback=None, cancel_check=None):
+    """Copy source to destination through a .part file, then verify both SHA-256 digests match."""
+    total = os.path.getsize(source)
+    part_path = destination + '.part'
+    digest = hashlib.sha256()
+    copied = 0
+    try:
+        with open(source, 'rb') as src, open(part_path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                if cancel_check and cancel_check():
+                    raise InterruptedError("Copy cancelled")
+                dst.write(chunk)
+                digest.update(chunk)
+                copied += len(chunk)
+                if progress_callback:
+                    progress_callback(copied, total)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if _hash_file(part_path, cancel_check) != digest.hexdigest():
+            raise IOError(f"Checksum mismatch after copying {source} to {destination}")
+        shutil.copystat(source, part_path)
+        os.replace(part_path, destination)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.remove(source)
+
+
+def finalize_files(filepaths, download_folder, log_callback=None, progress_callback=None, cancel_check=None):
+    """Move the files yt-dlp reported as finished into download_folder.
+
+    Same-device moves are a single atomic os.replace; across devices the file is
+    streamed with progress and checksummed before the temp copy is removed.
+    """
+    final_filepaths = []
+    for filepath in dict.fromkeys(filepaths):
+        if not os.path.exists(filepath):
+            if log_callback:
+                log_callback(f"Warning: File {filepath} not found during move")
+            continue
+        final_filepath = os.path.join(download_folder, os.path.basename(filepath))
+        if os.path.abspath(filepath) == os.path.abspath(final_filepath):
+            final_filepaths.append(final_filepath)
+            continue
+        if log_callback:
+            log_callback(f"Moving file: {filepath} to {final_filepath}")
+        if _same_device(filepath, download_folder):
+            os.replace(filepath, final_filepath)
+        else:
+            if log_callback:
+                log_callback(f"Copying across devices ({os.path.getsize(filepath)} bytes), verifying checksum")
+            copy_verified(filepath, final_filepath,
+                          progress_callback=lambda copied, total: progress_callback and progress_callback(
+                              filepath, copied, total),
+                          cancel_check=cancel_check)
+        final_filepaths.append(final_filepath)
+    return final_filepaths
+
+
+def remove_temp_files(paths, log_callback=None):
+    """Delete the given temporary files of a job; returns the ones that were removed."""
+    removed = []
+    for path in sorted(paths):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            if log_callback:
+                log_callback(f"Warning: could not delete {path}: {str(e)}")
+            continue
+        removed.append(path)
+    if removed and log_callback:
+        log_callback(f"Deleted {len(removed)} temporary file(s)")
+    return removed
+
+
+def cleanup_temp_folder(temp_folder, log_callback=None):
+    # Fan-out jobs make each output in a subfolder of their own.
+    if os.path.isdir(temp_folder):
+        for entry in os.scandir(temp_folder):
+            if entry.is_dir(follow_symlinks=False):
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    pass
+    if os.path.exists(temp_folder) and not os.listdir(temp_folder):
+        shutil.rmtree(temp_folder)
+        if log_callback:
+            log_callback(f"Deleted empty temp folder: {temp_folder}")
+        _remove_empty_parent(temp_folder)
+
+
+def remove_temp_folder(temp_folder):
+    """Delete the temp folder of a job that will not be resumed, with whatever it left in it."""
+    if os.path.isdir(temp_folder):
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        _remove_empty_parent(temp_folder)
+
+
+def _remove_empty_parent(temp_folder):
+    parent_folder = os.path.dirname(temp_folder)
+    if os.path.basename(parent_folder) == "temp":
+        try:
+            os.rmdir(parent_folder)
+        except OSError:
+            pass
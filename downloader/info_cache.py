@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config.settings import get_config_dir
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+# Stream URLs are refused a little before their advertised expiry, and a long
+# download started just before the deadline must still be able to finish.
+EXPIRY_MARGIN = 30 * 60
+
+_EXPIRE_RE = re.compile(r'[/?&]expire[/=](\d+)')
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def info_cache_key(url):
+    from yt_dlp.extractor import gen_extractor_classes
+    from yt_dlp.plugins import all_plugins_loaded, load_all_plugins
+
+    # Extractor plugins are otherwise only registered once a YoutubeDL instance exists.
+    if not all_plugins_loaded.value:
+        load_all_plugins()
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        video_id = ie.get_temp_id(url)
+        return f"{ie.ie_key()}:{video_id}" if video_id else None
+    return None
+
+
+def stream_expiry(info):
+    expiries = []
+    for fmt in info.get('formats') or []:
+        for url in (fmt.get('url'), fmt.get('manifest_url'), fmt.get('fragment_base_url')):
+            match = _EXPIRE_RE.search(url or '')
+            if match:
+                expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+class InfoCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or os.path.join(get_config_dir(), "info_cache.sqlite3")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS info_cache ("
+                "key TEXT PRIMARY KEY, info TEXT NOT NULL, expires REAL NOT NULL, last_access REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS info_cache_last_access ON info_cache (last_access)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT info, expires FROM info_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE info_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, info):
+        now = time.time()
+        expires = now + self.ttl
+        expiry = stream_expiry(info)
+        if expiry is not None:
+            expires = min(expires, expiry - EXPIRY_MARGIN)
+        if expires <= now:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO info_cache (key, info, expires, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(info), expires, now))
+            self._conn.execute("DELETE FROM info_cache WHERE expires <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM info_cache WHERE key IN "
+                "(SELECT key FROM info_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+    def invalidate(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM info_cache")
+
+
+def get_info_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = InfoCache()
+        return _shared_cache
@@ -0,0 +1,161 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import get_config_dir
+from downloader.finalize import remove_temp_folder
+
+UNFINISHED_STATUSES = ("queued", "downloading", "retrying", "processing", "finalizing")
+_UNFINISHED_PLACEHOLDERS = ", ".join("?" * len(UNFINISHED_STATUSES))
+FINISHED_RETENTION = 30 * 24 * 60 * 60
+# A process that records jobs beats its row in the owners table this often. Its jobs are left
+# alone by other processes sharing the config folder (the GUI and a cron run of the command
+# line) until it exits or its heartbeat is older than HEARTBEAT_TIMEOUT.
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+# Unfinished jobs that are not owned by another live process.
+_RESUMABLE = (f"status IN ({_UNFINISHED_PLACEHOLDERS}) AND (owner IS NULL OR owner = ? "
+              "OR owner NOT IN (SELECT pid FROM owners WHERE heartbeat >= ?))")
+
+_shared_journal = None
+_shared_journal_lock = threading.Lock()
+
+
+class JobJournal:
+    """Crash-safe record of every queued, running and finished job.
+
+    Each job is keyed by its temp folder, so the partial files of many jobs can
+    coexist and be resumed after a restart or crash. Jobs are owned by the process
+    that recorded them last; see HEARTBEAT_INTERVAL.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_config_dir(), "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_key TEXT PRIMARY KEY, parent_key TEXT, url TEXT NOT NULL, format_choice TEXT NOT NULL, "
+            "custom_name TEXT, download_folder TEXT NOT NULL, options TEXT NOT NULL, status TEXT NOT NULL, "
+            "partial_files TEXT NOT NULL DEFAULT '[]', final_files TEXT NOT NULL DEFAULT '[]', error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)")
+        if "owner" not in [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS owners (pid INTEGER PRIMARY KEY, heartbeat REAL NOT NULL)")
+        self._conn.execute("DELETE FROM owners WHERE heartbeat < ?", (time.time() - HEARTBEAT_TIMEOUT,))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._heartbeat = None
+        self._conn.execute(f"DELETE FROM jobs WHERE status NOT IN ({_UNFINISHED_PLACEHOLDERS}) AND updated < ?",
+                           UNFINISHED_STATUSES + (time.time() - FINISHED_RETENTION,))
+
+    def record(self, job):
+        now = time.time()
+        parent_key = job.parent.temp_folder if job.parent is not None else None
+        options = {
+            "use_sponsorblock": job.use_sponsorblock,
+            "skip_no_music": job.skip_no_music,
+            "playlist": job.playlist,
+            "sync": job.sync,
+            "priority": job.priority,
+            "title": job.title,
+            # Entries not started yet are not in the journal; they are read again on restore.
+            "enumerating": job.enumerating or bool(job.entries),
+        }
+        with self._lock:
+            if self._heartbeat is None:
+                self._start_heartbeat()
+            self._conn.execute(
+                "INSERT INTO jobs (job_key, parent_key, url, format_choice, custom_name, download_folder, options, "
+                "status, partial_files, final_files, error, created, updated, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(job_key) DO UPDATE SET parent_key = excluded.parent_key, options = excluded.options, "
+                "status = excluded.status, partial_files = excluded.partial_files, "
+                "final_files = excluded.final_files, error = excluded.error, updated = excluded.updated, "
+                "owner = excluded.owner",
+                (job.temp_folder, parent_key, job.url, job.format_choice, job.custom_name, job.download_folder,
+                 json.dumps(options), job.status, json.dumps(self._partial_files(job)),
+                 json.dumps(job.final_filepaths), job.error, now, now, os.getpid()))
+
+    def unfinished(self):
+        """The unfinished jobs to resume, leaving out those another running process still owns."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_key, parent_key, url, format_choice, custom_name, download_folder, options, "
+                f"partial_files FROM jobs WHERE {_RESUMABLE} ORDER BY created",
+                self._resumable_args()).fetchall()
+        records = []
+        for job_key, parent_key, url, format_choice, custom_name, download_folder, options, partial_files in rows:
+            records.append({
+                "job_key": job_key,
+                "parent_key": parent_key,
+                "url": url,
+                "format_choice": format_choice,
+                "custom_name": custom_name,
+                "download_folder": download_folder,
+                "partial_files": json.loads(partial_files),
+                **json.loads(options),
+            })
+        return records
+
+    def owned_elsewhere(self):
+        """Number of unfinished top-level jobs that another running process still owns."""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE status IN ({_UNFINISHED_PLACEHOLDERS}) AND parent_key IS NULL "
+                "AND owner != ? AND owner IN (SELECT pid FROM owners WHERE heartbeat >= ?)",
+                self._resumable_args()).fetchone()[0]
+
+    def discard_unfinished(self):
+        """Mark the unfinished jobs cancelled and delete the partial files they left behind.
+
+        Jobs that another running process still owns are left alone.
+        """
+        with self._lock:
+            temp_folders = [row[0] for row in self._conn.execute(
+                f"SELECT job_key FROM jobs WHERE {_RESUMABLE}", self._resumable_args())]
+            self._conn.executemany("UPDATE jobs SET status = 'cancelled', updated = ? WHERE job_key = ?",
+                                   [(time.time(), temp_folder) for temp_folder in temp_folders])
+        for temp_folder in temp_folders:
+            remove_temp_folder(temp_folder)
+
+    def _resumable_args(self):
+        return UNFINISHED_STATUSES + (os.getpid(), time.time() - HEARTBEAT_TIMEOUT)
+
+    def _start_heartbeat(self):
+        self._heartbeat = threading.Event()
+        self._beat()
+        atexit.register(self._stop_heartbeat)
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def _heartbeat_loop(self):
+        while not self._heartbeat.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                self._beat()
+
+    def _beat(self):
+        self._conn.execute("INSERT INTO owners (pid, heartbeat) VALUES (?, ?) "
+                           "ON CONFLICT(pid) DO UPDATE SET heartbeat = excluded.heartbeat", (os.getpid(), time.time()))
+
+    def _stop_heartbeat(self):
+        # The jobs of a process that exits are free to resume straight away.
+        self._heartbeat.set()
+        with self._lock:
+            self._conn.execute("DELETE FROM owners WHERE pid = ?", (os.getpid(),))
+
+    def _partial_files(self, job):
+        if job.children or not os.path.isdir(job.temp_folder):
+            return []
+        return sorted(os.path.join(job.temp_folder, name) for name in os.listdir(job.temp_folder))
+
+
+def get_journal():
+    global _shared_journal
+    with _shared_journal_lock:
+        if _shared_journal is None:
+            _shared_journal = JobJournal()
+        return _shared_journal
@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import get_config_dir
+
+PHASES = ("extraction", "download", "merge", "postprocess", "move")
+# yt-dlp postprocessors that are reported as a phase of their own.
+POSTPROCESSOR_PHASES = {"Merger": "merge", "MoveFiles": "move"}
+SAMPLE_INTERVAL = 1.0
+MAX_SAMPLES = 600
+RECENT_JOBS = 100
+# The metrics file is moved to <file>.1, replacing the previous one, once it would grow past this.
+METRICS_FILE_MAX_BYTES = 5 * 1024 * 1024
+METRIC_PREFIX = "coffee_ytdl"
+
+
+class JobMetrics:
+    """Timings and counters of one job, filled in from the yt-dlp hooks.
+
+    Phases are exclusive: time spent in postprocessors is booked to merge,
+    postprocess or move, not to the download phase it happened in.
+    """
+
+    def __init__(self, job_id, url):
+        self.job_id = job_id
+        self.url = url
+        self.started = time.time()
+        self.status = None
+        self.phases = {}
+        self.postprocessors = {}
+        self.retries = 0
+        self.speed_samples = []
+        self._started_at = time.monotonic()
+        self._sample_interval = SAMPLE_INTERVAL
+        self._next_sample = 0.0
+        self._stream_bytes = {}
+        self._fragments = {}
+        self._pp_started = {}
+        self._pp_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def downloaded_bytes(self):
+        with self._lock:
+            return sum(self._stream_bytes.values())
+
+    @property
+    def fragments(self):
+        with self._lock:
+            return sum(self._fragments.values())
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + max(0.0, seconds)
+
+    @contextmanager
+    def phase(self, name):
+        started, pp_seconds = time.monotonic(), self._pp_seconds
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.monotonic() - started - (self._pp_seconds - pp_seconds))
+
+    def on_progress(self, d):
+        # Runs for every downloaded block, so it only touches a few dict entries. Segmented
+        # downloads call it from several threads while the metrics server sums the dicts.
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes') or d.get('total_bytes')
+        with self._lock:
+            if downloaded is not None:
+                self._stream_bytes[filename] = downloaded
+            if d.get('fragment_index') is not None:
+                self._fragments[filename] = d['fragment_index']
+        now = time.monotonic()
+        if d['status'] == 'downloading' and now >= self._next_sample and d.get('speed') is not None:
+            self._next_sample = now + self._sample_interval
+            with self._lock:
+                self.speed_samples.append((round(now - self._started_at, 3), int(d['speed'])))
+                if len(self.speed_samples) >= MAX_SAMPLES:
+                    del self.speed_samples[::2]
+                    self._sample_interval *= 2
+
+    def on_postprocess(self, d):
+        name = d.get('postprocessor')
+        if d['status'] == 'started':
+            self._pp_started[name] = time.monotonic()
+        elif d['status'] == 'finished' and name in self._pp_started:
+            seconds = time.monotonic() - self._pp_started.pop(name)
+            self._pp_seconds += seconds
+            with self._lock:
+                self.postprocessors[name] = self.postprocessors.get(name, 0.0) + seconds
+            self.add_phase(POSTPROCESSOR_PHASES.get(name, "postprocess"), seconds)
+
+    def on_log(self, message):
+        if "Retrying" in message:
+            self.add_retry()
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def merge(self, record):
+        """Add the timings and counters of a JobMetrics that ran elsewhere, e.g. in a worker process."""
+        offset = (time.monotonic() - self._started_at) - record["elapsed"]
+        for name, seconds in record["phases"].items():
+            self.add_phase(name, seconds)
+        with self._lock:
+            for name, seconds in record["postprocessors"].items():
+                self.postprocessors[name] = self.postprocessors.get(name, 0.0) + seconds
+            self.retries += record["retries"]
+            self.speed_samples.extend((round(at + offset, 3), speed) for at, speed in record["speed_samples"])
+            merged = len(self._stream_bytes)
+            self._stream_bytes[("merged", merged)] = record["bytes"]
+            self._fragments[("merged", merged)] = record["fragments"]
+
+    def current_speed(self):
+        with self._lock:
+            return self.speed_samples[-1][1] if self.speed_samples else 0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "url": self.url,
+                "status": self.status,
+                "started": self.started,
+                "elapsed": round(time.monotonic() - self._started_at, 3),
+                "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                "postprocessors": {name: round(seconds, 3) for name, seconds in self.postprocessors.items()},
+                "bytes": sum(self._stream_bytes.values()),
+                "fragments": sum(self._fragments.values()),
+                "retries": self.retries,
+                "speed_samples": list(self.speed_samples),
+            }
+
+
+class MetricsRegistry:
+    """Metrics of all jobs of a queue: live jobs, totals and the most recent finished jobs.
+
+    Finished jobs are appended to jsonl_path, one JSON object per line; the file is
+    rotated at max_bytes, so at most two of them are kept.
+    """
+
+    def __init__(self, jsonl_path=None, max_bytes=METRICS_FILE_MAX_BYTES):
+        self.jsonl_path = jsonl_path
+        self.max_bytes = max_bytes
+        self.active = {}
+        self.recent = deque(maxlen=RECENT_JOBS)
+        self.totals = {"jobs": {}, "phase_seconds": {}, "bytes": 0, "fragments": 0, "retries": 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Registry as configured in config.json; a relative metrics_file is in the config folder."""
+        path = config.get("metrics_file")
+        if path:
+            path = os.path.join(get_config_dir(), os.path.expanduser(path))
+        return cls(path or None)
+
+    def start_job(self, job):
+        metrics = JobMetrics(job.job_id, job.url)
+        with self._lock:
+            self.active[job.job_id] = metrics
+        return metrics
+
+    def finish_job(self, metrics, status):
+        metrics.status = status
+        record = metrics.to_dict()
+        with self._lock:
+            self.active.pop(metrics.job_id, None)
+            self.recent.append(record)
+            self.totals["jobs"][status] = self.totals["jobs"].get(status, 0) + 1
+            for name, seconds in record["phases"].items():
+                self.totals["phase_seconds"][name] = self.totals["phase_seconds"].get(name, 0.0) + seconds
+            for key in ("bytes", "fragments", "retries"):
+                self.totals[key] += record[key]
+            if self.jsonl_path:
+                self._append(json.dumps(record) + "\n")
+
+    def _append(self, line):
+        try:
+            size = os.path.getsize(self.jsonl_path)
+        except OSError:
+            size = 0
+        if size and size + len(line) > self.max_bytes:
+            os.replace(self.jsonl_path, self.jsonl_path + ".1")
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def snapshot(self):
+        with self._lock:
+            active = list(self.active.values())
+            snapshot = {
+                "totals": json.loads(json.dumps(self.totals)),
+                "recent": list(self.recent),
+            }
+        snapshot["active"] = [metrics.to_dict() for metrics in active]
+        return snapshot
+
+    def prometheus_text(self):
+        with self._lock:
+            totals = json.loads(json.dumps(self.totals))
+            active = list(self.active.values())
+        lines = [
+            f"# HELP {METRIC_PREFIX}_jobs_total Jobs that ended, by final status.",
+            f"# TYPE {METRIC_PREFIX}_jobs_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_jobs_total{{status="{status}"}} {count}'
+                  for status, count in sorted(totals["jobs"].items())]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_phase_seconds_total Time spent per phase by ended jobs.",
+            f"# TYPE {METRIC_PREFIX}_phase_seconds_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_phase_seconds_total{{phase="{phase}"}} {totals["phase_seconds"].get(phase, 0.0):.3f}'
+                  for phase in PHASES]
+        for key, help_text in (("bytes", "Bytes downloaded by ended jobs."),
+                               ("fragments", "Fragments downloaded by ended jobs."),
+                               ("retries", "Network retries of yt-dlp and retried jobs.")):
+            name = f"{METRIC_PREFIX}_{'downloaded_bytes' if key == 'bytes' else key}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {totals[key]}"]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_active_jobs Jobs currently running.",
+            f"# TYPE {METRIC_PREFIX}_active_jobs gauge",
+            f"{METRIC_PREFIX}_active_jobs {len(active)}",
+            f"# HELP {METRIC_PREFIX}_download_speed_bytes Current download speed of all running jobs.",
+            f"# TYPE {METRIC_PREFIX}_download_speed_bytes gauge",
+            f"{METRIC_PREFIX}_download_speed_bytes {sum(metrics.current_speed() for metrics in active)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics (Prometheus text format) and /metrics.json from a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,147 @@
+import time
+from urllib.parse import urlparse, parse_qs
+
+from downloader import cancel
+from downloader.cancel import CANCELLED_MESSAGE
+from downloader.sessions import open_session
+
+PLAYLIST_PATH_MARKERS = ('/playlist', '/channel/', '/c/', '/user/', '/@')
+CHANNEL_PATH_PREFIXES = ('channel', 'c', 'user')
+# Channel tabs that list uploads newest first; a channel URL without a tab opens its videos.
+NEWEST_FIRST_TABS = ('', 'videos', 'shorts', 'streams')
+SESSION_PROFILE = {
+    'extract_flat': 'in_playlist',
+    'skip_download': True,
+    'quiet': True,
+    'no_warnings': True,
+}
+# Entries go to expand_playlist()'s entries_callback in batches of at most this many,
+# the first one right away and then at least every ENTRY_BATCH_INTERVAL seconds.
+ENTRY_BATCH = 50
+ENTRY_BATCH_INTERVAL = 0.5
+# How many 'url' results (a channel URL pointing at its videos tab, ...) are followed.
+MAX_REDIRECTS = 3
+
+
+def is_playlist_url(url):
+    parsed = urlparse(url)
+    if 'list' in parse_qs(parsed.query):
+        return True
+    return any(marker in parsed.path for marker in PLAYLIST_PATH_MARKERS)
+
+
+def is_newest_first_url(url):
+    """Whether new videos only ever show up at the start of the URL's entries: a channel's
+    uploads, but not a playlist, which grows at its end."""
+    parsed = urlparse(url)
+    lists = parse_qs(parsed.query).get('list')
+    if lists:
+        # UU... is the uploads playlist of a channel.
+        return lists[0].startswith('UU')
+    parts = parsed.path.strip('/').split('/')
+    if parts[0].startswith('@'):
+        tab = parts[1:2]
+    elif parts[0] in CHANNEL_PATH_PREFIXES and len(parts) > 1:
+        tab = parts[2:3]
+    else:
+        return False
+    return (tab[0] if tab else '') in NEWEST_FIRST_TABS
+
+
+def _entry_url(entry):
+    url = entry.get('url') or entry.get('webpage_url')
+    if url and '://' in url:
+        return url
+    if entry.get('ie_key') == 'Youtube' and entry.get('id'):
+        return f"https://www.youtube.com/watch?v={entry['id']}"
+    return None
+
+
+def _is_nested_playlist(entry):
+    return entry.get('_type') == 'playlist' or (entry.get('ie_key') or '').endswith('Tab')
+
+
+def _extract(ydl, url):
+    # Without processing, yt-dlp returns the extractor's result as it is: the entries of a
+    # playlist stay a generator or paged list that fetches the next page only when needed.
+    info = ydl.extract_info(url, download=False, process=False)
+    for _ in range(MAX_REDIRECTS):
+        if not info or info.get('_type') not in ('url', 'url_transparent'):
+            break
+        info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+    return info
+
+
+def _iter_entries(ydl, info, seen, cancel_check, depth=0):
+    """Yield the video entries of a playlist info dict as its pages are fetched."""
+    for entry in info.get('entries') or []:
+        if cancel_check and cancel_check():
+            raise Exception(CANCELLED_MESSAGE)
+        if not entry:
+            continue
+        if _is_nested_playlist(entry) and depth < 2:
+            if entry.get('_type') != 'playlist':
+                entry = _extract(ydl, _entry_url(entry))
+            if entry:
+                yield from _iter_entries(ydl, entry, seen, cancel_check, depth + 1)
+            continue
+        url = _entry_url(entry)
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        yield {'url': url, 'id': entry.get('id'), 'ie_key': entry.get('ie_key'), 'title': entry.get('title')}
+
+
+def expand_playlist(url, cancel_check=None, log_callback=None, stop_check=None, reuse_session=True,
+                    entries_callback=None):
+    """Flat-extract a playlist/channel URL.
+
+    Returns (title, entries) where entries are dicts with url/id/ie_key/title, or None
+    if the URL turned out to be a single video. Pages are fetched lazily; with
+    entries_callback, entries are passed on as entries_callback(title, entries) while
+    later pages are still being read, instead of being returned. Collection ends
+    early, without the entry, once stop_check(entry) returns True. A
+    cancel.CancelToken as cancel_check also aborts the requests in flight. With
+    reuse_session a warm YoutubeDL from the shared session pool is used.
+    """
+    class PlaylistLogger:
+        def debug(self, msg):
+            if cancel_check and cancel_check():
+                raise Exception(CANCELLED_MESSAGE)
+            if log_callback and not msg.startswith('[download]'):
+                log_callback(msg)
+
+        def warning(self, msg):
+            if log_callback:
+                log_callback(f"Warning: {msg}")
+
+        def error(self, msg):
+            if log_callback:
+                log_callback(f"Error: {msg}")
+
+    try:
+        with open_session(SESSION_PROFILE, {'logger': PlaylistLogger()}, reuse_session) as ydl:
+            cancel.guard_urlopen(ydl, cancel_check)
+            info = _extract(ydl, url)
+            if not info or info.get('_type') != 'playlist':
+                return None
+            title = info.get('title') or url
+            entries, batch, flushed_at = [], [], 0
+            for entry in _iter_entries(ydl, info, set(), cancel_check):
+                if stop_check and stop_check(entry):
+                    break
+                if entries_callback is None:
+                    entries.append(entry)
+                    continue
+                batch.append(entry)
+                if len(batch) >= ENTRY_BATCH or time.monotonic() - flushed_at >= ENTRY_BATCH_INTERVAL:
+                    entries_callback(title, batch)
+                    batch, flushed_at = [], time.monotonic()
+            if batch:
+                entries_callback(title, batch)
+    except Exception as e:
+        if str(e) != CANCELLED_MESSAGE and cancel_check and cancel_check():
+            raise Exception(CANCELLED_MESSAGE) from e
+        raise
+
+    return title, entries
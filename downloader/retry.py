@@ -0,0 +1,123 @@
+import random
+import re
+
+from downloader.cancel import CancelToken
+
+RATE_LIMITED = "rate_limited"
+EXPIRED = "expired"
+NETWORK = "network"
+FATAL = "fatal"
+
+# Seconds before the first retry of a job; every further retry doubles it, up to MAX_DELAY.
+BASE_DELAYS = {RATE_LIMITED: 30.0, EXPIRED: 1.0, NETWORK: 2.0}
+MAX_DELAY = 300.0
+DEFAULT_BUDGET = 5
+# yt-dlp's own retries of a request or fragment, inside one download attempt. Used
+# through the API, yt-dlp does not retry at all unless told to.
+INLINE_RETRIES = 10
+INLINE_BASE_DELAY = 0.5
+INLINE_MAX_DELAY = 15.0
+
+# Errors often only reach us as text, e.g. inside an ExtractorError message.
+MESSAGE_PATTERNS = (
+    (RATE_LIMITED, re.compile(r"HTTP Error 429|Too Many Requests|confirm you.re not a bot", re.I)),
+    (EXPIRED, re.compile(r"HTTP Error (403|410)|Forbidden|URL.{0,20}expired", re.I)),
+    (NETWORK, re.compile(r"Connection (reset|refused|aborted|closed)|timed out|Remote end closed|"
+                         r"Temporary failure in name resolution|IncompleteRead|"
+                         r"HTTP Error 5\d\d|did not receive any data|giving up after", re.I)),
+)
+
+
+def _error_chain(error):
+    chain = []
+    while isinstance(error, BaseException) and error not in chain and len(chain) < 10:
+        chain.append(error)
+        exc_info = getattr(error, 'exc_info', None)
+        error = (exc_info[1] if exc_info else None) or error.__cause__ or error.__context__
+    return chain
+
+
+def classify_error(error):
+    """Kind of a failed attempt: RATE_LIMITED, EXPIRED, NETWORK, or FATAL when retrying cannot help."""
+    from yt_dlp.networking.exceptions import HTTPError, TransportError
+    from yt_dlp.utils import ContentTooShortError
+
+    chain = _error_chain(error)
+    for e in chain:
+        if isinstance(e, HTTPError):
+            if e.status == 429:
+                return RATE_LIMITED
+            if e.status in (403, 410):
+                return EXPIRED
+            if e.status >= 500:
+                return NETWORK
+            return FATAL
+        if isinstance(e, (TransportError, ContentTooShortError, ConnectionError, TimeoutError)):
+            return NETWORK
+    messages = " ".join(str(e) for e in chain)
+    for kind, pattern in MESSAGE_PATTERNS:
+        if pattern.search(messages):
+            return kind
+    return FATAL
+
+
+def retry_after(error):
+    """Seconds the server asked to wait in a Retry-After header, if any."""
+    from yt_dlp.networking.exceptions import HTTPError
+
+    for e in _error_chain(error):
+        if isinstance(e, HTTPError) and e.response is not None:
+            value = e.response.headers.get('Retry-After')
+            if value and value.strip().isdigit():
+                return float(value)
+    return None
+
+
+class RetryPolicy:
+    """How often and how long to wait before a failed job is attempted again.
+
+    Each job may be retried budget times in total. Delays grow exponentially per
+    retry with jitter, so jobs that failed together do not come back together, and
+    never undercut a Retry-After from the server.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, max_delay=MAX_DELAY):
+        self.budget = max(0, int(budget))
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config):
+        budget = config.get("retry_budget")
+        return cls(DEFAULT_BUDGET if budget is None else budget)
+
+    def delay(self, kind, retries, error=None):
+        """Seconds to wait before retry number retries + 1 after an error of kind, or None to give up."""
+        if kind not in BASE_DELAYS or retries >= self.budget:
+            return None
+        delay = _backoff(BASE_DELAYS[kind], retries, self.max_delay)
+        return max(delay, retry_after(error) or 0) if error is not None else delay
+
+    def ydl_options(self, cancel_check=None):
+        """yt-dlp options for its own request, fragment and extractor retries, with backoff.
+
+        With a cancel.CancelToken the backoff is waited out here, where a cancel ends
+        it, and yt-dlp is told to sleep 0 seconds.
+        """
+        def sleep(n):
+            delay = _backoff(INLINE_BASE_DELAY, n, INLINE_MAX_DELAY)
+            if not isinstance(cancel_check, CancelToken):
+                return delay
+            cancel_check.wait(delay)
+            return 0
+
+        return {
+            'retries': INLINE_RETRIES,
+            'fragment_retries': INLINE_RETRIES,
+            'retry_sleep_functions': {'http': sleep, 'fragment': sleep, 'extractor': sleep},
+        }
+
+
+def _backoff(base, retries, max_delay):
+    # Half fixed, half random: still grows with every retry but spreads the retries out.
+    delay = min(max_delay, base * 2 ** retries)
+    return delay / 2 + random.uniform(0, delay / 2)
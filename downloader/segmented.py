@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+SEGMENT_SIZE = 10 * 1024 * 1024
+MIN_SEGMENT_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def split_ranges(total_size, segment_size):
+    return [(start, min(start + segment_size, total_size) - 1) for start in range(0, total_size, segment_size)]
+
+
+def segment_state_path(filename):
+    return filename + '.segments'
+
+
+def read_segment_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_segment_state(state_path, total_size, segment_size):
+    state = read_segment_state(state_path)
+    if state.get('total_size') != total_size or state.get('segment_size') != segment_size:
+        return set()
+    return set(state.get('done', []))
+
+
+def download_ranges(open_range, total_size, path, connections, segment_size=SEGMENT_SIZE,
+                    progress_callback=None, state_path=None):
+    """Download [0, total_size) into path over several connections, one byte range at a time.
+
+    open_range(start, end) must return a readable response for that inclusive range.
+    Finished segments are recorded in state_path so an interrupted download resumes
+    without fetching them again.
+    """
+    ranges = split_ranges(total_size, segment_size)
+    done = set()
+    if state_path and os.path.isfile(path) and os.path.getsize(path) == total_size:
+        done = load_segment_state(state_path, total_size, segment_size)
+    lock = threading.Lock()
+    pending = iter([(index, r) for index, r in enumerate(ranges) if index not in done])
+    progress = {'downloaded': sum(ranges[index][1] - ranges[index][0] + 1 for index in done)}
+    errors = []
+
+    def save_state():
+        if state_path:
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump({'total_size': total_size, 'segment_size': segment_size, 'done': sorted(done)}, f)
+
+    if not done:
+        # The state file must exist before the preallocated file does, otherwise a
+        # single-connection resume would mistake the zero-filled file for a finished one.
+        save_state()
+        with open(path, 'wb') as f:
+            f.truncate(total_size)
+
+    def worker():
+        try:
+            with open(path, 'r+b') as out:
+                while not errors:
+                    with lock:
+                        index, (start, end) = next(pending, (None, (None, None)))
+                    if index is None:
+                        return
+                    response = open_range(start, end)
+                    try:
+                        out.seek(start)
+                        position = start
+                        while position <= end:
+                            if errors:
+                                return
+                            data = response.read(min(READ_SIZE, end - position + 1))
+                            if not data:
+                                raise IOError(f"Connection closed at byte {position} of range {start}-{end}")
+                            out.write(data)
+                            position += len(data)
+                            with lock:
+                                progress['downloaded'] += len(data)
+                                downloaded = progress['downloaded']
+                            # Outside the lock: the callback may block, e.g. for bandwidth limiting.
+                            if progress_callback:
+                                progress_callback(downloaded)
+                    finally:
+                        response.close()
+                    out.flush()
+                    with lock:
+                        done.add(index)
+                        save_state()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(connections, len(ranges))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
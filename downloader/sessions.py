@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+
+# Idle sessions kept per option profile; more than this many concurrent jobs just build extra ones.
+MAX_IDLE = 8
+# Options YoutubeDL only reads in __init__, to register the hooks; applied again for every job.
+HOOK_OPTIONS = {
+    'progress_hooks': 'add_progress_hook',
+    'postprocessor_hooks': 'add_postprocessor_hook',
+    'post_hooks': 'add_post_hook',
+}
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def _apply(ydl, base, options):
+    # Back to the profile's params, plus options, with nothing left over from the previous job.
+    ydl.params.clear()
+    ydl.params.update(base)
+    ydl.params.update(options)
+    ydl._parse_outtmpl()
+    format_spec = ydl.params.get('format')
+    ydl.format_selector = (format_spec if format_spec in (None, '-') or callable(format_spec)
+                           else ydl.build_format_selector(format_spec))
+    ydl._pps = {when: [] for when in ydl._pps}
+    ydl._progress_hooks, ydl._postprocessor_hooks, ydl._post_hooks = [], [], []
+    for option, add_hook in HOOK_OPTIONS.items():
+        for hook in ydl.params.get(option) or []:
+            getattr(ydl, add_hook)(hook)
+    ydl._download_retcode = ydl._num_downloads = ydl._num_videos = ydl._playlist_level = 0
+    ydl._playlist_urls = set()
+    ydl._printed_messages = set()
+    # cancel.guard_urlopen() of the previous job.
+    ydl.__dict__.pop('urlopen', None)
+
+
+class SessionPool:
+    """YoutubeDL instances kept warm between jobs, per option profile.
+
+    Building a YoutubeDL registers every extractor, which alone takes tens of
+    milliseconds, and each instance has its own request handlers, cookie jar and
+    initialized extractors; with the requests package installed, also keep-alive
+    connections. A session serves one job at a time: the job's options (output
+    template, format, hooks, logger) are applied on top of the profile and taken
+    off again afterwards. A session a job failed in is closed rather than reused.
+    """
+
+    def __init__(self, max_idle=MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, profile, options=None):
+        """A YoutubeDL built from the options dict profile, with options applied for this use."""
+        key = repr(sorted(profile.items()))
+        ydl, base = self._acquire(key, profile)
+        try:
+            _apply(ydl, base, options or {})
+            yield ydl
+        except BaseException:
+            ydl.close()
+            raise
+        _apply(ydl, base, {})
+        self._release(key, ydl, base)
+
+    def _acquire(self, key, profile):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        import yt_dlp
+
+        ydl = yt_dlp.YoutubeDL(dict(profile))
+        return ydl, dict(ydl.params)
+
+    def _release(self, key, ydl, base):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((ydl, base))
+                return
+        ydl.close()
+
+    def clear(self):
+        """Close all idle sessions, with their connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for sessions in idle.values():
+            for ydl, _ in sessions:
+                ydl.close()
+
+
+def get_session_pool():
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = SessionPool()
+        return _shared_pool
+
+
+def open_session(profile, options=None, reuse=True):
+    """Session from the shared pool, or with reuse=False a new YoutubeDL that is closed afterwards."""
+    pool = get_session_pool() if reuse else SessionPool(max_idle=0)
+    return pool.session(profile, options)
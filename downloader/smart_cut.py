@@ -0,0 +1,245 @@
+import json
+import os
+import re
+import subprocess
+
+from downloader.cancel import track_process
+
+# Cuts are stream-copied from keyframe to keyframe. The partial GOPs around a cut that
+# does not fall on a keyframe, after a kept range's start and before its end, are
+# re-encoded with parameter set IDs that cannot clash with the copied stream's, so the
+# result is frame-accurate without a full re-encode. Codecs without such an encoder keep
+# the whole GOPs around each cut instead.
+HEAD_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-x264-params', 'sps-id=1',
+             '-bsf:v', 'dump_extra'],
+    'vp9': ['-c:v', 'libvpx-vp9', '-crf', '24', '-b:v', '0', '-deadline', 'realtime', '-cpu-used', '8'],
+}
+H264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'}
+
+
+def keep_ranges(cuts, duration):
+    """Turn sorted, non-overlapping (start, end) cuts into the ranges that stay."""
+    ranges = []
+    position = 0.0
+    for start, end in cuts:
+        if start > position:
+            ranges.append((position, min(start, duration)))
+        position = max(position, end)
+    if position < duration:
+        ranges.append((position, duration))
+    return ranges
+
+
+def _keyframe_at(keyframes, position, tolerance):
+    return next((k for k in keyframes if abs(k - position) <= tolerance), None)
+
+
+def snap_ranges(ranges, keyframes, tolerance, duration):
+    """Widen kept ranges out to the keyframes around them, merging those that then overlap.
+
+    For codecs without a head encoder, where a range is stream-copied from the keyframe
+    before its start like a plain stream-copy cut; video and audio are both cut this way
+    so they stay in sync.
+    """
+    snapped = []
+    for start, end in ranges:
+        start = max((k for k in keyframes if k <= start + tolerance), default=0.0)
+        if end < duration - tolerance:
+            end = min((k for k in keyframes if k >= end - tolerance), default=duration)
+        if snapped and start <= snapped[-1][1] + tolerance:
+            snapped[-1] = (snapped[-1][0], max(snapped[-1][1], end))
+        else:
+            snapped.append((start, end))
+    return snapped
+
+
+def plan_pieces(ranges, keyframes, tolerance, duration):
+    """Split kept ranges into pieces that are stream-copied or re-encoded.
+
+    Copied pieces start and end on keyframes (within tolerance), or at the start or
+    end of the file. The heads and tails of a range between its cuts and the nearest
+    keyframes inside it are re-encoded; a range without keyframes to copy between is
+    re-encoded entirely.
+    """
+    pieces = []
+    for start, end in ranges:
+        copy_start = 0.0 if start == 0 else _keyframe_at(keyframes, start, tolerance)
+        head = copy_start is None
+        if head:
+            copy_start = next((k for k in keyframes if k > start), None)
+        copy_end = end if end >= duration - tolerance else _keyframe_at(keyframes, end, tolerance)
+        tail = copy_end is None
+        if tail:
+            copy_end = next((k for k in reversed(keyframes) if k < end), None)
+        if copy_start is None or copy_end is None or copy_end <= copy_start + tolerance:
+            pieces.append({'start': start, 'end': end, 'mode': 'encode'})
+            continue
+        if head:
+            pieces.append({'start': start, 'end': copy_start, 'mode': 'encode'})
+        pieces.append({'start': copy_start, 'end': copy_end, 'mode': 'copy'})
+        if tail:
+            pieces.append({'start': copy_end, 'end': end, 'mode': 'encode'})
+    return pieces
+
+
+def _run(cmd):
+    with subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        track_process(process)
+        stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        message = stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise Exception(f"{os.path.basename(cmd[0])} failed: {message[-1] if message else process.returncode}")
+    return stdout.decode('utf-8', 'replace')
+
+
+def probe_streams(ffprobe, path):
+    output = _run([ffprobe, '-v', 'error', '-show_streams', '-show_format', '-of', 'json', path])
+    return json.loads(output)
+
+
+def probe_keyframes(ffprobe, path, stream_index):
+    """{pts: dts} of the keyframes of a stream, in seconds."""
+    # Packet flags are read from the container index, nothing is decoded.
+    output = _run([ffprobe, '-v', 'error', '-select_streams', str(stream_index),
+                   '-show_entries', 'packet=pts_time,dts_time,flags', '-of', 'csv=p=0', path])
+    keyframes = {}
+    for line in output.splitlines():
+        pts_time, dts_time, flags = (line.split(',') + ['', ''])[:3]
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes[float(pts_time)] = float(dts_time) if dts_time not in ('', 'N/A') else float(pts_time)
+    return keyframes
+
+
+def _frame_rate(stream):
+    match = re.fullmatch(r'(\d+)/(\d+)', stream.get('avg_frame_rate') or '')
+    if match and int(match.group(2)):
+        return int(match.group(1)) / int(match.group(2))
+    return 30.0
+
+
+def _quote(path):
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+def _write_concat(concat_path, entries, seek_any=False):
+    with open(concat_path, 'w', encoding='utf-8') as f:
+        f.write('ffconcat version 1.0\n')
+        for path, directives in entries:
+            f.write(f'file {_quote(os.path.abspath(path))}\n')
+            if seek_any:
+                f.write('option seek2any 1\n')
+            for name in ('inpoint', 'outpoint', 'duration'):
+                if name in directives:
+                    f.write(f'{name} {directives[name]:.6f}\n')
+
+
+def write_chapters(metadata_path, chapters):
+    def escape(text):
+        return re.sub(r'([\\=;#\n])', r'\\\1', text)
+
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        f.write(';FFMETADATA1\n')
+        for chapter in chapters:
+            f.write('[CHAPTER]\nTIMEBASE=1/1000\n')
+            f.write(f"START={int(chapter['start_time'] * 1000)}\nEND={int(chapter['end_time'] * 1000)}\n")
+            if chapter.get('title'):
+                f.write(f"title={escape(chapter['title'])}\n")
+
+
+def _encode_head(ffmpeg, path, stream, piece, head_path):
+    options = list(HEAD_ENCODERS[stream['codec_name']])
+    if stream['codec_name'] == 'h264' and stream.get('profile') in H264_PROFILES:
+        options += ['-profile:v', H264_PROFILES[stream['profile']]]
+    if stream.get('pix_fmt'):
+        options += ['-pix_fmt', stream['pix_fmt']]
+    _run([ffmpeg, '-y', '-v', 'error', '-nostdin', '-ss', f"{piece['start']:.6f}", '-i', path,
+          '-t', f"{piece['end'] - piece['start']:.6f}", '-map', f"0:{stream['index']}", '-an', '-sn', '-dn',
+          *options, head_path])
+
+
+def smart_cut(ffmpeg, ffprobe, path, out_path, cuts, duration, chapters=None, log_callback=None):
+    """Remove cuts from path and embed chapters, writing out_path in one stream-copy pass.
+
+    Returns a dict with the number of copied and re-encoded pieces.
+    """
+    probe = probe_streams(ffprobe, path)
+    streams = probe.get('streams') or []
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not (s.get('disposition') or {}).get('attached_pic')), None)
+    audio = [s for s in streams if s.get('codec_type') == 'audio']
+    ranges = keep_ranges(cuts, duration)
+    temp_files = []
+    stats = {'copied': 0, 'encoded': 0, 'pieces': 0}
+
+    try:
+        inputs, maps = [], []
+        if cuts:
+            if video is not None:
+                keyframes = probe_keyframes(ffprobe, path, video['index'])
+                tolerance = 0.5 / _frame_rate(video)
+                if video['codec_name'] not in HEAD_ENCODERS:
+                    # Nothing to re-encode the partial GOPs with (AV1, HEVC): copy whole GOPs.
+                    ranges = snap_ranges(ranges, sorted(keyframes), tolerance, duration)
+                pieces = plan_pieces(ranges, sorted(keyframes), tolerance, duration)
+                entries = []
+                for number, piece in enumerate(pieces):
+                    if piece['mode'] == 'encode':
+                        head_path = f"{out_path}.head{number}{os.path.splitext(path)[1]}"
+                        temp_files.append(head_path)
+                        _encode_head(ffmpeg, path, video, piece, head_path)
+                        entries.append((head_path, {'duration': piece['end'] - piece['start']}))
+                        stats['encoded'] += 1
+                    else:
+                        directives = {}
+                        if piece['start'] > 0:
+                            directives['inpoint'] = piece['start']
+                        if piece['end'] < duration - tolerance:
+                            # The concat demuxer stops at the outpoint by decoding time: ending
+                            # at the keyframe's DTS keeps exactly the frames shown before it,
+                            # where its PTS would let the B-frames after the cut through.
+                            directives['outpoint'] = keyframes.get(piece['end'], piece['end'])
+                            directives['duration'] = piece['end'] - piece['start']
+                        entries.append((path, directives))
+                        stats['copied'] += 1
+                stats['pieces'] = len(pieces)
+                video_concat = f"{out_path}.video.ffconcat"
+                temp_files.append(video_concat)
+                _write_concat(video_concat, entries)
+                maps += ['-map', f"{len(inputs)}:v:0"]
+                inputs.append(['-f', 'concat', '-safe', '0', '-i', video_concat])
+            if audio:
+                # Audio frames are short enough to cut exactly with stream copy, as long as the
+                # demuxer does not seek back to the video keyframe before each inpoint.
+                audio_concat = f"{out_path}.audio.ffconcat"
+                temp_files.append(audio_concat)
+                _write_concat(audio_concat, [
+                    (path, dict({'outpoint': end}, **({'inpoint': start} if start > 0 else {})))
+                    for start, end in ranges], seek_any=True)
+                maps += ['-map', f"{len(inputs)}:a"]
+                inputs.append(['-f', 'concat', '-safe', '0', '-i', audio_concat])
+                if video is None:
+                    stats['copied'] = stats['pieces'] = len(ranges)
+        else:
+            maps += ['-map', '0', '-dn', '-ignore_unknown']
+            inputs.append(['-i', path])
+
+        metadata_options = []
+        if chapters:
+            metadata_path = f"{out_path}.ffmeta"
+            temp_files.append(metadata_path)
+            write_chapters(metadata_path, chapters)
+            metadata_options = ['-map_metadata', str(len(inputs)), '-map_chapters', str(len(inputs))]
+            inputs.append(['-i', metadata_path])
+
+        if log_callback:
+            log_callback(f"Smart cut: {len(cuts)} cuts, {stats['copied']} copied and "
+                         f"{stats['encoded']} re-encoded pieces")
+        _run([ffmpeg, '-y', '-v', 'error', '-nostdin', *[arg for options in inputs for arg in options],
+              *maps, *metadata_options,
+              '-c', 'copy', '-movflags', '+faststart', out_path])
+    finally:
+        for temp_file in temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    return stats
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import get_config_dir
+from downloader.sql_batches import in_batches
+
+DEFAULT_API = "https://sponsor.ajay.app"
+# yt-dlp extractor key -> SponsorBlock service, as in yt-dlp's SponsorBlockPP.
+SERVICES = {"Youtube": "YouTube"}
+ACTION_TYPES = ["skip", "poi", "chapter"]
+# Segments keep being submitted and voted on, and a video without any is often just new.
+DEFAULT_TTL = 24 * 60 * 60
+EMPTY_TTL = 2 * 60 * 60
+HASH_PREFIX_LENGTH = 4
+PREFETCH_CONNECTIONS = 8
+REQUEST_TIMEOUT = 20
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def hash_prefix(video_id):
+    return hashlib.sha256(video_id.encode("ascii")).hexdigest()[:HASH_PREFIX_LENGTH]
+
+
+def categories_key(categories):
+    return ",".join(sorted(categories))
+
+
+class SegmentCache:
+    """Local cache of SponsorBlock segments per video, service and category set."""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, empty_ttl=EMPTY_TTL):
+        self.path = path or os.path.join(get_config_dir(), "sponsorblock.sqlite3")
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "video_id TEXT NOT NULL, service TEXT NOT NULL, categories TEXT NOT NULL, "
+                "segments TEXT NOT NULL, expires REAL NOT NULL, "
+                "PRIMARY KEY (video_id, service, categories)) WITHOUT ROWID")
+            self._conn.execute("DELETE FROM segments WHERE expires <= ?", (time.time(),))
+
+    def get(self, video_id, service, categories):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segments FROM segments WHERE video_id = ? AND service = ? AND categories = ? "
+                "AND expires > ?", (video_id, service, categories_key(categories), time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def missing(self, video_ids, service, categories):
+        """Return the video IDs that have no fresh cache entry."""
+        key = categories_key(categories)
+        now = time.time()
+        video_ids = list(dict.fromkeys(video_ids))
+        cached = set()
+        for placeholders, batch in in_batches(video_ids):
+            with self._lock:
+                cached.update(row[0] for row in self._conn.execute(
+                    f"SELECT video_id FROM segments WHERE service = ? AND categories = ? AND expires > ? "
+                    f"AND video_id IN ({placeholders})", [service, key, now] + batch))
+        return [video_id for video_id in video_ids if video_id not in cached]
+
+    def put_many(self, results, service, categories):
+        key = categories_key(categories)
+        now = time.time()
+        rows = [(video_id, service, key, json.dumps(segments), now + (self.ttl if segments else self.empty_ttl))
+                for video_id, segments in results.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO segments (video_id, service, categories, segments, expires) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def put(self, video_id, service, categories, segments):
+        self.put_many({video_id: segments}, service, categories)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments")
+
+
+def segments_url(api, prefix, service, categories):
+    return f"{api.rstrip('/')}/api/skipSegments/{prefix}?" + urllib.parse.urlencode({
+        "service": service,
+        "categories": json.dumps(list(categories)),
+        "actionTypes": json.dumps(ACTION_TYPES),
+    })
+
+
+def fetch_prefix(api, prefix, video_ids, service, categories):
+    """Look up every video sharing one hash prefix with a single request."""
+    try:
+        with urllib.request.urlopen(segments_url(api, prefix, service, categories),
+                                    timeout=REQUEST_TIMEOUT) as response:
+            data = json.load(response)
+    except urllib.error.HTTPError as e:
+        # SponsorBlock answers 404 when no video with this prefix has segments.
+        if e.code != 404:
+            raise
+        data = []
+    found = {item["videoID"]: item["segments"] for item in data or []}
+    return {video_id: found.get(video_id, []) for video_id in video_ids}
+
+
+def prefetch_segments(video_ids, categories, service="YouTube", api=DEFAULT_API, cache=None,
+                      log_callback=None):
+    """Fill the segment cache for many videos, e.g. all entries of a playlist.
+
+    Videos are grouped by hash prefix, so videos that share a prefix cost one
+    request, and the prefixes are fetched in parallel. Returns the number of
+    requests made.
+    """
+    cache = cache or get_segment_cache()
+    groups = {}
+    for video_id in cache.missing(video_ids, service, categories):
+        groups.setdefault(hash_prefix(video_id), []).append(video_id)
+    if not groups:
+        return 0
+
+    def fetch(item):
+        prefix, ids = item
+        try:
+            cache.put_many(fetch_prefix(api, prefix, ids, service, categories), service, categories)
+        except Exception as e:
+            if log_callback:
+                log_callback(f"Warning: could not prefetch SponsorBlock segments: {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=min(PREFETCH_CONNECTIONS, len(groups))) as executor:
+        list(executor.map(fetch, groups.items()))
+    return len(groups)
+
+
+def get_segment_cache():
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SegmentCache()
+        return _shared_cache
@@ -0,0 +1,9 @@
+# SQLite limits the number of bound parameters per statement.
+LOOKUP_BATCH = 500
+
+
+def in_batches(values):
+    """Split values into (placeholders, batch) pairs for a "... IN ({placeholders})" query each."""
+    for start in range(0, len(values), LOOKUP_BATCH):
+        batch = values[start:start + LOOKUP_BATCH]
+        yield ", ".join("?" * len(batch)), batch
@@ -0,0 +1,60 @@
+import os
+
+TEMP_SUFFIXES = ('.part', '.ytdl', '.segments')
+# Extensions of the files postprocessors convert to (FFmpegExtractAudio for the mp3 and
+# audio formats); an interrupted conversion leaves one behind without ever reporting it.
+CONVERTED_EXTENSIONS = ('.mp3', '.m4a', '.opus', '.ogg')
+
+
+class TempFileTracker:
+    """Remembers the files a download may leave behind without scanning the folder.
+
+    Progress hooks fire for every downloaded block, so registration only does work
+    when yt-dlp switches to a new file; the folder is listed once, in collect().
+    """
+
+    def __init__(self, temp_folder):
+        self.temp_folder = temp_folder
+        self.files = set()
+        self._last_filename = None
+
+    def register(self, filename):
+        if not filename or filename == self._last_filename:
+            return
+        self._last_filename = filename
+        self.files.add(filename)
+        if filename.endswith('.part'):
+            filename = filename[:-len('.part')]
+            self.files.add(filename)
+        for suffix in TEMP_SUFFIXES:
+            self.files.add(filename + suffix)
+
+    def register_thumbnails(self, info):
+        # Thumbnails written for embedding, and their conversions to png.
+        for thumbnail in (info or {}).get('thumbnails') or []:
+            if thumbnail.get('filepath') and thumbnail['filepath'] not in self.files:
+                self.files.update((thumbnail['filepath'], os.path.splitext(thumbnail['filepath'])[0] + '.png'))
+
+    def on_progress(self, d):
+        filename = d.get('tmpfilename') or d.get('filename')
+        if filename != self._last_filename:
+            self.register(filename)
+            self.register_thumbnails(d.get('info_dict'))
+
+    def on_postprocess(self, d):
+        info = d.get('info_dict') or {}
+        self.register_thumbnails(info)
+        filepath = info.get('filepath')
+        if filepath and filepath not in self.files:
+            root, ext = os.path.splitext(filepath)
+            self.files.update((filepath, f"{root}.temp{ext}"))
+            self.files.update(root + converted for converted in CONVERTED_EXTENSIONS)
+
+    def collect(self):
+        existing = {path for path in self.files if os.path.exists(path)}
+        # Fragmented downloads write <name>.part-Frag<N> files next to the .part file.
+        prefixes = tuple(os.path.basename(path) + '-Frag' for path in self.files if path.endswith('.part'))
+        if prefixes and os.path.isdir(self.temp_folder):
+            existing.update(os.path.join(self.temp_folder, name)
+                            for name in os.listdir(self.temp_folder) if name.startswith(prefixes))
+        return existing
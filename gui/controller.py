@@ -1,115 +1,103 @@
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtWidgets import QFileDialog, QMessageBox, QApplication
-from downloader.downloader import download_video
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QFileDialog, QMessageBox, QApplication, QTreeWidgetItem
+from downloader.download_queue import DownloadQueue
+from downloader.archive import get_archive
+from downloader.backends import create_backend
+from downloader.bandwidth import BandwidthScheduler
+from downloader.downloader import warm_up
+from downloader.journal import get_journal
+from downloader.metrics import MetricsRegistry
+from downloader.retry import RetryPolicy
+from gui.update_batcher import UpdateBatcher
 from config.settings import load_config, update_config
 from config.languages import get_text, set_language
 import os
-import glob
-import shutil
-
-
-class DownloadThread(QThread):
-    finished = Signal(str, list)
-    error = Signal(str)
-    progress = Signal(int)
-    cancelled = Signal(list)
-    log = Signal(str)
-    
-    def __init__(self, url, format_choice, custom_name, download_folder, temp_folder, use_sponsorblock, skip_no_music, cancel_check=None):
-        super().__init__()
-        self.url = url
-        self.format_choice = format_choice
-        self.custom_name = custom_name
-        self.download_folder = download_folder
-        self.temp_folder = temp_folder
-        self.use_sponsorblock = use_sponsorblock
-        self.skip_no_music = skip_no_music
-        self._is_cancelled = False
-        self.cancel_check = cancel_check
-        self.initial_files = set(os.listdir(temp_folder)) if os.path.exists(temp_folder) else set()
-        self.max_percent = 0
-
-    def cancel(self):
-        self._is_cancelled = True
-
-    def run(self):
-        try:
-            current_download_file = os.path.join(self.temp_folder, "current_download.txt")
-            with open(current_download_file, "w", encoding="utf-8") as f:
-                f.write(self.url)
-            self.log.emit(f"Starting download for URL: {self.url}\nIf it's a playlist or YouTube channel, please wait...\nCancellation will take time. Consider closing the program")
-
-            def progress_callback(percent):
-                if percent < self.max_percent - 50 and percent >= 0:
-                    self.max_percent = percent
-                if percent >= 0 and percent <= 100:
-                    if percent > self.max_percent:
-                        self.max_percent = percent
-                        self.progress.emit(self.max_percent)
-
-            def log_callback(message):
-                self.log.emit(message)
-
-            download_video(
-                url=self.url,
-                format_choice=self.format_choice,
-                custom_name=self.custom_name,
-                download_folder=self.download_folder,
-                temp_folder=self.temp_folder,
-                progress_callback=progress_callback,
-                use_sponsorblock=self.use_sponsorblock,
-                skip_no_music=self.skip_no_music,
-                cancel_check=lambda: self._is_cancelled or (self.cancel_check and self.cancel_check()),
-                log_callback=log_callback
-            )
-
-            temp_files = [f for f in os.listdir(self.temp_folder) if f.endswith(('.mp3', '.mp4', '.webm')) and not f.startswith('current_download')]
-            if not temp_files:
-                raise Exception("No completed files found in temp folder after download")
-
-            final_filepaths = []
-            for temp_filename in temp_files:
-                temp_filepath = os.path.join(self.temp_folder, temp_filename)
-                final_filepath = os.path.join(self.download_folder, temp_filename)
-                if os.path.exists(temp_filepath):
-                    self.log.emit(f"Moving file: {temp_filepath} to {final_filepath}")
-                    shutil.move(temp_filepath, final_filepath)
-                    final_filepaths.append(final_filepath)
-                else:
-                    self.log.emit(f"Warning: File {temp_filepath} not found during move")
-
-            if os.path.exists(current_download_file):
-                os.remove(current_download_file)
-                self.log.emit(f"Deleted current_download.txt: {current_download_file}")
-
-            if os.path.exists(self.temp_folder) and not os.listdir(self.temp_folder):
-                shutil.rmtree(self.temp_folder)
-                self.log.emit(f"Deleted empty temp folder: {self.temp_folder}")
-
-            self.finished.emit(get_text("success_download"), final_filepaths)
-
-        except Exception as e:
-            if str(e) == "Download cancelled by user":
-                current_files = set(os.listdir(self.temp_folder)) if os.path.exists(self.temp_folder) else set()
-                new_files = current_files - self.initial_files
-                temp_files = {os.path.join(self.temp_folder, f) for f in new_files}
-                temp_files.update(set(glob.glob(os.path.join(self.temp_folder, "*.part"))))
-                temp_files.update(set(glob.glob(os.path.join(self.temp_folder, "*.part-Frag*"))))
-                temp_files.update(set(glob.glob(os.path.join(self.temp_folder, "*.ytdl"))))
-                self.cancelled.emit(list(temp_files))
-                self.log.emit("Download cancelled by user")
-            else:
-                self.error.emit(f"{get_text('error_title')}: {str(e)}")
-                self.log.emit(f"Error: {str(e)}")
+import threading
+
+
+def format_size(num_bytes):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if num_bytes < 1024 or unit == "GiB":
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
 
 
 class Controller:
     def __init__(self, window):
         self.window = window
         self.config = load_config()
+        self.job_items = {}
+        self.batch_jobs = []
+        self.batch_done = True
+        self.setup_queue()
         self.setup_language()
         self.connect_signals()
         self.apply_stylesheet()
+        QTimer.singleShot(0, self.warm_up_downloader)
+        QTimer.singleShot(0, self.offer_resume)
+
+    def warm_up_downloader(self):
+        self.warm_up_thread = threading.Thread(target=warm_up, daemon=True)
+        self.warm_up_thread.start()
+
+    def setup_queue(self):
+        self.metrics = MetricsRegistry.from_config(self.config)
+        if self.config.get("metrics_port"):
+            try:
+                self.metrics.serve(int(self.config["metrics_port"]))
+            except OSError as e:
+                print(f"Could not start metrics endpoint: {e}")
+        self.batcher = UpdateBatcher(self.on_progress_update, self.update_log, parent=self.window)
+        self.queue = DownloadQueue(
+            max_workers=self.config.get("max_concurrent_downloads", 3),
+            progress_callback=self.batcher.post_progress,
+            log_callback=self.batcher.post_log,
+            finished_callback=lambda job: self.batcher.post_event(self.on_download_finished, job),
+            error_callback=lambda job, message: self.batcher.post_event(self.on_download_error, job, message),
+            cancelled_callback=lambda job, temp_files: self.batcher.post_event(self.on_download_cancelled, job, temp_files),
+            retrying_callback=lambda job, message, delay: self.batcher.post_event(self.update_job_item, job),
+            download_connections=self.config.get("download_connections", 4),
+            journal=get_journal(),
+            archive=get_archive() if self.config.get("use_download_archive", True) else None,
+            sponsorblock_api=self.config.get("sponsorblock_api"),
+            bandwidth=BandwidthScheduler.from_config(self.config),
+            metrics=self.metrics,
+            retry_policy=RetryPolicy.from_config(self.config),
+            backend=create_backend(self.config.get("execution_backend") or "thread"),
+            reuse_sessions=self.config.get("reuse_sessions", True)
+        )
+        self.window.max_workers_input.setValue(self.queue.max_workers)
+        self.window.connections_input.setValue(self.queue.download_connections)
+
+    def offer_resume(self):
+        records = self.queue.journal.unfinished()
+        top_level = [record for record in records if not record["parent_key"]]
+        busy = self.queue.journal.owned_elsewhere()
+        if busy:
+            self.window.status_label.setText(
+                f"{get_text('status_label')}: {get_text('resume_owned_elsewhere').format(count=busy)}")
+        if not top_level:
+            return
+        answer = QMessageBox.question(self.window, get_text("resume_title"),
+                                      get_text("resume_question").format(count=len(top_level)))
+        if answer != QMessageBox.Yes:
+            self.queue.journal.discard_unfinished()
+            return
+        self.batch_jobs = []
+        for job in self.queue.restore(records):
+            self.batch_jobs.append(job)
+            self.update_job_item(job)
+        self.batch_done = False
+        self.window.status_label.setText(f"{get_text('status_label')}: {get_text('resuming_download')}")
+        self.window.cancel_btn.setEnabled(True)
 
     def setup_language(self):
         lang_display = self.config.get("language", "English")
@@ -121,7 +109,8 @@ class Controller:
         set_language({"english": "en", "tiếng việt": "vi", "日本語": "jp", "en": "en", "vi": "vi", "jp": "jp"}.get(lang_display.lower(), "en"))
         self.update_ui_texts()
         self.window.folder_label.setText(f"{get_text('current_folder')}: {self.config['download_folder']}")
-        format_map = {"best": "Best video (recommended)", "mp4": "MP4", "mp3": "MP3", "webm": "WebM"}
+        format_map = {"best": "Best video (recommended)", "mp4": "MP4", "mp3": "MP3", "audio": "Audio (native)", "webm": "WebM",
+                      "mp4+mp3": "MP4 + MP3"}
         self.window.format_select.setCurrentText(format_map.get(self.config["format_choice"].lower(), "Best video"))
 
     def connect_signals(self):
@@ -130,6 +119,8 @@ class Controller:
         self.window.folder_btn.clicked.connect(self.select_folder)
         self.window.language_select.currentIndexChanged.connect(self.change_language)
         self.window.format_select.currentTextChanged.connect(self.save_format_choice)
+        self.window.max_workers_input.valueChanged.connect(self.save_max_workers)
+        self.window.connections_input.valueChanged.connect(self.save_download_connections)
 
     def apply_stylesheet(self):
         try:
@@ -172,16 +163,27 @@ class Controller:
         self.window.folder_label.setText(f"{get_text('current_folder')}: {self.config['download_folder']}")
         self.window.sponsorblock_checkbox.setText(get_text("sponsorblock_label"))
         self.window.skip_no_music_checkbox.setText(get_text("skip_no_music_label"))
+        self.window.sync_checkbox.setText(get_text("sync_label"))
+        self.window.widgets["max_workers_label"].setText(get_text("max_workers_label"))
+        self.window.widgets["connections_label"].setText(get_text("connections_label"))
         self.window.widgets["progress_group"].setTitle(get_text("progress_group"))
+        self.window.jobs_list.setHeaderLabels([get_text("job_url_column"), get_text("job_status_column"),
+                                               get_text("job_progress_column")])
+        for job_id in self.job_items:
+            self.update_job_item(self.queue.jobs[job_id])
         self.window.status_label.setText(get_text("status_ready"))
         self.window.download_btn.setText(get_text("download_btn"))
         self.window.cancel_btn.setText(get_text("cancel_btn"))
 
     def cancel_download(self):
-        if hasattr(self, 'thread') and self.thread and self.thread.isRunning():
-            self.window._is_cancelled = True
-            self.thread.cancel()
-            self.window.status_label.setText(f"{get_text('status_label')}: {get_text('canceling')}")
+        selected_ids = [job_id for job_id, item in self.job_items.items() if item.isSelected()]
+        if selected_ids:
+            for job_id in selected_ids:
+                self.queue.cancel(job_id)
+        else:
+            self.queue.cancel_all()
+        self.window.status_label.setText(f"{get_text('status_label')}: {get_text('canceling')}")
+        if not selected_ids:
             self.window.cancel_btn.setEnabled(False)
 
     def select_folder(self):
@@ -203,98 +205,148 @@ class Controller:
         update_config(self.config)
 
     def save_format_choice(self, text):
-        format_map = {"Best video (recommended)": "best", "MP4": "mp4", "MP3": "mp3", "WebM": "webm"}
+        format_map = {"Best video (recommended)": "best", "MP4": "mp4", "MP3": "mp3", "Audio (native)": "audio", "WebM": "webm",
+                      "MP4 + MP3": "mp4+mp3"}
         format_choice = format_map.get(text, "best")
         self.config["format_choice"] = format_choice
         update_config(self.config)
 
+    def save_max_workers(self, value):
+        self.queue.set_max_workers(value)
+        self.config["max_concurrent_downloads"] = value
+        update_config(self.config)
+
+    def save_download_connections(self, value):
+        self.queue.download_connections = value
+        self.config["download_connections"] = value
+        update_config(self.config)
+
+    def parse_urls(self, text):
+        urls = []
+        for url in text.replace(",", " ").split():
+            if url not in urls:
+                urls.append(url)
+        return urls
+
     def download_video(self):
-        self.window._is_cancelled = False
-        url = self.window.url_input.text().strip()
+        urls = self.parse_urls(self.window.url_input.toPlainText())
         format_choice = self.window.format_select.currentText().lower()
-        format_map = {"best video (recommended)": "best", "mp4": "mp4", "mp3": "mp3", "webm": "webm"}
+        format_map = {"best video (recommended)": "best", "mp4": "mp4", "mp3": "mp3", "audio (native)": "audio", "webm": "webm",
+                      "mp4 + mp3": "mp4+mp3"}
         format_choice = format_map.get(format_choice, "best")
         custom_name = self.window.filename_input.text().strip()
         download_folder = self.config["download_folder"]
-
-        temp_folder = os.path.join(download_folder, "temp")
-        if not os.path.exists(temp_folder):
-            os.makedirs(temp_folder)
-
-        temp_files = []
-        temp_files.extend(glob.glob(os.path.join(temp_folder, "*.part")))
-        temp_files.extend(glob.glob(os.path.join(temp_folder, "*.part-Frag*")))
-        temp_files.extend(glob.glob(os.path.join(temp_folder, "*.ytdl")))
-        current_download_file = os.path.join(temp_folder, "current_download.txt")
-
-        previous_url = None
-        if os.path.exists(current_download_file):
-            with open(current_download_file, "r", encoding="utf-8") as f:
-                previous_url = f.read().strip()
-
         use_sponsorblock = self.window.sponsorblock_checkbox.isChecked()
         skip_no_music = self.window.skip_no_music_checkbox.isChecked()
+        sync = self.window.sync_checkbox.isChecked()
 
-        if not url:
+        if not urls:
             QMessageBox.warning(self.window, get_text("error_title"), get_text("error_url_empty"))
             return
         if not download_folder:
             QMessageBox.warning(self.window, get_text("error_title"), get_text("error_folder_empty"))
             return
 
-        if temp_files:
-            if previous_url == url:
-                self.window.status_label.setText(f"{get_text('status_label')}: {get_text('resuming_download')}")
-            else:
-                try:
-                    shutil.rmtree(temp_folder)
-                    os.makedirs(temp_folder)
-                except Exception:
-                    pass
-                self.window.status_label.setText(f"{get_text('status_downloading')}...")
-        else:
-            self.window.status_label.setText(f"{get_text('status_downloading')}...")
-
-        self.window.download_btn.setEnabled(False)
+        if not self.queue.active_jobs():
+            self.batch_jobs = []
+            self.window.progress_bar.setValue(0)
+            self.window.log_area.clear()
+
+        for index, url in enumerate(urls, start=1):
+            job_name = custom_name
+            if custom_name and len(urls) > 1:
+                job_name = f"{custom_name} ({index})"
+            job = self.queue.add(url, format_choice, job_name, download_folder, use_sponsorblock, skip_no_music,
+                                 sync=sync)
+            if job.job_id not in self.job_items:
+                self.job_item(job)
+                self.batch_jobs.append(job)
+
+        self.batch_done = False
+        self.window.status_label.setText(f"{get_text('status_downloading')}...")
         self.window.cancel_btn.setEnabled(True)
-        self.window.progress_bar.setValue(0)
-        self.window.log_area.clear()
-
-        self.thread = DownloadThread(url, format_choice, custom_name, download_folder, temp_folder,
-                                    use_sponsorblock, skip_no_music, cancel_check=lambda: self.window._is_cancelled)
-        self.thread.finished.connect(self.on_download_finished)
-        self.thread.error.connect(self.on_download_error)
-        self.thread.progress.connect(self.on_progress_update)
-        self.thread.cancelled.connect(self.on_download_cancelled)
-        self.thread.log.connect(self.update_log)
-        self.thread.start()
-
-    def on_progress_update(self, percent):
-        self.window.progress_bar.setValue(percent)
-
-    def update_log(self, message):
-        self.window.log_area.appendPlainText(message)
-
-    def on_download_cancelled(self, temp_files=None):
-        self.window.status_label.setText(f"{get_text('status_label')}: {get_text('cancelled_message')}")
-        self.window.download_btn.setEnabled(True)
-        self.window.cancel_btn.setEnabled(False)
-        self.window.progress_bar.setValue(0)
-        self.window._is_cancelled = False
 
-    def on_download_finished(self, message, final_filepaths):
-        self.window.status_label.setText(f"{get_text('status_label')}: {message}")
-        self.window.download_btn.setEnabled(True)
-        self.window.cancel_btn.setEnabled(False)
-        self.window.progress_bar.setValue(100)
-        num_files = len(final_filepaths)
-        download_folder = self.config["download_folder"]
-        self.window.log_area.appendPlainText(f"Download completed. {num_files} file(s) saved to {download_folder}")
-        QMessageBox.information(self.window, get_text("success_title"), f"{message}\n{num_files} file(s) saved to:\n{download_folder}")
+    def job_item(self, job):
+        item = self.job_items.get(job.job_id)
+        if item is None:
+            item = QTreeWidgetItem([job.title or job.url, get_text("job_queued"), "0%"])
+            if job.parent is not None:
+                self.job_item(job.parent).addChild(item)
+            else:
+                self.window.jobs_list.addTopLevelItem(item)
+            self.job_items[job.job_id] = item
+        return item
+
+    def update_job_item(self, job):
+        item = self.job_item(job)
+        item.setText(1, get_text(f"job_{job.status}"))
+        # Failures and retries are shown on the job itself; the reason is in the tooltip.
+        item.setToolTip(1, job.error or "")
+        if job.children:
+            if job.title:
+                item.setText(0, job.title)
+            for child in job.children:
+                self.job_item(child)
+            item.setText(2, f"{job.items_done}/{job.entry_count} · {format_size(job.downloaded_bytes)}"
+                            f" · ETA {format_eta(job.eta())}")
+        else:
+            item.setText(2, f"{job.percent}%")
+
+    def update_batch_progress(self):
+        if self.batch_jobs:
+            total = sum(100 if not job.is_active() else job.percent for job in self.batch_jobs)
+            self.window.progress_bar.setValue(int(total / len(self.batch_jobs)))
+
+    def on_progress_update(self, jobs):
+        for job in jobs:
+            self.update_job_item(job)
+        self.update_batch_progress()
+
+    def update_log(self, entries):
+        lines = []
+        for job, message in entries:
+            if len(self.batch_jobs) > 1 or job.parent is not None:
+                message = f"[{job.job_id}] {message}"
+            lines.append(message)
+        self.window.log_area.appendPlainText("\n".join(lines))
+
+    def on_download_cancelled(self, job, temp_files=None):
+        self.update_job_item(job)
+        self.on_job_done()
+
+    def on_download_finished(self, job):
+        self.update_job_item(job)
+        num_files = len(job.final_filepaths)
+        self.window.log_area.appendPlainText(f"Download completed. {num_files} file(s) saved to {job.download_folder}")
+        self.on_job_done()
+
+    def on_download_error(self, job, message):
+        self.update_job_item(job)
+        self.on_job_done()
+
+    def on_job_done(self):
+        self.update_batch_progress()
+        if self.batch_done or self.queue.active_jobs():
+            return
+        self.batch_done = True
 
-    def on_download_error(self, message):
-        self.window.status_label.setText(f"{get_text('status_label')}: {get_text('status_error')}")
-        self.window.download_btn.setEnabled(True)
         self.window.cancel_btn.setEnabled(False)
-        self.window.progress_bar.setValue(0)
-        QMessageBox.critical(self.window, get_text("error_title"), message)
\ No newline at end of file
+        finished = [job for job in self.batch_jobs if job.status == "finished"]
+        failed = [job for top in self.batch_jobs for job in [top] + top.children if job.status == "error"]
+        num_files = sum(len(job.final_filepaths) for job in finished)
+        folders = sorted({job.download_folder for job in finished}) or [self.config["download_folder"]]
+        download_folder = "\n".join(folders)
+
+        if failed:
+            self.window.status_label.setText(f"{get_text('status_label')}: {get_text('status_error')} ({len(failed)})")
+            details = "\n".join(f"{job.url}: {job.error}" for job in failed)
+            self.window.log_area.appendPlainText(f"{get_text('batch_errors_message')}\n{details}")
+        elif finished:
+            message = get_text("success_download")
+            self.window.status_label.setText(f"{get_text('status_label')}: {message}")
+            self.window.progress_bar.setValue(100)
+            QMessageBox.information(self.window, get_text("success_title"),
+                                    f"{message}\n{num_files} file(s) saved to:\n{download_folder}")
+        else:
+            self.window.status_label.setText(f"{get_text('status_label')}: {get_text('cancelled_message')}")
+            self.window.progress_bar.setValue(0)
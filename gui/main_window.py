@@ -3,9 +3,11 @@ from PySide6.QtGui import QFont, QIcon
 from PySide6.QtWidgets import (
     QMainWindow, QPushButton, QLineEdit, QVBoxLayout, QWidget,
     QComboBox, QLabel, QProgressBar, QCheckBox, QHBoxLayout,
-    QGroupBox, QScrollArea, QSizePolicy, QPlainTextEdit
+    QGroupBox, QScrollArea, QSizePolicy, QPlainTextEdit, QSpinBox,
+    QTreeWidget, QHeaderView, QAbstractItemView
 )
 import os
+import sys
 import ctypes
 
 
@@ -36,14 +38,14 @@ class SmoothScrollArea(QScrollArea):
 class MainWindow(QMainWindow):
     def __init__(self, get_text):
         super().__init__()
-        self._is_cancelled = False
         self.setWindowTitle(get_text("app_title"))
 
         base_dir = os.path.dirname(os.path.abspath(__file__))
         icon_path = os.path.join(base_dir, 'icon', 'coffee.ico')
         self.setWindowIcon(QIcon(icon_path))
-        myappid = "Mikofoxie.Coffee YT Downloader.Ver 0.1"
-        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+        if sys.platform == "win32":
+            myappid = "Mikofoxie.Coffee YT Downloader.Ver 0.1"
+            ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
         self.setGeometry(100, 100, 550, 450)
         self.setMinimumSize(600, 620)
@@ -85,9 +87,10 @@ class MainWindow(QMainWindow):
         self.widgets["url_group"] = QGroupBox(get_text("url_group"))
         self.widgets["url_group"].setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         url_layout = QVBoxLayout()
-        self.url_input = QLineEdit()
+        self.url_input = QPlainTextEdit()
         self.url_input.setPlaceholderText(get_text("url_placeholder"))
         self.url_input.setMinimumHeight(30)
+        self.url_input.setMaximumHeight(80)
         url_layout.addWidget(self.url_input)
         self.widgets["url_group"].setLayout(url_layout)
         content_layout.addWidget(self.widgets["url_group"])
@@ -100,7 +103,7 @@ class MainWindow(QMainWindow):
         self.widgets["format_label"] = QLabel(get_text("format_label"))
         format_layout.addWidget(self.widgets["format_label"])
         self.format_select = QComboBox()
-        self.format_select.addItems(["MP4", "MP3", "WebM", "Best video (recommended)"])
+        self.format_select.addItems(["MP4", "MP3", "Audio (native)", "WebM", "MP4 + MP3", "Best video (recommended)"])
         self.format_select.setMinimumWidth(100)
         format_layout.addWidget(self.format_select)
         options_layout.addLayout(format_layout)
@@ -131,8 +134,28 @@ class MainWindow(QMainWindow):
         self.skip_no_music_checkbox = QCheckBox(get_text("skip_no_music_label"))
         checkbox_layout.addWidget(self.sponsorblock_checkbox)
         checkbox_layout.addWidget(self.skip_no_music_checkbox)
+        self.sync_checkbox = QCheckBox(get_text("sync_label"))
+        checkbox_layout.addWidget(self.sync_checkbox)
         options_layout.addLayout(checkbox_layout)
 
+        workers_layout = QHBoxLayout()
+        self.widgets["max_workers_label"] = QLabel(get_text("max_workers_label"))
+        workers_layout.addWidget(self.widgets["max_workers_label"])
+        self.max_workers_input = QSpinBox()
+        self.max_workers_input.setRange(1, 16)
+        self.max_workers_input.setMinimumWidth(100)
+        workers_layout.addWidget(self.max_workers_input)
+        options_layout.addLayout(workers_layout)
+
+        connections_layout = QHBoxLayout()
+        self.widgets["connections_label"] = QLabel(get_text("connections_label"))
+        connections_layout.addWidget(self.widgets["connections_label"])
+        self.connections_input = QSpinBox()
+        self.connections_input.setRange(1, 16)
+        self.connections_input.setMinimumWidth(100)
+        connections_layout.addWidget(self.connections_input)
+        options_layout.addLayout(connections_layout)
+
         self.widgets["options_group"].setLayout(options_layout)
         content_layout.addWidget(self.widgets["options_group"])
 
@@ -148,11 +171,21 @@ class MainWindow(QMainWindow):
         self.status_label.setObjectName("status_label")
         self.status_label.setAlignment(Qt.AlignCenter)
         progress_layout.addWidget(self.status_label)
+        self.jobs_list = QTreeWidget()
+        self.jobs_list.setColumnCount(3)
+        self.jobs_list.setHeaderLabels([get_text("job_url_column"), get_text("job_status_column"),
+                                        get_text("job_progress_column")])
+        self.jobs_list.setRootIsDecorated(False)
+        self.jobs_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.jobs_list.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.jobs_list.setMinimumHeight(100)
+        progress_layout.addWidget(self.jobs_list)
         self.widgets["progress_group"].setLayout(progress_layout)
         content_layout.addWidget(self.widgets["progress_group"])
 
         self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
+        self.log_area.setMaximumBlockCount(2000)
         self.log_area.setMaximumHeight(100)
         content_layout.addWidget(self.log_area)
 
@@ -0,0 +1,50 @@
+import threading
+
+from PySide6.QtCore import QObject, QTimer
+
+
+class UpdateBatcher(QObject):
+    """Collects updates from download threads and applies them on the GUI thread in batches.
+
+    Progress is coalesced to the latest value per job and log lines are appended in
+    one call per frame, instead of one queued signal per yt-dlp callback.
+    """
+
+    def __init__(self, progress_handler, log_handler, interval_ms=100, parent=None):
+        super().__init__(parent)
+        self.progress_handler = progress_handler
+        self.log_handler = log_handler
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._logs = []
+        self._events = []
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def post_progress(self, job, percent):
+        with self._lock:
+            self._progress[job.job_id] = job
+
+    def post_log(self, job, message):
+        with self._lock:
+            self._logs.append((job, message))
+
+    def post_event(self, handler, *args):
+        with self._lock:
+            self._events.append((handler, args))
+
+    def flush(self):
+        with self._lock:
+            if not (self._progress or self._logs or self._events):
+                return
+            progress, self._progress = list(self._progress.values()), {}
+            logs, self._logs = self._logs, []
+            events, self._events = self._events, []
+        if progress:
+            self.progress_handler(progress)
+        if logs:
+            self.log_handler(logs)
+        for handler, args in events:
+            handler(*args)
@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 from PySide6.QtWidgets import QApplication
 from gui.main_window import MainWindow
@@ -5,6 +6,8 @@ from config.languages import get_text
 from gui.controller import Controller
 
 if __name__ == "__main__":
+    # Worker processes of the "process" execution backend start through this in frozen builds.
+    multiprocessing.freeze_support()
     app = QApplication([])
     window = MainWindow(get_text)
     controller = Controller(window)
@@ -0,0 +1,60 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from downloader.download_queue import DownloadJob  # noqa: E402
+from downloader.journal import JobJournal  # noqa: E402
+
+# Records one job in the journal, then holds on to it until stdin is closed.
+OWNER = """
+import os, sys
+sys.path.insert(0, sys.argv[1])
+from downloader.download_queue import DownloadJob
+from downloader.journal import JobJournal
+job = DownloadJob('1', 'https://example.com/watch?v=live', 'best', '', sys.argv[3], False, False)
+os.makedirs(job.temp_folder)
+JobJournal(sys.argv[2]).record(job)
+print(job.temp_folder, flush=True)
+sys.stdin.read()
+"""
+
+
+class JournalOwnerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, 'jobs.sqlite3')
+        self.owner = subprocess.Popen([sys.executable, '-c', OWNER, ROOT, self.path, self.folder],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.addCleanup(self.owner.stdout.close)
+        self.addCleanup(self.owner.wait)
+        self.addCleanup(self.owner.stdin.close)
+        self.live_folder = self.owner.stdout.readline().strip()
+
+    def test_jobs_of_a_running_process_are_left_alone(self):
+        journal = JobJournal(self.path)
+        job = DownloadJob('1', 'https://example.com/watch?v=own', 'best', '', self.folder, False, False)
+        journal.record(job)
+        self.assertEqual([record['url'] for record in journal.unfinished()], [job.url])
+        self.assertEqual(journal.owned_elsewhere(), 1)
+
+        journal.discard_unfinished()
+        self.assertTrue(os.path.isdir(self.live_folder))
+        self.assertEqual(journal.unfinished(), [])
+
+    def test_jobs_are_resumable_once_their_process_exits(self):
+        self.owner.stdin.close()
+        self.owner.wait()
+        journal = JobJournal(self.path)
+        self.assertEqual(journal.owned_elsewhere(), 0)
+        self.assertEqual([record['job_key'] for record in journal.unfinished()], [self.live_folder])
+
+
+if __name__ == '__main__':
+    unittest.main()
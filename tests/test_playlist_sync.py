@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from bench_server import BenchServer  # noqa: E402
+from downloader.archive import DownloadArchive  # noqa: E402
+from downloader.download_queue import DownloadQueue  # noqa: E402
+from downloader.playlist import is_newest_first_url  # noqa: E402
+
+
+class NewestFirstUrlTest(unittest.TestCase):
+    def test_channel_uploads(self):
+        for url in ('https://www.youtube.com/@coffee', 'https://www.youtube.com/@coffee/videos',
+                    'https://www.youtube.com/channel/UCabc/streams', 'https://www.youtube.com/c/coffee/shorts',
+                    'https://www.youtube.com/user/coffee/', 'https://www.youtube.com/playlist?list=UUabc'):
+            self.assertTrue(is_newest_first_url(url), url)
+
+    def test_playlists_and_other_tabs(self):
+        for url in ('https://www.youtube.com/playlist?list=PLabc', 'https://www.youtube.com/watch?v=x&list=PLabc',
+                    'https://www.youtube.com/@coffee/playlists', 'https://www.youtube.com/channel/UCabc/community',
+                    'https://www.youtube.com/watch?v=x'):
+            self.assertFalse(is_newest_first_url(url), url)
+
+
+class PlaylistSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.server = BenchServer(media_size=16 * 1024, extract_delay=0).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.archive = DownloadArchive(os.path.join(self.folder, 'archive.sqlite3'))
+
+    def _sync(self, url):
+        queue = DownloadQueue(max_workers=2, archive=self.archive)
+        self.addCleanup(queue.shutdown)
+        job = queue.add(url, 'best', '', self.folder, False, False, sync=True)
+        deadline = time.monotonic() + 60
+        while queue.active_jobs() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(queue.active_jobs(), [])
+        return job
+
+    def test_entries_added_at_the_end_are_downloaded(self):
+        prefix = f'grow{time.time_ns()}'
+        first = self._sync(self.server.playlist_url(6, prefix))
+        self.assertEqual([child.status for child in first.children], ['finished'] * 6)
+
+        # More than SYNC_STOP_AFTER archived entries come before the new ones.
+        grown = self._sync(self.server.playlist_url(10, prefix))
+        self.assertEqual(grown.status, 'finished')
+        self.assertEqual(sorted(child.url.rsplit('/', 1)[-1] for child in grown.children),
+                         [f'{prefix}{index}' for index in range(6, 10)])
+        self.assertEqual([child.status for child in grown.children], ['finished'] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
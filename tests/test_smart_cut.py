@@ -0,0 +1,129 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader.smart_cut import keep_ranges, plan_pieces, smart_cut, snap_ranges  # noqa: E402
+
+FPS = 30
+DURATION = 30.0
+# Cuts on frame boundaries (in frames: 129-231, 357-405, 603-750), none on a keyframe.
+CUTS = [(4.3, 7.7), (11.9, 13.5), (20.1, 25.0)]
+
+
+def _has_encoder(name):
+    if not (shutil.which('ffmpeg') and shutil.which('ffprobe')):
+        return False
+    encoders = subprocess.run(['ffmpeg', '-v', 'error', '-encoders'], capture_output=True, text=True).stdout
+    return f' {name} ' in encoders
+
+
+def _packets(path, entry, stream='v:0'):
+    output = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', stream, '-show_entries', entry,
+                             '-of', 'csv=p=0', path], capture_output=True, text=True, check=True).stdout
+    return [float(line.strip(',')) for line in output.split() if line.strip(',') not in ('', 'N/A')]
+
+
+class PlanPiecesTest(unittest.TestCase):
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    def test_aligned_range_is_copied(self):
+        self.assertEqual(plan_pieces([(2.0, 6.0)], self.keyframes, 0.01, 10.0),
+                         [{'start': 2.0, 'end': 6.0, 'mode': 'copy'}])
+
+    def test_both_ends_between_keyframes(self):
+        self.assertEqual(plan_pieces([(1.0, 7.0)], self.keyframes, 0.01, 10.0), [
+            {'start': 1.0, 'end': 2.0, 'mode': 'encode'},
+            {'start': 2.0, 'end': 6.0, 'mode': 'copy'},
+            {'start': 6.0, 'end': 7.0, 'mode': 'encode'},
+        ])
+
+    def test_range_to_the_end_of_the_file(self):
+        self.assertEqual(plan_pieces([(9.0, 10.0), (3.0, 10.0)], self.keyframes, 0.01, 10.0), [
+            {'start': 9.0, 'end': 10.0, 'mode': 'encode'},
+            {'start': 3.0, 'end': 4.0, 'mode': 'encode'},
+            {'start': 4.0, 'end': 10.0, 'mode': 'copy'},
+        ])
+
+    def test_range_inside_one_gop(self):
+        self.assertEqual(plan_pieces([(2.0, 3.0)], self.keyframes, 0.01, 10.0),
+                         [{'start': 2.0, 'end': 3.0, 'mode': 'encode'}])
+
+
+class SnapRangesTest(unittest.TestCase):
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    def test_widened_to_keyframes(self):
+        self.assertEqual(snap_ranges([(0.0, 1.0), (3.0, 5.0), (8.5, 10.0)], self.keyframes, 0.01, 10.0),
+                         [(0.0, 6.0), (8.0, 10.0)])
+
+    def test_pieces_are_only_copied(self):
+        ranges = snap_ranges([(1.0, 3.0), (6.5, 7.0)], self.keyframes, 0.01, 10.0)
+        self.assertEqual(plan_pieces(ranges, self.keyframes, 0.01, 10.0), [
+            {'start': 0.0, 'end': 4.0, 'mode': 'copy'},
+            {'start': 6.0, 'end': 8.0, 'mode': 'copy'},
+        ])
+
+
+@unittest.skipUnless(_has_encoder('libx264'), 'needs ffmpeg and ffprobe with libx264 on PATH')
+class SmartCutH264Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.source = os.path.join(self.folder, 'source.mp4')
+        # B-frames and a keyframe every 2 seconds, like most downloaded H.264.
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i',
+                        f'testsrc2=size=320x240:rate={FPS}:duration={DURATION}', '-c:v', 'libx264',
+                        '-preset', 'veryfast', '-bf', '3', '-g', str(2 * FPS), '-keyint_min', str(2 * FPS),
+                        '-sc_threshold', '0', '-pix_fmt', 'yuv420p', self.source], check=True)
+
+    def test_frame_accurate_and_monotonic(self):
+        out_path = os.path.join(self.folder, 'cut.mp4')
+        stats = smart_cut('ffmpeg', 'ffprobe', self.source, out_path, CUTS, DURATION)
+        self.assertGreater(stats['copied'], 0)
+        self.assertGreater(stats['encoded'], 0)
+
+        expected = sum(round(end * FPS) - round(start * FPS) for start, end in keep_ranges(CUTS, DURATION))
+        frames = _packets(out_path, 'frame=pts_time')
+        self.assertEqual(len(frames), expected)
+        self.assertEqual([b for a, b in zip(frames, frames[1:]) if b <= a], [])
+        dts = _packets(out_path, 'packet=dts_time')
+        self.assertEqual([b for a, b in zip(dts, dts[1:]) if b <= a], [])
+
+
+@unittest.skipUnless(_has_encoder('libx265'), 'needs ffmpeg and ffprobe with libx265 on PATH')
+class SmartCutHevcTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.source = os.path.join(self.folder, 'source.mp4')
+        # HEVC has no head encoder, so the cuts fall back to whole GOPs.
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i',
+                        f'testsrc2=size=320x240:rate={FPS}:duration={DURATION}', '-f', 'lavfi', '-i',
+                        f'sine=frequency=440:duration={DURATION}', '-c:v', 'libx265', '-preset', 'ultrafast',
+                        '-x265-params', f'log-level=error:bframes=3:keyint={2 * FPS}:min-keyint={2 * FPS}:scenecut=0',
+                        '-pix_fmt', 'yuv420p', '-c:a', 'aac', self.source], check=True)
+
+    def test_whole_gops_in_sync_with_audio(self):
+        out_path = os.path.join(self.folder, 'cut.mp4')
+        stats = smart_cut('ffmpeg', 'ffprobe', self.source, out_path, CUTS, DURATION)
+        self.assertEqual(stats['encoded'], 0)
+
+        keyframes = [2.0 * index for index in range(int(DURATION / 2))]
+        ranges = snap_ranges(keep_ranges(CUTS, DURATION), keyframes, 0.5 / FPS, DURATION)
+        expected = sum(round(end * FPS) - round(start * FPS) for start, end in ranges)
+        frames = _packets(out_path, 'frame=pts_time')
+        self.assertEqual(len(frames), expected)
+        self.assertEqual([b for a, b in zip(frames, frames[1:]) if b <= a], [])
+        dts = _packets(out_path, 'packet=dts_time')
+        self.assertEqual([b for a, b in zip(dts, dts[1:]) if b <= a], [])
+        audio = _packets(out_path, 'packet=pts_time', 'a:0')
+        self.assertAlmostEqual(audio[-1], expected / FPS, delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()